@@ -3,21 +3,43 @@ Instagram and Facebook Media Downloader - Backend API
 Handles URL validation, media fetching, and download operations
 """
 
-from flask import Flask, request, jsonify, send_file, after_this_request, send_from_directory
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, make_response, g
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from limits import parse as parse_rate_limit
 import os
-import re
+import functools
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 import json
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import parse_qs, urlsplit
 import tempfile
 import mimetypes
 from werkzeug.utils import secure_filename
+from werkzeug.http import parse_content_range_header, quote_etag
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 import logging
-import yt_dlp
 from dotenv import load_dotenv
+from cache import create_cache
+from singleflight import SingleFlight
+from concurrency import BoundedExecutor, ConcurrencyLimiter, ConcurrencyLimitExceeded
+from http_client import PooledHTTPClient
+from extractors import ExtractorEngine, MediaURLExpired, Platform, PostUnavailable, earliest_expiry, is_media_url_expired, item_urls
+from archive import iter_zip_stream
+from bandwidth import BandwidthLimiter
+from media_cache import MediaCache
+from formats import FormatPolicy, MediaTooLarge, SizeLimits, select_audio, select_format
+from mux import find_ffmpeg, iter_muxed_stream
+from previews import PREVIEW_FORMATS, PreviewCache, PreviewRenderer, extract_poster_frame, preview_etag
+from spool import Spool, SpoolFull
+from static_files import StaticManifest
+from throttle import HostThrottle, UpstreamThrottled, cdn_host, parse_retry_after
+from jobs import DONE, JobQueue, create_job_store, public_job
+from url_classifier import classify_url, is_media_host, sanitize_url
+import metrics
 
 # Load environment variables
 load_dotenv()
@@ -29,16 +51,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize Flask app with static folder for React build
+# Initialize Flask app; the React build in static/ is served by serve_react_app
+# from a manifest, so Flask's own static route is disabled
 static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
 # Create static folder if it doesn't exist
 if not os.path.exists(static_folder):
     os.makedirs(static_folder, exist_ok=True)
-app = Flask(__name__, static_folder=static_folder, static_url_path='')
+app = Flask(__name__, static_folder=None)
 
 # Security configuration
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', os.urandom(32).hex())
-app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 1024 * 1024))  # Request bodies (JSON only)
 
 # CORS configuration - restrict in production
 allowed_origins = os.getenv('ALLOWED_ORIGINS', '*').split(',')
@@ -50,18 +73,245 @@ CORS(app, resources={
     }
 })
 
-# Rate limiting
+# Rate limiting - memory:// keeps separate counters in every gunicorn worker,
+# so limits multiply by the worker count and reset on restart. Point
+# RATELIMIT_STORAGE_URI at redis:// or memcached:// to share them.
+RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', 'memory://')
+RATELIMIT_STRATEGY = os.getenv('RATELIMIT_STRATEGY', 'fixed-window')  # or moving-window
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
     default_limits=["200 per day", "50 per hour"],
-    storage_uri="memory://"
+    storage_uri=RATELIMIT_STORAGE_URI,
+    strategy=RATELIMIT_STRATEGY,
+    # Keep serving with per-worker counters if the shared storage is unreachable
+    in_memory_fallback_enabled=RATELIMIT_STORAGE_URI != 'memory://'
 )
 
 # Configuration
-MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB max file size
+MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 100 * 1024 * 1024))  # 100MB; 0 = no limit
+# Per-platform/media type overrides, e.g. "facebook:video=262144000,*:image=20971520"
+MEDIA_SIZE_LIMITS = os.getenv('MEDIA_SIZE_LIMITS', '')
+size_limits = SizeLimits.parse(MAX_FILE_SIZE, MEDIA_SIZE_LIMITS)
 TEMP_DIR = tempfile.gettempdir()
-ALLOWED_EXTENSIONS = {'mp4', 'jpg', 'jpeg', 'png', 'webp', 'gif'}
+ALLOWED_EXTENSIONS = {'mp4', 'webm', 'jpg', 'jpeg', 'png', 'webp', 'gif'}
+CONTENT_TYPE_EXTENSIONS = {
+    'video/mp4': 'mp4',
+    'video/webm': 'webm',
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+}
+
+# Streaming downloads - pipe the upstream response straight to the client
+# instead of spooling it to a temp file first
+DOWNLOAD_STREAMING = os.getenv('DOWNLOAD_STREAMING', 'true').lower() == 'true'
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 256 * 1024))  # 256KB
+
+# Media URLs from clients are only fetched from these CDN domains (and their subdomains)
+MEDIA_HOSTS = {host.strip().lower() for host in
+               os.getenv('MEDIA_HOSTS', 'cdninstagram.com,fbcdn.net').split(',') if host.strip()}
+
+# Per-client bandwidth cap on download bodies (per worker process)
+CLIENT_BANDWIDTH_LIMIT = int(os.getenv('CLIENT_BANDWIDTH_LIMIT', 0))  # Bytes/second per client; 0 = unlimited
+CLIENT_BANDWIDTH_BURST = int(os.getenv('CLIENT_BANDWIDTH_BURST', 0))  # Bytes sent unpaced; 0 = one second's worth
+
+client_bandwidth = BandwidthLimiter(CLIENT_BANDWIDTH_LIMIT, CLIENT_BANDWIDTH_BURST)
+
+# Static frontend - the build is indexed once at startup. Fingerprinted
+# assets are cached as immutable, everything else revalidates by ETag.
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 365 * 24 * 60 * 60))  # Seconds, for fingerprinted assets
+
+static_manifest = StaticManifest(static_folder)
+
+# Metrics endpoint - optionally protected by a bearer token
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Multi-item (carousel) posts
+ENTRY_RESOLVE_WORKERS = int(os.getenv('ENTRY_RESOLVE_WORKERS', 4))
+ZIP_MAX_ITEMS = int(os.getenv('ZIP_MAX_ITEMS', 20))
+ZIP_PARALLEL_DOWNLOADS = int(os.getenv('ZIP_PARALLEL_DOWNLOADS', 4))
+ZIP_PREFETCH_CHUNKS = int(os.getenv('ZIP_PREFETCH_CHUNKS', 8))
+
+# On-disk media cache for repeat downloads (disabled unless a directory is set)
+MEDIA_CACHE_DIR = os.getenv('MEDIA_CACHE_DIR', '')
+MEDIA_CACHE_MAX_BYTES = int(os.getenv('MEDIA_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))  # 2GB
+
+media_cache = None
+if MEDIA_CACHE_DIR:
+    media_cache = MediaCache(MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES,
+                             max_item_bytes=size_limits.largest() or MEDIA_CACHE_MAX_BYTES)
+    media_cache.clear_tmp()
+
+# Extraction cache - signed CDN URLs from Instagram/Facebook stay valid for
+# hours, so cached entries must expire well before that
+EXTRACT_CACHE_URI = os.getenv('EXTRACT_CACHE_URI', 'memory://')
+EXTRACT_CACHE_TTL = int(os.getenv('EXTRACT_CACHE_TTL', 30 * 60))  # 30 minutes
+EXTRACT_CACHE_MAX_ENTRIES = int(os.getenv('EXTRACT_CACHE_MAX_ENTRIES', 2048))
+EXTRACT_CACHE_MAX_BYTES = int(os.getenv('EXTRACT_CACHE_MAX_BYTES', 16 * 1024 * 1024))  # 16MB
+# Results are dropped this long before their signed URLs expire (oe=), so
+# URLs handed out from the cache stay usable for a download
+EXTRACT_CACHE_EXPIRY_MARGIN = int(os.getenv('EXTRACT_CACHE_EXPIRY_MARGIN', 10 * 60))  # 10 minutes
+
+extraction_cache = create_cache(
+    EXTRACT_CACHE_URI,
+    ttl=EXTRACT_CACHE_TTL,
+    max_entries=EXTRACT_CACHE_MAX_ENTRIES,
+    max_bytes=EXTRACT_CACHE_MAX_BYTES
+)
+
+# Negative cache - private and deleted posts are remembered briefly so repeat
+# requests for them do not reach the upstream. Each error class has its own
+# TTL (0 disables it); throttling and network errors are never cached.
+NEGATIVE_CACHE_TTLS = {
+    'private': int(os.getenv('NEGATIVE_CACHE_PRIVATE_TTL', 5 * 60)),  # 5 minutes
+    'not_found': int(os.getenv('NEGATIVE_CACHE_NOT_FOUND_TTL', 15 * 60)),  # 15 minutes
+}
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv('NEGATIVE_CACHE_MAX_ENTRIES', 4096))
+
+negative_cache = create_cache(
+    EXTRACT_CACHE_URI,
+    ttl=max(NEGATIVE_CACHE_TTLS.values()),
+    max_entries=NEGATIVE_CACHE_MAX_ENTRIES,
+    max_bytes=NEGATIVE_CACHE_MAX_ENTRIES * 256,
+    namespace='negative'
+)
+
+# Single-flight coalescing of concurrent identical fetches. Set
+# SINGLE_FLIGHT_LOCK_DIR to also coalesce across workers on the same host.
+SINGLE_FLIGHT_LOCK_DIR = os.getenv('SINGLE_FLIGHT_LOCK_DIR', '')
+SINGLE_FLIGHT_LOCK_TIMEOUT = int(os.getenv('SINGLE_FLIGHT_LOCK_TIMEOUT', 60))
+
+fetch_flight = SingleFlight(
+    lock_dir=SINGLE_FLIGHT_LOCK_DIR or None,
+    lock_timeout=SINGLE_FLIGHT_LOCK_TIMEOUT
+)
+
+# Concurrency limits - blocking yt-dlp calls run on a bounded executor and
+# each route caps how many requests it serves at once per worker
+EXTRACT_MAX_WORKERS = int(os.getenv('EXTRACT_MAX_WORKERS', 4))
+EXTRACT_MAX_PENDING = int(os.getenv('EXTRACT_MAX_PENDING', 16))
+FETCH_TIMEOUT = int(os.getenv('FETCH_TIMEOUT', 45))
+FETCH_MAX_CONCURRENCY = int(os.getenv('FETCH_MAX_CONCURRENCY', 16))
+DOWNLOAD_MAX_CONCURRENCY = int(os.getenv('DOWNLOAD_MAX_CONCURRENCY', 16))
+DOWNLOAD_RATE_LIMIT = os.getenv('DOWNLOAD_RATE_LIMIT', '10 per hour')
+DOWNLOAD_RANGE_RATE_LIMIT = os.getenv('DOWNLOAD_RANGE_RATE_LIMIT', '100 per hour')  # Resumed/segmented downloads
+CONCURRENCY_WAIT_TIMEOUT = float(os.getenv('CONCURRENCY_WAIT_TIMEOUT', 5))
+
+# Batch fetch - many URLs per request, extracted in parallel
+BATCH_MAX_URLS = int(os.getenv('BATCH_MAX_URLS', 100))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 4))
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', 2))
+BATCH_RATE_LIMIT = os.getenv('BATCH_RATE_LIMIT', '100 per hour')  # Counted per distinct post, not per request
+
+fetch_limiter = ConcurrencyLimiter('fetch', FETCH_MAX_CONCURRENCY, CONCURRENCY_WAIT_TIMEOUT)
+download_limiter = ConcurrencyLimiter('download', DOWNLOAD_MAX_CONCURRENCY, CONCURRENCY_WAIT_TIMEOUT)
+batch_limiter = ConcurrencyLimiter('batch', BATCH_MAX_CONCURRENCY, CONCURRENCY_WAIT_TIMEOUT)
+
+# Background jobs - /api/jobs queues a fetch+download and runs it on worker
+# threads instead of inside the request, so large files cannot hit the
+# gunicorn timeout
+JOB_ARTIFACT_DIR = os.getenv('JOB_ARTIFACT_DIR', os.path.join(TEMP_DIR, 'media-downloader-jobs'))
+# Shared by every worker on the host; memory:// only works with a single worker
+JOB_STORE_URI = os.getenv('JOB_STORE_URI', 'sqlite:///' + os.path.abspath(os.path.join(JOB_ARTIFACT_DIR, 'jobs.db')))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))  # Job threads per worker process (0 = queue only)
+JOB_PER_HOST_CONCURRENCY = int(os.getenv('JOB_PER_HOST_CONCURRENCY', 2))  # Per upstream host, per worker
+JOB_ARTIFACT_TTL = int(os.getenv('JOB_ARTIFACT_TTL', 3600))  # Seconds finished jobs and files are kept
+JOB_TIMEOUT = int(os.getenv('JOB_TIMEOUT', 900))  # Seconds before a running job is declared dead
+JOB_RATE_LIMIT = os.getenv('JOB_RATE_LIMIT', '10 per hour')
+# Hosts allowed as completion callbacks; callbacks are disabled when empty
+JOB_CALLBACK_HOSTS = {host.strip().lower() for host in os.getenv('JOB_CALLBACK_HOSTS', '').split(',') if host.strip()}
+
+# Muxing - DASH posts often store video and audio separately. With ffmpeg
+# installed, both are downloaded concurrently and stream-copied into one MP4.
+FFMPEG_PATH = find_ffmpeg(os.getenv('FFMPEG_PATH'))
+MUX_AUDIO = os.getenv('MUX_AUDIO', 'true').lower() == 'true' and bool(FFMPEG_PATH)
+
+# Previews - small WebP/JPEG thumbnails (and video poster frames) for the
+# frontend, resized on a process pool and kept in a per-worker LRU
+PREVIEW_WIDTHS = (160, 320, 640)
+PREVIEW_QUALITY = int(os.getenv('PREVIEW_QUALITY', 80))
+PREVIEW_WORKERS = int(os.getenv('PREVIEW_WORKERS', 2))  # Resize processes per worker
+PREVIEW_TIMEOUT = int(os.getenv('PREVIEW_TIMEOUT', 15))
+PREVIEW_MAX_SOURCE_BYTES = int(os.getenv('PREVIEW_MAX_SOURCE_BYTES', 20 * 1024 * 1024))  # 20MB
+PREVIEW_VIDEO_MAX_BYTES = int(os.getenv('PREVIEW_VIDEO_MAX_BYTES', 8 * 1024 * 1024))  # Fed to ffmpeg for the poster frame
+PREVIEW_CACHE_MAX_ENTRIES = int(os.getenv('PREVIEW_CACHE_MAX_ENTRIES', 1024))
+PREVIEW_CACHE_MAX_BYTES = int(os.getenv('PREVIEW_CACHE_MAX_BYTES', 32 * 1024 * 1024))  # 32MB
+PREVIEW_MAX_AGE = int(os.getenv('PREVIEW_MAX_AGE', 24 * 60 * 60))  # Browser cache lifetime
+PREVIEW_MAX_CONCURRENCY = int(os.getenv('PREVIEW_MAX_CONCURRENCY', 8))
+PREVIEW_RATE_LIMIT = os.getenv('PREVIEW_RATE_LIMIT', '300 per hour')
+
+preview_limiter = ConcurrencyLimiter('preview', PREVIEW_MAX_CONCURRENCY, CONCURRENCY_WAIT_TIMEOUT)
+preview_renderer = PreviewRenderer(PREVIEW_WORKERS, PREVIEW_TIMEOUT)
+preview_cache = PreviewCache(PREVIEW_CACHE_MAX_ENTRIES, PREVIEW_CACHE_MAX_BYTES)
+
+# Spool - downloads buffered on disk (non-streaming mode, unknown-length
+# streams) share one directory per host under a global byte quota. Requests
+# queue briefly for space and get a 503 when the quota stays full; files left
+# by killed workers are swept at startup and periodically.
+SPOOL_DIR = os.getenv('SPOOL_DIR', os.path.join(TEMP_DIR, 'media-downloader-spool'))
+SPOOL_MAX_BYTES = int(os.getenv('SPOOL_MAX_BYTES', 2 * 1024 * 1024 * 1024))  # 2GB across all workers
+SPOOL_RESERVATION = int(os.getenv('SPOOL_RESERVATION', 8 * 1024 * 1024))  # Reserved when the size is unknown
+SPOOL_WAIT_TIMEOUT = float(os.getenv('SPOOL_WAIT_TIMEOUT', 5))  # Seconds to queue for space before a 503
+SPOOL_MAX_AGE = int(os.getenv('SPOOL_MAX_AGE', 3600))  # Files older than this are swept as orphans
+SPOOL_SWEEP_INTERVAL = int(os.getenv('SPOOL_SWEEP_INTERVAL', 60))  # 0 = sweep at startup only
+
+
+def record_spool_sweep(files, reclaimed):
+    metrics.SPOOL_RECLAIMED_BYTES.inc(reclaimed)
+    metrics.SPOOL_BYTES.set(spool.usage())
+
+
+spool = Spool(
+    SPOOL_DIR,
+    SPOOL_MAX_BYTES,
+    reservation=SPOOL_RESERVATION,
+    wait_timeout=SPOOL_WAIT_TIMEOUT,
+    max_age=SPOOL_MAX_AGE,
+    sweep_interval=SPOOL_SWEEP_INTERVAL,
+    on_sweep=record_spool_sweep
+)
+metrics.SPOOL_QUOTA_BYTES.set(SPOOL_MAX_BYTES)
+spool.sweep()
+
+# Format selection - which format of each video to download. Requests can
+# tighten these with a "format" object; size limits are always enforced.
+FORMAT_MAX_HEIGHT = int(os.getenv('FORMAT_MAX_HEIGHT', 0))  # 0 = highest available
+FORMAT_PREFER_CODEC = os.getenv('FORMAT_PREFER_CODEC', 'h264') or None  # h264, vp9, av1
+FORMAT_REQUIRE_AUDIO = os.getenv('FORMAT_REQUIRE_AUDIO', 'true').lower() == 'true'
+FORMAT_PROBE_WORKERS = int(os.getenv('FORMAT_PROBE_WORKERS', 4))  # Parallel HEAD probes for unknown sizes
+FORMAT_PROBE_TIMEOUT = float(os.getenv('FORMAT_PROBE_TIMEOUT', 5))
+
+default_format_policy = FormatPolicy(
+    max_height=FORMAT_MAX_HEIGHT,
+    max_bytes=size_limits.largest(),
+    prefer_codec=FORMAT_PREFER_CODEC,
+    require_audio=FORMAT_REQUIRE_AUDIO
+)
+
+# Outbound throttling - token bucket per upstream host (per worker process),
+# backed off adaptively when upstreams answer 429 or show a login wall
+THROTTLE_EXTRACT_RATE = float(os.getenv('THROTTLE_EXTRACT_RATE', 1))  # yt-dlp calls/second per platform; 0 = off
+THROTTLE_EXTRACT_BURST = int(os.getenv('THROTTLE_EXTRACT_BURST', 5))
+THROTTLE_CDN_RATE = float(os.getenv('THROTTLE_CDN_RATE', 20))  # CDN requests/second per CDN domain; 0 = off
+THROTTLE_CDN_BURST = int(os.getenv('THROTTLE_CDN_BURST', 40))
+THROTTLE_MAX_WAIT = float(os.getenv('THROTTLE_MAX_WAIT', 10))  # Seconds to queue for a token before a 503
+THROTTLE_BACKOFF_BASE = float(os.getenv('THROTTLE_BACKOFF_BASE', 30))
+THROTTLE_BACKOFF_MAX = float(os.getenv('THROTTLE_BACKOFF_MAX', 900))
+
+extract_throttle = HostThrottle(THROTTLE_EXTRACT_RATE, THROTTLE_EXTRACT_BURST, THROTTLE_MAX_WAIT,
+                                THROTTLE_BACKOFF_BASE, THROTTLE_BACKOFF_MAX)
+cdn_throttle = HostThrottle(THROTTLE_CDN_RATE, THROTTLE_CDN_BURST, THROTTLE_MAX_WAIT,
+                            THROTTLE_BACKOFF_BASE, THROTTLE_BACKOFF_MAX)
+
+# Upstream HTTP connection pool (one per worker process)
+DOWNLOAD_CONNECT_TIMEOUT = float(os.getenv('DOWNLOAD_CONNECT_TIMEOUT', 5))
+DOWNLOAD_TIMEOUT = float(os.getenv('DOWNLOAD_TIMEOUT', 60))  # Read timeout between bytes
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', 10))
+HTTP_POOL_SIZE_PER_HOST = int(os.getenv('HTTP_POOL_SIZE_PER_HOST', 32))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 2))
+HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', 0.3))
 
 # User-Agent header to mimic browser requests
 HEADERS = {
@@ -78,266 +328,563 @@ HEADERS = {
     'Cache-Control': 'max-age=0'
 }
 
+http_client = PooledHTTPClient(
+    HEADERS,
+    pool_connections=HTTP_POOL_HOSTS,
+    pool_maxsize=HTTP_POOL_SIZE_PER_HOST,
+    retries=HTTP_RETRIES,
+    backoff_factor=HTTP_RETRY_BACKOFF,
+    connect_timeout=DOWNLOAD_CONNECT_TIMEOUT,
+    read_timeout=DOWNLOAD_TIMEOUT
+)
+
+
+# Extractor engine - URLs are routed to platforms by the URL classifier
+extractor_engine = ExtractorEngine(entry_workers=ENTRY_RESOLVE_WORKERS, throttle=extract_throttle)
+extractor_engine.register(Platform('instagram', 'Instagram', ie_keys=['Instagram']))
+extractor_engine.register(Platform('facebook', 'Facebook', ie_keys=['Facebook', 'FacebookReel']))
+
+# Extraction threads each warm up their own YoutubeDL instance when they start
+extract_executor = BoundedExecutor(
+    max_workers=EXTRACT_MAX_WORKERS,
+    max_pending=EXTRACT_MAX_PENDING,
+    thread_name_prefix='extract',
+    initializer=extractor_engine.warm
+)
+
+
+def open_media_stream(media_url, headers=None, max_bytes=0):
+    """
+    Open a streaming request to the upstream media URL at the CDN's throttled
+    rate. A 416 response to a forwarded Range request is returned rather than
+    raised; a 429 backs the CDN off. Raises MediaURLExpired, without a
+    request if the URL's oe= expiry has passed, or on a 403/410. Raises
+    MediaTooLarge before any of the body is read if the upstream size
+    exceeds max_bytes (0 = no limit).
+    """
+    if not is_media_host(media_url, MEDIA_HOSTS):
+        raise Exception("Media URL is not on an allowed media host")
+    if is_media_url_expired(media_url):
+        raise MediaURLExpired(media_url)
+    host = cdn_host(urlsplit(media_url).hostname)
+    cdn_throttle.acquire(host)
+    try:
+        with metrics.observe_stage('upstream_ttfb'):
+            response = http_client.get(media_url, stream=True, headers=headers)
+        if response.status_code == 416 and headers and 'Range' in headers:
+            return response
+        if response.status_code in (403, 410):
+            response.close()
+            raise MediaURLExpired(media_url)
+        if response.status_code == 429:
+            cdn_throttle.penalize(host, parse_retry_after(response.headers.get('Retry-After')))
+        response.raise_for_status()
+        cdn_throttle.reward(host)
+    except requests.RequestException as e:
+        logger.error(f"Error downloading media: {str(e)}")
+        raise Exception(f"Failed to download media: {str(e)}")
+    
+    size = get_complete_length(response) if response.status_code == 206 else get_stream_length(response)
+    if max_bytes and size is not None and size > max_bytes:
+        response.close()
+        raise MediaTooLarge(size, max_bytes)
+    return response
+
+
+def get_media_extension(content_type, media_type, ext=None):
+    """Determine file extension from the selected format, upstream content type and media type"""
+    if ext in ALLOWED_EXTENSIONS:
+        return ext
+    content_type = (content_type or '').split(';', 1)[0].strip().lower()
+    if content_type in CONTENT_TYPE_EXTENSIONS:
+        return CONTENT_TYPE_EXTENSIONS[content_type]
+    if 'video' in content_type or media_type == 'video':
+        return 'mp4'
+    elif 'image' in content_type or media_type == 'image':
+        return 'jpg'
+    return (mimetypes.guess_extension(content_type) or '.bin').lstrip('.')
+
+
+def get_stream_length(response):
+    """
+    Return the upstream body length if it can be passed through as-is.
+    Returns None when the length is unknown or the body is content-encoded
+    (iter_content decodes it, so the upstream length would not match).
+    """
+    encoding = response.headers.get('content-encoding', 'identity').lower()
+    if encoding not in ('', 'identity'):
+        return None
+    try:
+        length = int(response.headers.get('content-length', ''))
+    except ValueError:
+        return None
+    return length if length >= 0 else None
+
+
+def iter_media_stream(response, chunk_size=STREAM_CHUNK_SIZE, max_bytes=MAX_FILE_SIZE):
+    """
+    Yield upstream body chunks, closing the response. Bodies without a known
+    length are cut off once they exceed max_bytes (0 = no limit).
+    """
+    start = time.perf_counter()
+    downloaded = 0
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk:
+                downloaded += len(chunk)
+                if max_bytes and downloaded > max_bytes:
+                    raise MediaTooLarge(downloaded, max_bytes)
+                yield chunk
+    finally:
+        response.close()
+        elapsed = time.perf_counter() - start
+        metrics.UPSTREAM_BYTES.inc(downloaded)
+        metrics.STAGE_LATENCY.labels(stage='upstream_download', platform='').observe(elapsed)
+        if downloaded and elapsed > 0:
+            metrics.UPSTREAM_THROUGHPUT.observe(downloaded / elapsed)
+
+
+def iter_byte_range(chunks, start, stop):
+    """Yield only bytes [start, stop) of a chunk stream"""
+    try:
+        position = 0
+        for chunk in chunks:
+            end = position + len(chunk)
+            if end > start:
+                yield chunk[max(0, start - position):stop - position]
+            position = end
+            if position >= stop:
+                break
+    finally:
+        chunks.close()
+
+
+def get_range_headers():
+    """
+    Range/If-Range headers from the client to forward upstream. Only single
+    byte ranges are supported; anything else is served as a full response.
+    """
+    byte_range = request.range
+    if byte_range is None or byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        return {}
+    headers = {'Range': request.headers['Range']}
+    if request.headers.get('If-Range'):
+        headers['If-Range'] = request.headers['If-Range']
+    return headers
+
+
+def get_complete_length(response):
+    """Total resource length from an upstream Content-Range header, if known"""
+    content_range = parse_content_range_header(response.headers.get('content-range'))
+    return content_range.length if content_range else None
+
+
+def media_validators(response):
+    """
+    Upstream ETag and Last-Modified of a full media body. Cached and spooled
+    copies are served with the same values as a streamed response, so a
+    client can resume with If-Range whichever path served the first bytes.
+    """
+    return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+
+def spool_media(response, media_type, max_bytes=MAX_FILE_SIZE):
+    """
+    Write an open upstream response to a spool file and return its path.
+    Raises SpoolFull if the spool quota has no room for it.
+    """
+    ext = get_media_extension(response.headers.get('content-type', ''), media_type)
+    length = get_stream_length(response)
+    try:
+        spool_file = spool.create(length, suffix=f'.{ext}')
+    except SpoolFull:
+        response.close()
+        raise
+    try:
+        for chunk in iter_media_stream(response, chunk_size=8192, max_bytes=max_bytes):
+            spool_file.write(chunk)
+        path = spool_file.close()
+        metrics.TEMP_FILE_BYTES.inc(spool_file.size)
+        metrics.SPOOL_BYTES.set(spool.usage())
+        return path
+    except Exception:
+        response.close()
+        spool_file.abort()
+        raise
+
+
+def remove_temp_file(path):
+    """Delete a spooled temp file and release it from the disk usage gauges"""
+    if path and os.path.exists(path):
+        size = spool.remove(path)
+        metrics.TEMP_FILE_BYTES.dec(size)
+        metrics.SPOOL_BYTES.set(spool.usage())
+
+
+class SpooledResponseFile(io.FileIO):
+    """
+    A spool file opened for sending. It keeps its share of the spool quota
+    until the server closes it after the body has been sent, which can take
+    minutes for a slow or bandwidth-paced client.
+    """
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        try:
+            remove_temp_file(self.name)
+        except Exception as e:
+            logger.error(f"Error cleaning up temp file: {str(e)}")
+
+
+def send_media_file(file, filename, mimetype, etag=None, last_modified=None):
+    """
+    Send an open media file as an attachment with conditional and Range
+    support. etag and last_modified are header values; without them the
+    file's mtime is the only validator. The file is closed on errors.
+    """
+    stat = os.fstat(file.fileno())
+    size = stat.st_size
+    try:
+        response = send_file(
+            file,
+            as_attachment=True,
+            download_name=filename,
+            mimetype=mimetype,
+            conditional=False
+        )
+        response.content_length = size
+        if etag:
+            response.headers['ETag'] = etag
+        if last_modified:
+            response.headers['Last-Modified'] = last_modified
+        else:
+            response.last_modified = stat.st_mtime
+        return response.make_conditional(request.environ, accept_ranges=True, complete_length=size)
+    except RequestedRangeNotSatisfiable:
+        file.close()
+        return range_not_satisfiable(size)
+    except Exception:
+        file.close()
+        raise
+
+
+def send_spooled_file(path, filename, validators=None):
+    """
+    Send a spooled download with Range support. The file is removed when the
+    server closes it, not when the view returns: werkzeug does not run
+    call_on_close callbacks for passthrough (sendfile) bodies.
+    """
+    validators = validators or {}
+    return send_media_file(SpooledResponseFile(path), filename, 'application/octet-stream',
+                           etag=validators.get('etag'), last_modified=validators.get('last_modified'))
 
-def validate_instagram_url(url):
-    """Validate Instagram post URL format - supports posts, reels, stories, etc."""
-    patterns = [
-        r'https?://(www\.)?instagram\.com/(p|reel|tv)/([A-Za-z0-9_-]+)',
-        r'https?://(www\.)?instagram\.com/([A-Za-z0-9_.]+)/(p|reel|tv)/([A-Za-z0-9_-]+)',
-        r'https?://(www\.)?instagram\.com/(p|reel|tv)/([A-Za-z0-9_-]+)/?',
-        r'https?://(www\.)?instagram\.com/(p|reel|tv)/([A-Za-z0-9_-]+)\?.*',
-    ]
-    for pattern in patterns:
-        if re.search(pattern, url):
-            return True
-    return False
-
-
-def validate_facebook_url(url):
-    """Validate Facebook post URL format"""
-    patterns = [
-        r'https?://(www\.)?facebook\.com/.+/posts/[0-9]+',
-        r'https?://(www\.)?facebook\.com/.+/videos/[0-9]+',
-        r'https?://(www\.)?facebook\.com/watch/\?v=[0-9]+',
-        r'https?://(www\.)?fb\.watch/[A-Za-z0-9_-]+',
-    ]
-    for pattern in patterns:
-        if re.match(pattern, url):
-            return True
-    return False
+
+def spool_full(error):
+    """503 response for a download rejected because the spool quota is full"""
+    metrics.SPOOL_REJECTIONS.inc()
+    response = jsonify({
+        'success': False,
+        'error': str(error)
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
 
 
-def sanitize_url(url):
-    """Sanitize and validate URL input"""
-    if not url or not isinstance(url, str):
+def extraction_ttl(media_info):
+    """Cache TTL for an extraction result, bounded by when its signed URLs expire"""
+    expires_at = media_info.get('expires_at')
+    if expires_at is None:
         return None
+    return max(0, int(expires_at - time.time()) - EXTRACT_CACHE_EXPIRY_MARGIN)
+
+
+def extract_media_info(classified):
+    """
+    Fetch media info for a classified post URL through the extraction cache.
+    Concurrent requests for the same post share a single extraction and its result.
+    Posts recently found private or deleted fail fast from the negative cache.
+    """
+    cache_key = classified.canonical_id
+    media_info = extraction_cache.get(cache_key)
+    metrics.count_cache('extraction', media_info is not None)
+    if media_info is not None:
+        return media_info
     
-    url = url.strip()
+    failure = negative_cache.get(cache_key)
+    metrics.count_cache('negative', failure is not None)
+    if failure is not None:
+        raise PostUnavailable(failure['error'], failure['reason'])
     
-    # Basic URL format validation
-    if not url.startswith(('http://', 'https://')):
-        return None
+    platform = extractor_engine.get(classified.platform)
+    
+    def load():
+        with fetch_flight.process_lock(cache_key):
+            # Another worker may have filled the cache while we waited
+            media_info = extraction_cache.get(cache_key)
+            if media_info is not None:
+                return media_info
+            try:
+                with metrics.observe_stage('extract', platform.name):
+                    media_info = extract_executor.run(
+                        extractor_engine.fetch, platform, classified.canonical_url, timeout=FETCH_TIMEOUT
+                    )
+            except PostUnavailable as e:
+                ttl = NEGATIVE_CACHE_TTLS.get(e.reason, 0)
+                if ttl > 0:
+                    negative_cache.set(cache_key, {'error': str(e), 'reason': e.reason}, ttl=ttl)
+                raise
+            extraction_cache.set(cache_key, media_info, ttl=extraction_ttl(media_info))
+            return media_info
     
+    return fetch_flight.do(cache_key, load)
+
+
+@functools.lru_cache(maxsize=4096)
+def probe_size(media_url):
+    """Content-Length of a media URL from a HEAD request, or None if unknown"""
+    # Probes are optional - skip rather than queue when the CDN is throttled.
+    # (Raising keeps the skipped probe out of the lru_cache.)
+    cdn_throttle.acquire(cdn_host(urlsplit(media_url).hostname), max_wait=0)
     try:
-        parsed = urlparse(url)
-        if not parsed.netloc:
+        response = http_client.head(media_url, timeout=FORMAT_PROBE_TIMEOUT)
+        response.close()
+        if response.ok:
+            return int(response.headers.get('content-length', ''))
+    except (requests.RequestException, ValueError):
+        pass
+    return None
+
+
+def probe_sizes(media_urls):
+    """Probe the sizes of many media URLs in parallel; unknown sizes are left out"""
+    def probe(media_url):
+        try:
+            return probe_size(media_url)
+        except UpstreamThrottled:
             return None
-        return url
-    except Exception:
-        return None
+    
+    media_urls = list(dict.fromkeys(media_urls))
+    with metrics.observe_stage('format_probe'):
+        with ThreadPoolExecutor(max_workers=min(len(media_urls), FORMAT_PROBE_WORKERS),
+                                thread_name_prefix='probe') as executor:
+            sizes = dict(zip(media_urls, executor.map(probe, media_urls)))
+    return {media_url: size for media_url, size in sizes.items() if size is not None}
+
+
+def apply_format_policy(media_info, policy):
+    """
+    Choose the format of every video item in media_info according to policy.
+    Video-only formats get an audio_url to mux in when ffmpeg is available.
+    Sizes missing from the metadata are probed with HEAD requests first.
+    Raises MediaTooLarge if no format of an item fits the size limit (the
+    tighter of policy.max_bytes and the platform's video limit).
+    """
+    policy = policy.capped(size_limits.limit_for(media_info.get('source'), 'video'))
+    items = media_info.get('items', [])
+    audios = [select_audio(item.get('audio_formats')) if MUX_AUDIO and policy.require_audio else None
+              for item in items]
+    candidates = [candidate for item in items for candidate in item.get('formats', ())]
+    candidates += [audio for audio in audios if audio]
+    unknown = [candidate['url'] for candidate in candidates if candidate['filesize'] is None]
+    sizes = probe_sizes(unknown) if unknown and policy.max_bytes else {}
+    
+    def size_of(candidate):
+        return candidate['filesize'] if candidate['filesize'] is not None else sizes.get(candidate['url'])
+    
+    selected = []
+    for item, audio in zip(items, audios):
+        if item.get('formats'):
+            fmt = select_format(item['formats'], policy, sizes, audio)
+            entry = {
+                'media_url': fmt['url'],
+                'media_type': 'video',
+                'ext': fmt['ext'],
+                'width': fmt['width'],
+                'height': fmt['height'],
+                'filesize': size_of(fmt),
+                'expires_at': earliest_expiry([fmt['url']])
+            }
+            if audio and fmt.get('acodec') == 'none':
+                entry['audio_url'] = audio['url']
+                entry['ext'] = 'mp4'
+                entry['expires_at'] = earliest_expiry([fmt['url'], audio['url']])
+                if entry['filesize'] is not None and size_of(audio) is not None:
+                    entry['filesize'] += size_of(audio)
+            selected.append(entry)
+        else:
+            selected.append({key: value for key, value in item.items()
+                             if key not in ('formats', 'audio_formats')})
+    if not selected:
+        return media_info
+    return dict(
+        media_info,
+        media_url=selected[0]['media_url'],
+        media_type=selected[0]['media_type'],
+        ext=selected[0].get('ext'),
+        items=selected
+    )
+
+
+def post_items(media_info):
+    """Every media item of an extracted post"""
+    return media_info.get('items') or [
+        {'media_url': media_info['media_url'], 'media_type': media_info['media_type']}
+    ]
+
 
+def resolve_post_item(classified, policy, index=0, stale_url=None):
+    """
+    Media item of a post reference, from the extraction cache or a new
+    extraction. With stale_url (a URL that expired), a cached result still
+    holding it is dropped and the post re-extracted once, and the item with
+    the same CDN path is preferred over index. Returns None if the post has
+    no item at index.
+    """
+    media_info = extract_media_info(classified)
+    if stale_url:
+        metrics.MEDIA_URL_REFRESHES.labels(platform=classified.platform).inc()
+        if stale_url in item_urls(media_info.get('items', [])):
+            extraction_cache.delete(classified.canonical_id)
+            media_info = extract_media_info(classified)
+    items = post_items(apply_format_policy(media_info, policy))
+    if stale_url:
+        stale_path = stale_url.split('?', 1)[0]
+        for item in items:
+            if stale_path in (item['media_url'].split('?', 1)[0], (item.get('audio_url') or '').split('?', 1)[0]):
+                return item
+    return items[index] if 0 <= index < len(items) else None
 
-def fetch_instagram_media(url):
+
+def open_with_refresh(open_item, item, classified, policy, index=0):
     """
-    Fetch media from Instagram URL using yt-dlp (professional method)
-    This is the most reliable way to extract Instagram media
+    Return (open_item(item), item). If the item's URL has expired and a post
+    reference was given, the post is re-resolved once and the refreshed item
+    opened instead.
     """
     try:
-        # Clean URL - remove query parameters
-        clean_url = url.split('?')[0] if '?' in url else url
-        
-        # Use yt-dlp to extract media information
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-            'no_check_certificate': True,
-            'ignoreerrors': False,
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            try:
-                info = ydl.extract_info(clean_url, download=False)
-                
-                if not info:
-                    raise Exception("No media information found")
-                
-                # Get the best quality video or image
-                media_url = None
-                media_type = None
-                
-                # Check if it's a video
-                if info.get('url') and ('video' in info.get('format', '').lower() or 
-                                       info.get('ext') in ['mp4', 'webm', 'mkv']):
-                    media_url = info.get('url')
-                    media_type = 'video'
-                # Check for video formats
-                elif 'formats' in info:
-                    # Find the best video format
-                    video_formats = [f for f in info['formats'] if f.get('vcodec') != 'none']
-                    if video_formats:
-                        # Get the best quality video
-                        best_video = max(video_formats, key=lambda x: x.get('height', 0) or x.get('width', 0))
-                        media_url = best_video.get('url')
-                        media_type = 'video'
-                    else:
-                        # No video, try image
-                        image_formats = [f for f in info['formats'] if f.get('vcodec') == 'none']
-                        if image_formats:
-                            best_image = image_formats[0]
-                            media_url = best_image.get('url')
-                            media_type = 'image'
-                
-                # Fallback: use thumbnail or direct URL
-                if not media_url:
-                    if info.get('thumbnail'):
-                        media_url = info['thumbnail']
-                        media_type = 'image'
-                    elif info.get('url'):
-                        media_url = info['url']
-                        # Determine type from extension or format
-                        if info.get('ext') in ['mp4', 'webm', 'mkv'] or 'video' in str(info.get('format', '')).lower():
-                            media_type = 'video'
-                        else:
-                            media_type = 'image'
-                
-                if not media_url:
-                    raise Exception("Could not extract media URL from Instagram post")
-                
-                return {
-                    'media_url': media_url,
-                    'media_type': media_type,
-                    'source': 'instagram'
-                }
-                
-            except yt_dlp.utils.DownloadError as e:
-                error_msg = str(e)
-                if 'Private' in error_msg or 'private' in error_msg:
-                    raise Exception("This post is private or requires login")
-                elif 'Not Found' in error_msg or 'not found' in error_msg:
-                    raise Exception("Post not found. It may have been deleted.")
-                else:
-                    raise Exception(f"Failed to extract media: {error_msg}")
-            except Exception as e:
-                logger.error(f"yt-dlp extraction error: {str(e)}")
-                raise Exception(f"Failed to extract media: {str(e)}")
-                
-    except Exception as e:
-        logger.error(f"Error fetching Instagram media: {str(e)}")
-        raise Exception(f"Failed to extract media from Instagram post: {str(e)}")
+        return open_item(item), item
+    except MediaURLExpired as e:
+        if classified is None:
+            raise
+        logger.info(f"Media URL for {classified.canonical_id} expired, re-extracting")
+        refreshed = resolve_post_item(classified, policy, index, stale_url=e.media_url)
+        if refreshed is None:
+            raise
+        return open_item(refreshed), refreshed
 
 
-def fetch_facebook_media(url):
+def iter_batch_results(urls, policy):
     """
-    Fetch media from Facebook URL using yt-dlp (professional method)
-    This is the most reliable way to extract Facebook media
+    Extract every URL in a batch and yield one NDJSON line per input URL as
+    results complete. URLs for the same post are extracted once. Per-item
+    failures are reported inline and never abort the batch.
     """
+    def line(payload):
+        return json.dumps(payload, separators=(',', ':')) + '\n'
+    
+    succeeded = 0
+    failed = 0
+    groups = {}  # canonical ID -> (classified URL, [indexes])
+    for index, url in enumerate(urls):
+        classified = classify_url(url)
+        if classified is None:
+            failed += 1
+            error = 'Invalid URL format' if not sanitize_url(url) else \
+                'Unsupported URL. Please provide an Instagram or Facebook post URL.'
+            yield line({'index': index, 'url': url, 'success': False, 'error': error})
+            continue
+        if classified.canonical_id in groups:
+            groups[classified.canonical_id][1].append(index)
+        else:
+            groups[classified.canonical_id] = (classified, [index])
+    
+    executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='batch')
     try:
-        # Clean URL
-        clean_url = url.split('?')[0] if '?' in url else url
-        
-        # Use yt-dlp to extract media information
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-            'no_check_certificate': True,
-            'ignoreerrors': False,
+        futures = {
+            executor.submit(extract_media_info, classified): indexes
+            for classified, indexes in groups.values()
         }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        for future in as_completed(futures):
             try:
-                info = ydl.extract_info(clean_url, download=False)
-                
-                if not info:
-                    raise Exception("No media information found")
-                
-                # Get the best quality video or image
-                media_url = None
-                media_type = None
-                
-                # Check if it's a video
-                if info.get('url') and ('video' in info.get('format', '').lower() or 
-                                       info.get('ext') in ['mp4', 'webm', 'mkv']):
-                    media_url = info.get('url')
-                    media_type = 'video'
-                # Check for video formats
-                elif 'formats' in info:
-                    # Find the best video format
-                    video_formats = [f for f in info['formats'] if f.get('vcodec') != 'none']
-                    if video_formats:
-                        # Get the best quality video
-                        best_video = max(video_formats, key=lambda x: x.get('height', 0) or x.get('width', 0))
-                        media_url = best_video.get('url')
-                        media_type = 'video'
-                    else:
-                        # No video, try image
-                        image_formats = [f for f in info['formats'] if f.get('vcodec') == 'none']
-                        if image_formats:
-                            best_image = image_formats[0]
-                            media_url = best_image.get('url')
-                            media_type = 'image'
-                
-                # Fallback: use thumbnail or direct URL
-                if not media_url:
-                    if info.get('thumbnail'):
-                        media_url = info['thumbnail']
-                        media_type = 'image'
-                    elif info.get('url'):
-                        media_url = info['url']
-                        # Determine type from extension or format
-                        if info.get('ext') in ['mp4', 'webm', 'mkv'] or 'video' in str(info.get('format', '')).lower():
-                            media_type = 'video'
-                        else:
-                            media_type = 'image'
-                
-                if not media_url:
-                    raise Exception("Could not extract media URL from Facebook post")
-                
-                return {
-                    'media_url': media_url,
-                    'media_type': media_type,
-                    'source': 'facebook'
+                media_info = apply_format_policy(future.result(), policy)
+                result = {
+                    'success': True,
+                    'media_url': media_info['media_url'],
+                    'media_type': media_info['media_type'],
+                    'ext': media_info.get('ext'),
+                    'source': media_info['source'],
+                    'items': media_info.get('items', [])
                 }
-                
-            except yt_dlp.utils.DownloadError as e:
-                error_msg = str(e)
-                if 'Private' in error_msg or 'private' in error_msg:
-                    raise Exception("This post is private or requires login")
-                elif 'Not Found' in error_msg or 'not found' in error_msg:
-                    raise Exception("Post not found. It may have been deleted.")
-                else:
-                    raise Exception(f"Failed to extract media: {error_msg}")
             except Exception as e:
-                logger.error(f"yt-dlp extraction error: {str(e)}")
-                raise Exception(f"Failed to extract media: {str(e)}")
-                
+                result = {'success': False, 'error': str(e)}
+            for index in futures[future]:
+                if result['success']:
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield line(dict({'index': index, 'url': urls[index]}, **result))
+    finally:
+        # Stop queued extractions if the client went away
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    yield line({'done': True, 'total': len(urls), 'succeeded': succeeded, 'failed': failed})
+
+
+def iter_fetch_events(classified, policy):
+    """
+    Extract a classified post and yield NDJSON progress events as each stage
+    finishes: classified, extracting, formats and finally ready (the same
+    payload as /api/fetch) or error.
+    """
+    def event(name, **payload):
+        return json.dumps(dict({'event': name}, **payload), separators=(',', ':')) + '\n'
+    
+    yield event('classified', platform=classified.platform, kind=classified.kind,
+                post_id=classified.canonical_id, url=classified.url)
+    yield event('extracting')
+    try:
+        media_info = apply_format_policy(extract_media_info(classified), policy)
+    except ConcurrencyLimitExceeded as e:
+        metrics.CONCURRENCY_REJECTIONS.labels(endpoint='extract').inc()
+        yield event('error', error=str(e), retry=True)
+        return
+    except UpstreamThrottled as e:
+        metrics.UPSTREAM_THROTTLED.labels(host=e.host).inc()
+        yield event('error', error=str(e), retry=True, retry_after=e.retry_after)
+        return
     except Exception as e:
-        logger.error(f"Error fetching Facebook media: {str(e)}")
-        raise Exception(f"Failed to extract media from Facebook post: {str(e)}")
+        logger.error(f"Fetch error: {str(e)}")
+        yield event('error', error=str(e))
+        return
+    
+    items = media_info.get('items', [])
+    yield event('formats', media_type=media_info['media_type'], count=len(items) or 1)
+    yield event(
+        'ready',
+        success=True,
+        media_url=media_info['media_url'],
+        media_type=media_info['media_type'],
+        ext=media_info.get('ext'),
+        source=media_info['source'],
+        items=items,
+        post_id=classified.canonical_id,
+        expires_at=media_info.get('expires_at')
+    )
 
 
-def download_media(media_url, media_type):
-    """Download media file from URL and save to temporary location"""
+def download_media(media_url, media_type, max_bytes=MAX_FILE_SIZE):
+    """
+    Download media file from URL and save to temporary location.
+    Returns the file path and the upstream validators.
+    """
+    response = open_media_stream(media_url, max_bytes=max_bytes)
     try:
-        response = requests.get(media_url, headers=HEADERS, stream=True, timeout=60)
-        response.raise_for_status()
-        
-        # Determine file extension
-        content_type = response.headers.get('content-type', '')
-        if 'video' in content_type or media_type == 'video':
-            ext = 'mp4'
-        elif 'image' in content_type or media_type == 'image':
-            ext = 'jpg'
-        else:
-            ext = mimetypes.guess_extension(content_type) or 'bin'
-        
-        # Create temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f'.{ext}')
-        
-        # Download with size limit
-        downloaded = 0
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                downloaded += len(chunk)
-                if downloaded > MAX_FILE_SIZE:
-                    os.unlink(temp_file.name)
-                    raise Exception("File size exceeds maximum allowed size")
-                temp_file.write(chunk)
-        
-        temp_file.close()
-        return temp_file.name
-        
+        return spool_media(response, media_type, max_bytes), media_validators(response)
+    except (SpoolFull, MediaTooLarge):
+        raise
     except requests.RequestException as e:
         logger.error(f"Error downloading media: {str(e)}")
         raise Exception(f"Failed to download media: {str(e)}")
@@ -346,6 +893,363 @@ def download_media(media_url, media_type):
         raise Exception(f"Failed to save media: {str(e)}")
 
 
+def iter_and_cache(chunks, writer, expected_size):
+    """Pass chunks through while writing them to the media cache"""
+    caching = True
+    try:
+        for chunk in chunks:
+            if caching:
+                try:
+                    writer.write(chunk)
+                except Exception as e:
+                    logger.error(f"Error writing media cache: {str(e)}")
+                    writer.abort()
+                    caching = False
+            yield chunk
+        if caching and writer.size == expected_size:
+            writer.commit()
+    finally:
+        # No-op once committed; discards partial bodies on errors/disconnects
+        writer.abort()
+
+
+def stream_media_response(response, filename, cache_key=None, byte_range=None, max_bytes=MAX_FILE_SIZE):
+    """
+    Build a streaming Flask response that passes the upstream body through.
+    Upstream 206 responses are relayed as-is; byte_range=(start, stop) slices
+    a full upstream body for clients that asked for a range the CDN ignored.
+    """
+    length = get_stream_length(response)
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Accept-Ranges': 'bytes',
+    }
+    validators = media_validators(response)
+    if validators['etag']:
+        headers['ETag'] = validators['etag']
+    if validators['last_modified']:
+        headers['Last-Modified'] = validators['last_modified']
+    content_type = response.headers.get('content-type') or 'application/octet-stream'
+    chunks = iter_media_stream(response, max_bytes=max_bytes)
+    status = 200
+    
+    if response.status_code == 206:
+        status = 206
+        headers['Content-Range'] = response.headers.get('content-range')
+    elif byte_range is not None:
+        start, stop = byte_range
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+        chunks = iter_byte_range(chunks, start, stop)
+        length = stop - start
+    elif cache_key and media_cache and length <= media_cache.max_item_bytes:
+        # Only complete bodies are cached
+        chunks = iter_and_cache(chunks, media_cache.writer(cache_key, content_type, validators), length)
+    
+    headers['Content-Length'] = str(length)
+    return Response(
+        stream_with_context(chunks),
+        status=status,
+        headers=headers,
+        content_type=content_type
+    )
+
+
+def range_not_satisfiable(complete_length):
+    """416 response for a range outside the resource"""
+    response = jsonify({
+        'success': False,
+        'error': 'Requested range not satisfiable'
+    })
+    response.status_code = 416
+    if complete_length is not None:
+        response.headers['Content-Range'] = f'bytes */{complete_length}'
+    return response
+
+
+def send_cached_media(entry, filename):
+    """
+    Serve a media cache hit with zero-copy file sending and Range support.
+    The upstream ETag stored with the entry is used when there was one, so
+    hits and streamed misses validate alike; otherwise the content hash.
+    """
+    return send_media_file(
+        open(entry['path'], 'rb'),
+        filename,
+        entry.get('content_type') or 'application/octet-stream',
+        etag=entry.get('etag') or quote_etag(entry['sha256']),
+        last_modified=entry.get('last_modified')
+    )
+
+
+def open_muxed_chunks(video_url, audio_url, max_bytes=MAX_FILE_SIZE):
+    """
+    Open the video and audio upstreams concurrently and return the chunk
+    iterator of the fragmented MP4 muxed from them
+    """
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='mux-open') as executor:
+        futures = [executor.submit(open_media_stream, url, max_bytes=max_bytes) for url in (video_url, audio_url)]
+    try:
+        video, audio = [future.result() for future in futures]
+    except Exception:
+        for future in futures:
+            if future.exception() is None:
+                future.result().close()
+        raise
+    return iter_muxed_stream(
+        iter_media_stream(video, max_bytes=max_bytes), iter_media_stream(audio, max_bytes=max_bytes),
+        FFMPEG_PATH, chunk_size=STREAM_CHUNK_SIZE
+    )
+
+
+def open_media_chunks(item, platform=None):
+    """Open an upstream media item and return its size-capped chunk iterator"""
+    max_bytes = size_limits.limit_for(platform, item.get('media_type', 'image'))
+    size_limits.check(item.get('filesize'), platform, item.get('media_type', 'image'))
+    if item.get('audio_url') and MUX_AUDIO:
+        return open_muxed_chunks(item['media_url'], item['audio_url'], max_bytes)
+    return iter_media_stream(open_media_stream(item['media_url'], max_bytes=max_bytes), max_bytes=max_bytes)
+
+
+def load_preview_source(media_url, media_type):
+    """
+    Encoded image to build a preview from: the image itself, or a poster
+    frame grabbed from the start of a video
+    """
+    upstream = open_media_stream(media_url)
+    if media_type == 'video':
+        if not FFMPEG_PATH:
+            upstream.close()
+            raise Exception("Video previews are not available on this server")
+        return extract_poster_frame(iter_media_stream(upstream), FFMPEG_PATH,
+                                    PREVIEW_VIDEO_MAX_BYTES, PREVIEW_TIMEOUT)
+    
+    length = get_stream_length(upstream)
+    if length is not None and length > PREVIEW_MAX_SOURCE_BYTES:
+        upstream.close()
+        raise Exception("Image is too large to preview")
+    data = bytearray()
+    for chunk in iter_media_stream(upstream):
+        data += chunk
+        if len(data) > PREVIEW_MAX_SOURCE_BYTES:
+            upstream.close()
+            raise Exception("Image is too large to preview")
+    return bytes(data)
+
+
+def preview_response(body, content_type, etag, status=200):
+    response = Response(body, status=status, content_type=content_type)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={PREVIEW_MAX_AGE}'
+    return response
+
+
+def iter_zip_items(items, platform=None):
+    """Yield a ZIP archive of media items, fetching several from the CDN at once"""
+    entries = []
+    for position, item in enumerate(items, start=1):
+        ext = get_media_extension('', item.get('media_type', 'image'), item.get('ext'))
+        entries.append((f"item_{position:02d}.{ext}", item))
+    return iter_zip_stream(
+        entries,
+        functools.partial(open_media_chunks, platform=platform),
+        parallel=ZIP_PARALLEL_DOWNLOADS,
+        prefetch_chunks=ZIP_PREFETCH_CHUNKS
+    )
+
+
+def zip_media_response(items, platform=None):
+    """Build a streaming ZIP response containing every media item"""
+    return Response(
+        stream_with_context(iter_zip_items(items, platform)),
+        headers={'Content-Disposition': 'attachment; filename="download.zip"'},
+        content_type='application/zip'
+    )
+
+
+def run_download_job(job, artifact_path):
+    """
+    Fetch a queued job's post and download it to artifact_path: the first
+    item, or every item as a ZIP when the job asked for all of them.
+    """
+    data = job['request']
+    classified = classify_url(data['url'])
+    policy = FormatPolicy.from_options(data.get('format'), default_format_policy)
+    media_info = apply_format_policy(extract_media_info(classified), policy)
+    items = post_items(media_info)
+    
+    with metrics.observe_stage('job', classified.platform):
+        if data.get('all') and len(items) > 1:
+            chunks = iter_zip_items(items[:ZIP_MAX_ITEMS], classified.platform)
+            filename, content_type = 'download.zip', 'application/zip'
+        elif items[0].get('audio_url') and MUX_AUDIO:
+            chunks = open_media_chunks(items[0], classified.platform)
+            filename, content_type = 'download.mp4', 'video/mp4'
+        else:
+            item = items[0]
+            max_bytes = size_limits.limit_for(classified.platform, item['media_type'])
+            size_limits.check(item.get('filesize'), classified.platform, item['media_type'])
+            upstream = open_media_stream(item['media_url'], max_bytes=max_bytes)
+            content_type = upstream.headers.get('content-type') or 'application/octet-stream'
+            ext = get_media_extension(content_type, item['media_type'], item.get('ext'))
+            chunks = iter_media_stream(upstream, max_bytes=max_bytes)
+            filename = f'download.{ext}'
+        
+        size = 0
+        with open(artifact_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+    
+    return {
+        'filename': filename,
+        'content_type': content_type,
+        'size': size,
+        'media_type': items[0]['media_type'],
+        'items': len(items) if data.get('all') else 1,
+        'post_id': classified.canonical_id
+    }
+
+
+job_queue = JobQueue(
+    create_job_store(JOB_STORE_URI),
+    run_download_job,
+    JOB_ARTIFACT_DIR,
+    workers=JOB_WORKERS,
+    per_host_limit=JOB_PER_HOST_CONCURRENCY,
+    artifact_ttl=JOB_ARTIFACT_TTL,
+    job_timeout=JOB_TIMEOUT
+)
+
+
+def job_view(job):
+    """A job's client-facing status, with a download link once it is done"""
+    view = public_job(job)
+    if job['status'] == DONE:
+        view['download_url'] = f"/api/jobs/{job['id']}/artifact"
+    return view
+
+
+def upstream_throttled(error):
+    """503 response for a request shed because its upstream host is throttled"""
+    metrics.UPSTREAM_THROTTLED.labels(host=error.host).inc()
+    response = jsonify({
+        'success': False,
+        'error': str(error)
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def limit_concurrency(limiter):
+    """
+    Cap concurrent requests to a route. Streamed responses keep their slot
+    until the body has been sent.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            if not limiter.acquire():
+                metrics.CONCURRENCY_REJECTIONS.labels(endpoint=limiter.name).inc()
+                response = jsonify({
+                    'success': False,
+                    'error': 'Server is busy. Please try again shortly.'
+                })
+                response.status_code = 503
+                response.headers['Retry-After'] = '5'
+                return response
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                limiter.release()
+                raise
+            if response.is_streamed and not response.direct_passthrough:
+                response.call_on_close(limiter.release)
+            else:
+                # Passthrough bodies are local files (cache hits, spooled
+                # downloads) sent via sendfile; wrapping them would disable that
+                limiter.release()
+            return response
+        return wrapped
+    return decorator
+
+
+def limit_bandwidth(view):
+    """
+    Pace response bodies to CLIENT_BANDWIDTH_LIMIT bytes/second per client.
+    Apply below limit_concurrency so paced bodies keep their slot.
+    """
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        if client_bandwidth.rate <= 0 or request.method == 'HEAD' or response.status_code not in (200, 206):
+            return response
+        # Paced bodies cannot use sendfile, so passthrough files are iterated too
+        response.response = client_bandwidth.iter_paced(get_remote_address(), response.response)
+        response.direct_passthrough = False
+        return response
+    return wrapped
+
+
+def iter_counted(body, endpoint):
+    """Count response bytes as a streamed body is sent"""
+    try:
+        for chunk in body:
+            metrics.BYTES_SERVED.labels(endpoint=endpoint).inc(len(chunk))
+            yield chunk
+    finally:
+        close = getattr(body, 'close', None)
+        if close:
+            close()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.before_request
+def reject_oversized_bodies():
+    # Routes catch every exception, so answer before they try to parse the body
+    max_length = app.config['MAX_CONTENT_LENGTH']
+    if max_length and request.content_length is not None and request.content_length > max_length:
+        return request_too_large(None)
+
+
+@app.before_request
+def start_job_workers():
+    # Job threads do not survive gunicorn's fork, so each worker starts its own
+    job_queue.ensure_started()
+
+
+@app.before_request
+def start_spool_sweeper():
+    # Likewise the spool sweeper thread
+    spool.ensure_started()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Record request latency (to first byte for streamed bodies) and bytes served"""
+    endpoint = request.endpoint or 'unknown'
+    start = g.get('request_start')
+    if start is not None:
+        metrics.REQUEST_LATENCY.labels(
+            endpoint=endpoint,
+            method=request.method,
+            status=response.status_code
+        ).observe(time.perf_counter() - start)
+    if response.status_code == 429:
+        metrics.RATE_LIMIT_REJECTIONS.labels(endpoint=endpoint).inc()
+    if request.method != 'HEAD':
+        if response.content_length is not None:
+            metrics.BYTES_SERVED.labels(endpoint=endpoint).inc(response.content_length)
+        elif response.is_streamed and not response.direct_passthrough:
+            response.response = iter_counted(response.response, endpoint)
+    return response
+
+
 @app.after_request
 def set_security_headers(response):
     """Add security headers to all responses"""
@@ -371,19 +1275,15 @@ def validate_url():
                 'error': 'URL is required'
             }), 400
         
-        sanitized_url = sanitize_url(url)
-        if not sanitized_url:
-            return jsonify({
-                'valid': False,
-                'error': 'Invalid URL format'
-            }), 400
+        with metrics.observe_stage('validation'):
+            classified = classify_url(url)
         
-        platform = None
-        if validate_instagram_url(sanitized_url):
-            platform = 'instagram'
-        elif validate_facebook_url(sanitized_url):
-            platform = 'facebook'
-        else:
+        if classified is None:
+            if not sanitize_url(url):
+                return jsonify({
+                    'valid': False,
+                    'error': 'Invalid URL format'
+                }), 400
             return jsonify({
                 'valid': False,
                 'error': 'Unsupported URL. Please provide an Instagram or Facebook post URL.'
@@ -391,8 +1291,10 @@ def validate_url():
         
         return jsonify({
             'valid': True,
-            'platform': platform,
-            'url': sanitized_url
+            'platform': classified.platform,
+            'kind': classified.kind,
+            'post_id': classified.canonical_id,
+            'url': classified.url
         })
         
     except Exception as e:
@@ -404,7 +1306,9 @@ def validate_url():
 
 
 @app.route('/api/fetch', methods=['POST'])
-@limiter.limit("20 per hour")
+# One quota with /api/fetch/stream, which extracts the same way
+@limiter.shared_limit("20 per hour", scope='fetch')
+@limit_concurrency(fetch_limiter)
 def fetch_media():
     """Fetch media information from URL"""
     try:
@@ -417,31 +1321,55 @@ def fetch_media():
                 'error': 'URL is required'
             }), 400
         
-        sanitized_url = sanitize_url(url)
-        if not sanitized_url:
+        try:
+            policy = FormatPolicy.from_options(data.get('format'), default_format_policy)
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'error': 'Invalid URL format'
+                'error': str(e)
             }), 400
         
-        # Determine platform and fetch media
-        if validate_instagram_url(sanitized_url):
-            media_info = fetch_instagram_media(sanitized_url)
-        elif validate_facebook_url(sanitized_url):
-            media_info = fetch_facebook_media(sanitized_url)
-        else:
+        # Sanitize and determine platform
+        with metrics.observe_stage('validation'):
+            classified = classify_url(url)
+        
+        if classified is None:
+            if not sanitize_url(url):
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid URL format'
+                }), 400
             return jsonify({
                 'success': False,
                 'error': 'Unsupported URL. Please provide an Instagram or Facebook post URL.'
             }), 400
         
+        media_info = apply_format_policy(extract_media_info(classified), policy)
+        
         return jsonify({
             'success': True,
             'media_url': media_info['media_url'],
             'media_type': media_info['media_type'],
-            'source': media_info['source']
+            'ext': media_info.get('ext'),
+            'source': media_info['source'],
+            'items': media_info.get('items', []),
+            'post_id': classified.canonical_id,
+            'expires_at': media_info.get('expires_at')
         })
         
+    except ConcurrencyLimitExceeded as e:
+        metrics.CONCURRENCY_REJECTIONS.labels(endpoint='extract').inc()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except MediaTooLarge as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 413
+    except UpstreamThrottled as e:
+        return upstream_throttled(e)
     except Exception as e:
         logger.error(f"Fetch error: {str(e)}")
         return jsonify({
@@ -450,52 +1378,358 @@ def fetch_media():
         }), 500
 
 
-@app.route('/api/download', methods=['POST'])
-@limiter.limit("10 per hour")
-def download():
-    """Download media file and return it"""
-    temp_file_path = None
+@app.route('/api/fetch/stream', methods=['POST'])
+@limiter.shared_limit("20 per hour", scope='fetch')
+@limit_concurrency(fetch_limiter)
+def fetch_media_stream():
+    """Validate and fetch a URL in one request, streaming progress events as NDJSON"""
     try:
         data = request.get_json()
-        media_url = data.get('media_url')
-        media_type = data.get('media_type', 'image')
+        url = data.get('url', '').strip()
         
-        if not media_url:
+        if not url:
             return jsonify({
                 'success': False,
-                'error': 'Media URL is required'
+                'error': 'URL is required'
+            }), 400
+        
+        try:
+            policy = FormatPolicy.from_options(data.get('format'), default_format_policy)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
             }), 400
         
-        # Download media to temporary file
-        temp_file_path = download_media(media_url, media_type)
+        with metrics.observe_stage('validation'):
+            classified = classify_url(url)
+        
+        if classified is None:
+            if not sanitize_url(url):
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid URL format'
+                }), 400
+            return jsonify({
+                'success': False,
+                'error': 'Unsupported URL. Please provide an Instagram or Facebook post URL.'
+            }), 400
+        
+        response = Response(
+            stream_with_context(iter_fetch_events(classified, policy)),
+            mimetype='application/x-ndjson'
+        )
+        # Progress events are useless if a proxy buffers them
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+        
+    except Exception as e:
+        logger.error(f"Fetch error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'An error occurred while processing the request'
+        }), 500
+
+
+def batch_cost():
+    """
+    Rate limit cost of a batch: one per distinct post it extracts, so a
+    batch is charged for every extraction it causes (at least 1)
+    """
+    data = request.get_json(silent=True)
+    urls = data.get('urls') if isinstance(data, dict) else None
+    if not isinstance(urls, list) or len(urls) > BATCH_MAX_URLS:
+        return 1
+    classified = (classify_url(url.strip()) for url in urls if isinstance(url, str))
+    return max(1, len({c.canonical_id for c in classified if c is not None}))
+
+
+@app.route('/api/fetch/batch', methods=['POST'])
+@limiter.limit(BATCH_RATE_LIMIT, cost=batch_cost)
+@limit_concurrency(batch_limiter)
+def fetch_media_batch():
+    """Fetch media information for many URLs, streamed back as NDJSON"""
+    try:
+        data = request.get_json()
+        urls = data.get('urls')
+        
+        if not isinstance(urls, list) or not urls:
+            return jsonify({
+                'success': False,
+                'error': 'A non-empty list of URLs is required'
+            }), 400
+        
+        if len(urls) > BATCH_MAX_URLS:
+            return jsonify({
+                'success': False,
+                'error': f'A batch may contain at most {BATCH_MAX_URLS} URLs'
+            }), 400
+        
+        try:
+            policy = FormatPolicy.from_options(data.get('format'), default_format_policy)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        urls = [url.strip() if isinstance(url, str) else '' for url in urls]
+        return Response(
+            stream_with_context(iter_batch_results(urls, policy)),
+            mimetype='application/x-ndjson'
+        )
+        
+    except Exception as e:
+        logger.error(f"Batch fetch error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'An error occurred while processing the batch'
+        }), 500
+
+
+def is_range_continuation():
+    """
+    Whether the request resumes or segments a download already counted by
+    the download rate limit: a single byte range that does not start at 0,
+    for one media URL that is streamed without extracting the post again.
+    ZIP, muxed and re-extraction requests ignore Range and send the whole
+    body, and multi-range requests are served as full responses, so none of
+    them ever are.
+    """
+    byte_range = request.range
+    if byte_range is None or byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        return False
+    start, stop = byte_range.ranges[0]
+    if start == 0 or (stop is not None and stop <= start):
+        return False
+    data = request.args if request.method == 'GET' else request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('media_url'), str):
+        return False
+    if data.get('items') is not None or data.get('all') is True or (data.get('audio_url') and MUX_AUDIO):
+        return False
+    # An expired URL would be re-resolved from the post
+    return not is_media_url_expired(data['media_url'])
+
+
+def charge_full_continuations(view):
+    """
+    A continuation that ends up sending the whole file (its If-Range
+    validator no longer matches) is a new download: count it against the
+    download rate limit, and refuse it once that is used up.
+    """
+    download_limit = parse_rate_limit(DOWNLOAD_RATE_LIMIT)
+
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or not limiter.enabled or not is_range_continuation():
+            return response
+        # Same counter as the route's DOWNLOAD_RATE_LIMIT (keyed by client and endpoint)
+        if limiter.limiter.hit(download_limit, get_remote_address(), request.endpoint):
+            return response
+        response.close()
+        response = jsonify({
+            'success': False,
+            'error': f'Rate limit exceeded: {DOWNLOAD_RATE_LIMIT}'
+        })
+        response.status_code = 429
+        return response
+    return wrapped
+
+
+@app.route('/api/download', methods=['GET', 'POST'])
+@limiter.limit(DOWNLOAD_RATE_LIMIT, exempt_when=is_range_continuation)
+# Continuations get their own, higher limit rather than none
+@limiter.limit(DOWNLOAD_RANGE_RATE_LIMIT, scope='download_range',
+               exempt_when=lambda: not is_range_continuation())
+@limit_concurrency(download_limiter)
+@charge_full_continuations
+@limit_bandwidth
+def download():
+    """
+    Download media file and return it. GET with query parameters supports
+    Range/If-Range so browsers and download managers can resume downloads.
+    Takes a media URL from /api/fetch, a post reference (post_url and item
+    index), or both; with a post reference an expired media URL is
+    re-resolved on the server instead of failing.
+    """
+    temp_file_path = None
+    try:
+        data = request.args if request.method == 'GET' else request.get_json()
+        # Continuations are not counted as downloads, so they must not extract
+        continuation = is_range_continuation()
+        item = {
+            'media_url': data.get('media_url'),
+            'media_type': data.get('media_type', 'image'),
+            'audio_url': data.get('audio_url'),
+            'ext': data.get('ext')
+        }
+        post_id = data.get('post_id')
+        items = data.get('items') if request.method == 'POST' else None
+        
+        classified = None
+        policy = default_format_policy
+        index = 0
+        if data.get('post_url'):
+            classified = classify_url(data['post_url'])
+            if classified is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'Unsupported post URL. Please provide an Instagram or Facebook post URL.'
+                }), 400
+            post_id = classified.canonical_id
+            try:
+                index = int(data.get('index', 0))
+                if request.method == 'POST':
+                    policy = FormatPolicy.from_options(data.get('format'), default_format_policy)
+            except (TypeError, ValueError) as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            
+            if data.get('all') is True and items is None:
+                items = post_items(apply_format_policy(extract_media_info(classified), policy))[:ZIP_MAX_ITEMS]
+            elif not item['media_url'] or (not continuation and is_media_url_expired(item['media_url'])):
+                item = resolve_post_item(classified, policy, index, stale_url=item['media_url'])
+                if item is None:
+                    return jsonify({
+                        'success': False,
+                        'error': f'Post has no item {index}'
+                    }), 400
+        
+        # Multi-item posts are downloaded together as a streamed ZIP
+        if items is not None:
+            if not isinstance(items, list) or not items or \
+                    not all(isinstance(item, dict) and item.get('media_url') for item in items):
+                return jsonify({
+                    'success': False,
+                    'error': 'Items must be a non-empty list of media URLs'
+                }), 400
+            if not all(is_media_host(item['media_url'], MEDIA_HOSTS) and
+                       (not item.get('audio_url') or is_media_host(item['audio_url'], MEDIA_HOSTS))
+                       for item in items):
+                return jsonify({
+                    'success': False,
+                    'error': 'Media URL is not on an allowed media host'
+                }), 400
+            if len(items) > ZIP_MAX_ITEMS:
+                return jsonify({
+                    'success': False,
+                    'error': f'At most {ZIP_MAX_ITEMS} items can be downloaded at once'
+                }), 400
+            return zip_media_response(items, classified.platform if classified else None)
+        
+        if not item['media_url']:
+            return jsonify({
+                'success': False,
+                'error': 'Media URL or post URL is required'
+            }), 400
+        if not all(is_media_host(url, MEDIA_HOSTS) for url in (item['media_url'], item.get('audio_url')) if url):
+            return jsonify({
+                'success': False,
+                'error': 'Media URL is not on an allowed media host'
+            }), 400
         
         # Determine filename
-        filename = f"download.{'mp4' if media_type == 'video' else 'jpg'}"
+        media_type = item['media_type']
+        filename = f"download.{get_media_extension('', media_type, item.get('ext'))}"
+        
+        # Reject media known to be oversized before opening the upstream
+        platform = classified.platform if classified else None
+        max_bytes = size_limits.limit_for(platform, media_type)
+        size_limits.check(item.get('filesize'), platform, media_type)
+        
+        # Video-only formats with a separate audio track are muxed on the fly
+        if item.get('audio_url') and MUX_AUDIO:
+            chunks, item = open_with_refresh(
+                lambda item: open_media_chunks(item, platform),
+                item, classified, policy, index
+            )
+            return Response(
+                stream_with_context(chunks),
+                headers={'Content-Disposition': 'attachment; filename="download.mp4"'},
+                content_type='video/mp4'
+            )
         
-        # Clean up temp file after response is sent
-        @after_this_request
-        def cleanup(response):
+        # Serve repeat downloads of the same post/format from the media cache
+        media_url = item['media_url']
+        cache_key = None
+        if media_cache:
+            cache_key = MediaCache.make_key(post_id, media_url)
+            entry = media_cache.get(cache_key)
+            metrics.count_cache('media', entry is not None)
+            if entry:
+                return send_cached_media(entry, filename)
+        
+        if DOWNLOAD_STREAMING:
+            range_headers = get_range_headers()
+            upstream, item = open_with_refresh(
+                lambda item: open_media_stream(item['media_url'], headers=range_headers, max_bytes=max_bytes),
+                item, None if continuation else classified, policy, index
+            )
+            if upstream.status_code == 416:
+                upstream.close()
+                return range_not_satisfiable(get_complete_length(upstream))
+            
+            length = get_stream_length(upstream)
+            if length is not None:
+                byte_range = None
+                if upstream.status_code == 200 and range_headers and 'If-Range' not in range_headers:
+                    # The CDN ignored the range - slice the full body ourselves.
+                    # (With If-Range, a 200 means the validator no longer matches.)
+                    byte_range = request.range.range_for_length(length)
+                    if byte_range is None:
+                        upstream.close()
+                        return range_not_satisfiable(length)
+                return stream_media_response(upstream, filename, cache_key=cache_key, byte_range=byte_range,
+                                             max_bytes=max_bytes)
+            
+            # Unknown length - fall back to spooling so the size cap is
+            # enforced before any bytes reach the client
+            # A partial upstream body does not carry the full body's validators
+            validators = media_validators(upstream) if upstream.status_code == 200 else {}
             try:
-                if temp_file_path and os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
-            except Exception as e:
-                logger.error(f"Error cleaning up temp file: {str(e)}")
-            return response
+                temp_file_path = spool_media(upstream, media_type, max_bytes)
+            except requests.RequestException as e:
+                raise Exception(f"Failed to download media: {str(e)}")
+        else:
+            # Download media to temporary file
+            (temp_file_path, validators), item = open_with_refresh(
+                lambda item: download_media(item['media_url'], item['media_type'], max_bytes),
+                item, None if continuation else classified, policy, index
+            )
         
-        return send_file(
-            temp_file_path,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/octet-stream'
-        )
+        if cache_key:
+            content_type = mimetypes.guess_type(temp_file_path)[0] or 'application/octet-stream'
+            entry = media_cache.store_file(cache_key, temp_file_path, content_type, validators)
+            if entry:
+                remove_temp_file(temp_file_path)
+                return send_cached_media(entry, filename)
         
+        return send_spooled_file(temp_file_path, filename, validators)
+        
+    except UpstreamThrottled as e:
+        return upstream_throttled(e)
+    except SpoolFull as e:
+        return spool_full(e)
+    except MediaTooLarge as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 413
+    except MediaURLExpired as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 410
     except Exception as e:
         # Clean up on error
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
+        try:
+            remove_temp_file(temp_file_path)
+        except Exception:
+            pass
         logger.error(f"Download error: {str(e)}")
         return jsonify({
             'success': False,
@@ -503,44 +1737,267 @@ def download():
         }), 500
 
 
+@app.route('/api/preview', methods=['GET'])
+@limiter.limit(PREVIEW_RATE_LIMIT)
+@limit_concurrency(preview_limiter)
+def preview():
+    """
+    Small WebP/JPEG thumbnail of a media URL (a poster frame for videos).
+    Previews carry strong ETags, so revalidation never touches the upstream.
+    """
+    try:
+        media_url = request.args.get('media_url')
+        media_type = request.args.get('media_type', 'image')
+        fmt = request.args.get('format', 'webp')
+        width = request.args.get('width', 320, type=int)
+        
+        if not media_url:
+            return jsonify({
+                'success': False,
+                'error': 'Media URL is required'
+            }), 400
+        if not is_media_host(media_url, MEDIA_HOSTS):
+            return jsonify({
+                'success': False,
+                'error': 'Media URL is not on an allowed media host'
+            }), 400
+        if fmt not in PREVIEW_FORMATS or width not in PREVIEW_WIDTHS:
+            return jsonify({
+                'success': False,
+                'error': f"format must be one of: {', '.join(PREVIEW_FORMATS)}; "
+                         f"width must be one of: {', '.join(map(str, PREVIEW_WIDTHS))}"
+            }), 400
+        
+        content_type = PREVIEW_FORMATS[fmt][1]
+        source_key = MediaCache.make_key(request.args.get('post_id'), media_url)
+        etag = preview_etag(source_key, width, fmt, PREVIEW_QUALITY)
+        if request.if_none_match.contains(etag):
+            return preview_response(None, content_type, etag, status=304)
+        
+        body = preview_cache.get(etag)
+        metrics.count_cache('preview', body is not None)
+        if body is None:
+            with metrics.observe_stage('preview'):
+                source = load_preview_source(media_url, media_type)
+                body = preview_renderer.render(source, width, fmt, PREVIEW_QUALITY)
+            preview_cache.set(etag, body)
+        return preview_response(body, content_type, etag)
+        
+    except UpstreamThrottled as e:
+        return upstream_throttled(e)
+    except Exception as e:
+        logger.error(f"Preview error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/jobs', methods=['POST'])
+@limiter.limit(JOB_RATE_LIMIT)
+def create_job():
+    """Queue a fetch+download; poll /api/jobs/<id> or pass callback_url to be notified"""
+    try:
+        data = request.get_json()
+        url = data.get('url', '').strip()
+        callback_url = data.get('callback_url')
+        
+        if not url:
+            return jsonify({
+                'success': False,
+                'error': 'URL is required'
+            }), 400
+        
+        try:
+            FormatPolicy.from_options(data.get('format'), default_format_policy)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        classified = classify_url(url)
+        if classified is None:
+            if not sanitize_url(url):
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid URL format'
+                }), 400
+            return jsonify({
+                'success': False,
+                'error': 'Unsupported URL. Please provide an Instagram or Facebook post URL.'
+            }), 400
+        
+        if callback_url:
+            callback = urlsplit(callback_url) if isinstance(callback_url, str) else None
+            if not JOB_CALLBACK_HOSTS:
+                return jsonify({
+                    'success': False,
+                    'error': 'Callbacks are not enabled on this server'
+                }), 400
+            if callback is None or callback.scheme not in ('http', 'https') or \
+                    (callback.hostname or '').lower() not in JOB_CALLBACK_HOSTS:
+                return jsonify({
+                    'success': False,
+                    'error': 'Callback URL is not allowed'
+                }), 400
+        
+        job = job_queue.submit(
+            {'url': classified.url, 'format': data.get('format'), 'all': bool(data.get('all'))},
+            host=urlsplit(classified.canonical_url).hostname,
+            callback_url=callback_url or None
+        )
+        response = jsonify(dict(job_view(job), success=True, status_url=f"/api/jobs/{job['id']}"))
+        response.headers['Location'] = f"/api/jobs/{job['id']}"
+        return response, 202
+        
+    except Exception as e:
+        logger.error(f"Job error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'An error occurred while queueing the job'
+        }), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@limiter.exempt
+def get_job(job_id):
+    """Status of a queued download job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    return jsonify(job_view(job))
+
+
+@app.route('/api/jobs/<job_id>/artifact', methods=['GET'])
+@limiter.exempt
+@limit_bandwidth
+def get_job_artifact(job_id):
+    """Download the file produced by a finished job (supports Range)"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    if job['status'] != DONE:
+        return jsonify({
+            'success': False,
+            'error': f"Job is {job['status']}"
+        }), 409
+    path = job_queue.artifact_path(job['id'])
+    if not os.path.exists(path):
+        return jsonify({
+            'success': False,
+            'error': 'Job artifact has expired'
+        }), 410
+    result = job['result']
+    return send_file(
+        path,
+        mimetype=result['content_type'],
+        as_attachment=True,
+        download_name=result['filename'],
+        conditional=True
+    )
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'service': 'Instagram/Facebook Media Downloader'
+        'service': 'Instagram/Facebook Media Downloader',
+        'concurrency': {
+            'extract_executor': extract_executor.stats(),
+            'fetch': fetch_limiter.stats(),
+            'download': download_limiter.stats(),
+            'batch': batch_limiter.stats()
+        },
+        'upstream_http': http_client.stats(),
+        'upstream_throttle': {
+            'extract': extract_throttle.stats(),
+            'cdn': cdn_throttle.stats()
+        },
+        'jobs': job_queue.stats(),
+        'client_bandwidth': client_bandwidth.stats(),
+        'static': static_manifest.stats(),
+        'spool': spool.stats()
     })
 
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Extraction cache hit/miss counters for sizing the cache"""
+    return jsonify({
+        'extraction': extraction_cache.stats(),
+        'negative': negative_cache.stats(),
+        'preview': preview_cache.stats(),
+        'single_flight': fetch_flight.stats(),
+        'media': media_cache.stats() if media_cache else None
+    })
+
+
+@app.route('/api/metrics', methods=['GET'])
+@limiter.exempt
+def prometheus_metrics():
+    """Prometheus metrics, aggregated across all gunicorn workers"""
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({
+            'success': False,
+            'error': 'Unauthorized'
+        }), 401
+    body, content_type = metrics.render_metrics()
+    return Response(body, content_type=content_type)
+
+
+def send_static(entry):
+    """Send a build file, precompressed if the client accepts it, with cache validators"""
+    encoding, path = static_manifest.choose_encoding(entry, request.accept_encodings)
+    response = send_file(
+        path,
+        mimetype=entry['content_type'],
+        conditional=True,
+        etag=f"{entry['etag']}-{encoding}" if encoding else entry['etag']
+    )
+    if encoding and response.status_code in (200, 206):
+        response.headers['Content-Encoding'] = encoding
+    if entry['variants']:
+        response.vary.add('Accept-Encoding')
+    if entry['immutable']:
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 # Serve React app for all non-API routes
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
+@limiter.exempt
 def serve_react_app(path):
-    """Serve React app for all non-API routes - optimized for performance"""
+    """Serve React app for all non-API routes from the startup manifest"""
     # Don't serve React app for API routes
     if path.startswith('api/'):
         return jsonify({'error': 'Not found'}), 404
     
-    # Check if static folder exists
-    if not app.static_folder or not os.path.exists(app.static_folder):
+    if not static_manifest.files:
         return jsonify({'error': 'Frontend not built. Please rebuild the application.'}), 503
     
-    # Handle static assets (JS, CSS, images, etc.)
-    if path and '.' in path:
-        # It's a file request (has extension)
-        file_path = os.path.join(app.static_folder, path)
-        if os.path.exists(file_path) and os.path.isfile(file_path):
-            return send_from_directory(app.static_folder, path)
+    # Static assets (JS, CSS, images, etc.)
+    entry = static_manifest.get(path) if path else None
+    if entry is not None:
+        return send_static(entry)
     
     # For all other routes, serve index.html (React Router handles routing)
-    index_path = os.path.join(app.static_folder, 'index.html')
-    if os.path.exists(index_path):
-        return send_from_directory(app.static_folder, 'index.html')
-    else:
-        return jsonify({
-            'error': 'Frontend not found',
-            'message': 'Please ensure the React app is built and copied to the static folder'
-        }), 503
+    if static_manifest.index is not None:
+        return send_static(static_manifest.index)
+    return jsonify({
+        'error': 'Frontend not found',
+        'message': 'Please ensure the React app is built and copied to the static folder'
+    }), 503
 
 
 @app.errorhandler(404)
@@ -551,6 +2008,14 @@ def not_found(error):
     }), 404
 
 
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({
+        'success': False,
+        'error': 'Request body is too large'
+    }), 413
+
+
 @app.errorhandler(500)
 def internal_error(error):
     return jsonify({
@@ -0,0 +1,116 @@
+"""
+Streaming ZIP archives
+Builds a ZIP on the fly from several upstream media streams. Items are fetched
+concurrently into small bounded queues and written to the archive in order, so
+neither the archive nor any item is ever held fully in memory or on disk.
+"""
+
+import logging
+import queue
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class _StreamBuffer:
+    """Write-only, unseekable file object that collects bytes for the response"""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        if data:
+            self._chunks.append(bytes(data))
+            self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        # ZipFile uses tell() for header offsets but never seeks
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip_stream(items, open_item, parallel=4, prefetch_chunks=8):
+    """
+    Yield a ZIP archive of items as bytes.
+
+    items is a list of (filename, item) pairs. open_item(item) returns an
+    iterable of byte chunks for that item. Up to `parallel` items are fetched
+    at once, each buffering at most `prefetch_chunks` chunks ahead of the
+    writer. Items that fail are left out and listed in an errors.txt entry.
+    """
+    cancelled = threading.Event()
+    queues = [queue.Queue(maxsize=prefetch_chunks) for _ in items]
+
+    def put(q, value):
+        while not cancelled.is_set():
+            try:
+                q.put(value, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(index):
+        q = queues[index]
+        chunks = None
+        try:
+            chunks = open_item(items[index][1])
+            for chunk in chunks:
+                if not put(q, chunk):
+                    return
+            put(q, _DONE)
+        except Exception as e:
+            put(q, e)
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+
+    executor = ThreadPoolExecutor(max_workers=max(1, parallel), thread_name_prefix='zip')
+    buffer = _StreamBuffer()
+    errors = []
+    try:
+        for index in range(len(items)):
+            executor.submit(produce, index)
+
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for index, (filename, _) in enumerate(items):
+                q = queues[index]
+                first = q.get()
+                if isinstance(first, Exception):
+                    errors.append(f"{filename}: {first}")
+                    continue
+
+                with archive.open(filename, 'w', force_zip64=True) as entry:
+                    value = first
+                    while value is not _DONE:
+                        if isinstance(value, Exception):
+                            # The entry is already partly written; keep what we have
+                            errors.append(f"{filename}: incomplete - {value}")
+                            break
+                        entry.write(value)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+                        value = q.get()
+                yield buffer.drain()
+
+            if errors:
+                archive.writestr('errors.txt', '\n'.join(errors) + '\n')
+        yield buffer.drain()
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
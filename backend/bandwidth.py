@@ -0,0 +1,64 @@
+"""
+Per-client bandwidth caps
+Download bodies are paced with a token bucket per client address, shared by
+all of that client's concurrent downloads, so a few large transfers cannot
+saturate the uplink and leave other clients' downloads crawling. Buckets are
+per worker process.
+"""
+
+import threading
+import time
+
+
+class BandwidthLimiter:
+    """Token buckets of bytes, keyed by client"""
+
+    def __init__(self, rate, burst=None, max_clients=4096):
+        self.rate = rate                      # Bytes per second per client; 0 disables pacing
+        self.burst = burst or rate            # Bytes a client may receive back-to-back
+        self.max_clients = max_clients        # Idle buckets are pruned beyond this many
+        self._lock = threading.Lock()
+        self._buckets = {}                    # client -> [tokens, updated]
+        self._paced = 0.0
+
+    def _prune(self, now):
+        # A bucket that has refilled completely is the same as no bucket
+        for client, (tokens, updated) in list(self._buckets.items()):
+            if tokens + (now - updated) * self.rate >= self.burst:
+                del self._buckets[client]
+
+    def consume(self, client, nbytes):
+        """Take nbytes from client's bucket, sleeping until they are covered"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate) - nbytes
+            self._buckets[client] = [tokens, now]
+            if len(self._buckets) > self.max_clients:
+                self._prune(now)
+            wait = -tokens / self.rate if tokens < 0 else 0.0
+            self._paced += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def iter_paced(self, client, chunks):
+        """Yield chunks no faster than the client's rate"""
+        try:
+            for chunk in chunks:
+                self.consume(client, len(chunk))
+                yield chunk
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'clients': len(self._buckets),
+                'paced_seconds': round(self._paced, 1),
+            }
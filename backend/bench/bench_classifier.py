@@ -0,0 +1,110 @@
+"""
+Micro-benchmark for URL classification
+Compares classify_url with the regex chain it replaced (sanitize, then try
+every platform's patterns, then extract the canonical ID with more regexes).
+
+    cd backend
+    python -m bench.bench_classifier --iterations 200000
+"""
+
+import argparse
+import re
+import timeit
+from urllib.parse import parse_qs, urlparse
+
+from url_classifier import classify_url
+
+SAMPLE_URLS = [
+    'https://www.instagram.com/p/CxYz123AbC/',
+    'https://www.instagram.com/reel/CxYz123AbC/?igsh=abc123',
+    'https://instagram.com/tv/CxYz123AbC',
+    'https://www.facebook.com/somepage/posts/1234567890',
+    'https://www.facebook.com/somepage/videos/9876543210/',
+    'https://www.facebook.com/watch/?v=1234567890',
+    'https://fb.watch/abcDEF123/',
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+]
+
+
+def legacy_validate_instagram_url(url):
+    """Validate Instagram post URL format - supports posts, reels, stories, etc."""
+    patterns = [
+        r'https?://(www\.)?instagram\.com/(p|reel|tv)/([A-Za-z0-9_-]+)',
+        r'https?://(www\.)?instagram\.com/([A-Za-z0-9_.]+)/(p|reel|tv)/([A-Za-z0-9_-]+)',
+        r'https?://(www\.)?instagram\.com/(p|reel|tv)/([A-Za-z0-9_-]+)/?',
+        r'https?://(www\.)?instagram\.com/(p|reel|tv)/([A-Za-z0-9_-]+)\?.*',
+    ]
+    for pattern in patterns:
+        if re.search(pattern, url):
+            return True
+    return False
+
+
+def legacy_validate_facebook_url(url):
+    """Validate Facebook post URL format"""
+    patterns = [
+        r'https?://(www\.)?facebook\.com/.+/posts/[0-9]+',
+        r'https?://(www\.)?facebook\.com/.+/videos/[0-9]+',
+        r'https?://(www\.)?facebook\.com/watch/\?v=[0-9]+',
+        r'https?://(www\.)?fb\.watch/[A-Za-z0-9_-]+',
+    ]
+    for pattern in patterns:
+        if re.match(pattern, url):
+            return True
+    return False
+
+
+def legacy_get_canonical_id(url):
+    """
+    Return a canonical post identity for cache keys, e.g. 'instagram:ABC123'
+    or 'facebook:1234567890'. Returns None when no ID can be extracted.
+    """
+    match = re.search(r'instagram\.com/(?:[A-Za-z0-9_.]+/)?(?:p|reel|tv)/([A-Za-z0-9_-]+)', url)
+    if match:
+        return f"instagram:{match.group(1)}"
+
+    match = re.search(r'facebook\.com/.+/(?:posts|videos)/([0-9]+)', url)
+    if not match:
+        match = re.search(r'facebook\.com/watch/?\?(?:.*&)?v=([0-9]+)', url)
+    if match:
+        return f"facebook:{match.group(1)}"
+
+    match = re.search(r'fb\.watch/([A-Za-z0-9_-]+)', url)
+    if match:
+        return f"facebook:watch:{match.group(1)}"
+    return None
+
+
+def legacy_classify(url):
+    """Validation, platform routing and cache keying as the app did before"""
+    url = url.strip()
+    if not url.startswith(('http://', 'https://')) or not urlparse(url).netloc:
+        return None
+    parse_qs(urlparse(url).query)
+    for name, validator in (('instagram', legacy_validate_instagram_url), ('facebook', legacy_validate_facebook_url)):
+        if validator(url):
+            return name, legacy_get_canonical_id(url)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark URL classification')
+    parser.add_argument('--iterations', type=int, default=100000, help='classifications per implementation')
+    args = parser.parse_args()
+
+    rounds = max(1, args.iterations // len(SAMPLE_URLS))
+    legacy = timeit.timeit(lambda: [legacy_classify(url) for url in SAMPLE_URLS], number=rounds)
+    uncached = timeit.timeit(
+        lambda: [classify_url.__wrapped__(url) for url in SAMPLE_URLS], number=rounds
+    )
+    cached = timeit.timeit(lambda: [classify_url(url) for url in SAMPLE_URLS], number=rounds)
+
+    total = rounds * len(SAMPLE_URLS)
+    print(f"{'implementation':<24} {'us/url':>8}")
+    for name, seconds in (('legacy regex chain', legacy), ('classify_url (uncached)', uncached),
+                          ('classify_url (cached)', cached)):
+        print(f'{name:<24} {seconds / total * 1e6:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
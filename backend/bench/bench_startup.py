@@ -0,0 +1,172 @@
+"""
+Startup benchmark for the backend
+Measures, in fresh interpreters, how long importing the app takes, how long
+loading yt-dlp and the registered extractors takes, and the RSS after each
+step, compared with initialising yt-dlp with every extractor. Then boots
+gunicorn with and without preload_app and reports the time until the app is
+healthy and per-worker memory: RSS, plus PSS and private (USS) memory, which
+show how much of that RSS is shared copy-on-write with the master.
+
+    cd backend
+    python -m bench.bench_startup
+    python -m bench.bench_startup --runs 10 --workers 4 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+from bench.loadtest import BACKEND_DIR, free_port, stop_app, worker_pids
+
+# Runs in a fresh interpreter; prints one JSON object of timings (ms) and RSS (MB)
+IMPORT_PROBE = '''
+import json, time
+
+def rss():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+
+result = {'baseline_rss': rss()}
+start = time.perf_counter()
+import app
+result['import_app'] = (time.perf_counter() - start) * 1000
+result['import_app_rss'] = rss()
+start = time.perf_counter()
+app.extractor_engine.preload()
+result['preload'] = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+app.extractor_engine.get_ydl()
+result['first_ydl'] = (time.perf_counter() - start) * 1000
+result['scoped_rss'] = rss()
+import yt_dlp
+start = time.perf_counter()
+yt_dlp.YoutubeDL(app.extractor_engine.ydl_opts)
+result['all_extractors_ydl'] = (time.perf_counter() - start) * 1000
+result['all_extractors_rss'] = rss()
+print(json.dumps(result))
+'''
+
+
+def run_import_probe(runs):
+    """Median of each import measurement over several fresh interpreters"""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_PROBE],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: round(statistics.median(sample[key] for sample in samples), 1) for key in samples[0]}
+
+
+def memory_usage(pid):
+    """(RSS, PSS, USS) in bytes from /proc/<pid>/smaps_rollup"""
+    usage = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 3 and fields[2] == 'kB':
+                    usage[fields[0].rstrip(':')] = int(fields[1]) * 1024
+    except OSError:
+        return 0, 0, 0
+    uss = usage.get('Private_Clean', 0) + usage.get('Private_Dirty', 0)
+    return usage.get('Rss', 0), usage.get('Pss', 0), uss
+
+
+def boot_gunicorn(preload, args):
+    """Boot the production entry point and measure time to healthy and worker memory"""
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        GUNICORN_PRELOAD='true' if preload else 'false',
+        GUNICORN_WORKERS=str(args.workers),
+        FLASK_ENV='production',
+    )
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn_config.py',
+         '--access-logfile', '/dev/null', 'wsgi:app'],
+        cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        healthy = None
+        deadline = time.time() + 60
+        while time.time() < deadline and process.poll() is None:
+            try:
+                if requests.get(f'http://127.0.0.1:{port}/api/health', timeout=1).ok:
+                    healthy = time.perf_counter() - start
+                    break
+            except requests.RequestException:
+                time.sleep(0.05)
+        if healthy is None:
+            raise RuntimeError('gunicorn did not become healthy within 60s')
+
+        # Let every worker finish booting before sampling memory
+        deadline = time.time() + 30
+        while len(worker_pids(process.pid)) < args.workers and time.time() < deadline:
+            time.sleep(0.1)
+        time.sleep(args.settle)
+        workers = [memory_usage(pid) for pid in worker_pids(process.pid)]
+        master_rss = memory_usage(process.pid)[0]
+    finally:
+        stop_app(process)
+
+    def mb(values):
+        return round(statistics.mean(values) / 1024 / 1024, 1) if values else 0
+
+    return {
+        'preload_app': preload,
+        'healthy_ms': round(healthy * 1000),
+        'workers': len(workers),
+        'master_rss_mb': mb([master_rss]),
+        'worker_rss_mb': mb([rss for rss, _, _ in workers]),
+        'worker_pss_mb': mb([pss for _, pss, _ in workers]),
+        'worker_uss_mb': mb([uss for _, _, uss in workers]),
+        'total_pss_mb': round(sum(pss for _, pss, _ in workers) / 1024 / 1024 + mb([master_rss]), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backend startup time and memory benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters for the import measurements')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--settle', type=float, default=1.0, help='seconds to wait before sampling memory')
+    parser.add_argument('--skip-gunicorn', action='store_true')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {'imports': run_import_probe(args.runs), 'gunicorn': []}
+    imports = results['imports']
+    print(f"import app:                 {imports['import_app']:8.1f} ms   rss {imports['import_app_rss']:6.1f} MB")
+    print(f"preload yt-dlp extractors:  {imports['preload']:8.1f} ms")
+    print(f"first YoutubeDL (scoped):   {imports['first_ydl']:8.1f} ms   rss {imports['scoped_rss']:6.1f} MB")
+    print(f"YoutubeDL, all extractors:  {imports['all_extractors_ydl']:8.1f} ms   rss {imports['all_extractors_rss']:6.1f} MB")
+
+    if not args.skip_gunicorn:
+        print(f"\n{'preload_app':<12} {'healthy ms':>10} {'workers':>8} {'master RSS':>11} "
+              f"{'worker RSS':>11} {'worker PSS':>11} {'worker USS':>11} {'total PSS':>10}")
+        for preload in (False, True):
+            row = boot_gunicorn(preload, args)
+            results['gunicorn'].append(row)
+            print(f"{str(row['preload_app']):<12} {row['healthy_ms']:>10} {row['workers']:>8} "
+                  f"{row['master_rss_mb']:>10}M {row['worker_rss_mb']:>10}M {row['worker_pss_mb']:>10}M "
+                  f"{row['worker_uss_mb']:>10}M {row['total_pss_mb']:>9}M")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""
+WSGI entry point for benchmarks
+Loads the real app but resolves posts against the fake upstream instead of
+Instagram/Facebook (whose host is allowed as a media host), and disables
+per-IP rate limits and outbound throttling so load can be applied.
+Use with gunicorn: BENCH_UPSTREAM_URL=http://127.0.0.1:9100 gunicorn bench.bench_wsgi:app
+"""
+import os
+from urllib.parse import urlsplit
+
+import requests
+import yt_dlp
+
+from app import MEDIA_HOSTS, app, cdn_throttle, extract_throttle, extractor_engine, limiter
+from url_classifier import classify_url
+
+UPSTREAM_URL = os.environ.get('BENCH_UPSTREAM_URL', 'http://127.0.0.1:9100').rstrip('/')
+
+
+def extract_info(platform, url):
+    """Fetch canned yt-dlp metadata for a post from the fake upstream"""
+    classified = classify_url(url)
+    post_id = (classified.canonical_id if classified else url).rsplit(':', 1)[-1]
+    response = requests.get(f'{UPSTREAM_URL}/info/{post_id}', timeout=30)
+    if response.status_code != 200:
+        raise yt_dlp.utils.DownloadError(f"ERROR: {response.json().get('error')}")
+    return response.json()
+
+
+extractor_engine.extract_info = extract_info
+MEDIA_HOSTS.add(urlsplit(UPSTREAM_URL).hostname)
+limiter.enabled = False
+extract_throttle.rate = 0
+cdn_throttle.rate = 0
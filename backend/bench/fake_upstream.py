@@ -0,0 +1,204 @@
+"""
+Local stand-in for Instagram/Facebook and their CDNs
+Serves canned yt-dlp-compatible metadata and synthetic media with configurable
+latency and bandwidth, so benchmarks never touch the real services.
+
+    GET /info/<post_id>       yt-dlp info dict; the ID prefix selects the kind:
+                              car* = carousel, prv* = private, gone* = deleted,
+                              anything else = single video
+    GET /media/<name>?size=N  N bytes of synthetic media (supports Range and HEAD);
+                              403 once the URL's oe= expiry (hex seconds) has passed
+
+Run standalone: python -m bench.fake_upstream --port 9100 --latency 0.05
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UpstreamConfig:
+    """Simulated upstream behaviour"""
+
+    def __init__(self, latency=0.0, extract_latency=0.0, bandwidth=0, media_size=2 * 1024 * 1024,
+                 url_ttl=6 * 60 * 60):
+        self.latency = latency                  # Seconds before the first media byte
+        self.extract_latency = extract_latency  # Seconds to answer a metadata request
+        self.bandwidth = bandwidth              # Bytes/second per media response, 0 = unlimited
+        self.media_size = media_size            # Default media body size
+        self.url_ttl = url_ttl                  # Seconds until signed media URLs expire
+
+
+def build_info(base_url, post_id, media_size, url_ttl):
+    """Canned yt-dlp info dict for a post"""
+    expires = format(int(time.time() + url_ttl), 'X')
+
+    def video(entry_id):
+        formats = []
+        for height in (360, 720, 1080):
+            size = media_size * height // 1080
+            formats.append({
+                'format_id': f'{height}p',
+                'url': f'{base_url}/media/{entry_id}-{height}.mp4?size={size}&oe={expires}',
+                'ext': 'mp4',
+                'vcodec': 'avc1.64001F',
+                'acodec': 'mp4a.40.2',
+                'height': height,
+                'width': height * 9 // 16,
+                'filesize': size,
+                'tbr': size * 8 / 1000 / 30,
+            })
+        return {
+            'id': entry_id,
+            'title': f'Post {entry_id}',
+            'ext': 'mp4',
+            'formats': formats,
+            'thumbnail': f'{base_url}/media/{entry_id}.jpg?size=65536',
+        }
+
+    if post_id.startswith('car'):
+        return {
+            '_type': 'playlist',
+            'id': post_id,
+            'entries': [video(f'{post_id}_{i}') for i in range(1, 4)],
+        }
+    return video(post_id)
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = UpstreamConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path.startswith('/info/'):
+            self.handle_info(parsed.path[len('/info/'):])
+        elif parsed.path.startswith('/media/'):
+            self.handle_media(parsed.path[len('/media/'):], parse_qs(parsed.query))
+        else:
+            self.send_json(404, {'error': 'Not Found'})
+
+    def do_HEAD(self):
+        parsed = urlparse(self.path)
+        if parsed.path.startswith('/media/'):
+            self.handle_media(parsed.path[len('/media/'):], parse_qs(parsed.query), send_body=False)
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    def handle_info(self, post_id):
+        if self.config.extract_latency:
+            time.sleep(self.config.extract_latency)
+        if post_id.startswith('prv'):
+            self.send_json(403, {'error': 'This content is private'})
+        elif post_id.startswith('gone'):
+            self.send_json(404, {'error': 'Post Not Found'})
+        else:
+            base_url = f'http://{self.headers.get("Host")}'
+            self.send_json(200, build_info(base_url, post_id, self.config.media_size, self.config.url_ttl))
+
+    def handle_media(self, name, query, send_body=True):
+        if 'oe' in query and int(query['oe'][0], 16) <= time.time():
+            self.send_response(403)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        size = int(query.get('size', [self.config.media_size])[0])
+        start, end = 0, size - 1
+        status = 200
+        match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range', ''))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+
+        if self.config.latency:
+            time.sleep(self.config.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', 'image/jpeg' if name.endswith('.jpg') else 'video/mp4')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', f'"{name}-{size}"')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if not send_body:
+            return
+
+        remaining = end - start + 1
+        chunk = b'\0' * CHUNK_SIZE
+        started = time.perf_counter()
+        sent = 0
+        try:
+            while remaining > 0:
+                part = chunk[:min(CHUNK_SIZE, remaining)]
+                self.wfile.write(part)
+                sent += len(part)
+                remaining -= len(part)
+                if self.config.bandwidth:
+                    # Pace the response to the configured bandwidth
+                    ahead = sent / self.config.bandwidth - (time.perf_counter() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start_server(host='127.0.0.1', port=0, config=None):
+    """Start the fake upstream in a background thread and return the server"""
+    handler = type('ConfiguredUpstreamHandler', (UpstreamHandler,), {'config': config or UpstreamConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Instagram/Facebook/CDN server for benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--latency', type=float, default=0.0, help='media time-to-first-byte in seconds')
+    parser.add_argument('--extract-latency', type=float, default=0.0, help='metadata response delay in seconds')
+    parser.add_argument('--bandwidth', type=int, default=0, help='bytes/second per media response (0 = unlimited)')
+    parser.add_argument('--media-size', type=int, default=2 * 1024 * 1024, help='size of the largest format in bytes')
+    parser.add_argument('--url-ttl', type=int, default=6 * 60 * 60, help='seconds until signed media URLs expire')
+    args = parser.parse_args()
+
+    config = UpstreamConfig(args.latency, args.extract_latency, args.bandwidth, args.media_size, args.url_ttl)
+    server = start_server(args.host, args.port, config)
+    print(f'Fake upstream listening on http://{args.host}:{server.server_address[1]}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""
+Load test for the backend against a local fake upstream
+Starts the fake Instagram/Facebook/CDN server, boots the app under gunicorn
+once per worker class, drives /api/validate, /api/fetch and /api/download at
+the requested concurrency and reports latency percentiles, throughput, and
+per-worker RSS and open file descriptors.
+
+    cd backend
+    python -m bench.loadtest --worker-classes gthread,sync --concurrency 32
+    python -m bench.loadtest --output results.json
+    python -m bench.loadtest --baseline results.json --max-regression 0.15
+
+With --baseline, the run exits non-zero if any scenario's p95 latency or
+throughput regresses by more than --max-regression, so it can gate deploys.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.fake_upstream import UpstreamConfig, start_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ('validate', 'fetch', 'download')
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def worker_pids(master_pid):
+    """PIDs of the gunicorn workers forked by master_pid (Linux /proc)"""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == master_pid:
+            pids.append(int(entry))
+    return pids
+
+
+def process_usage(pid):
+    """(RSS bytes, open fd count) for a process"""
+    rss = 0
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+        fds = len(os.listdir(f'/proc/{pid}/fd'))
+    except OSError:
+        return 0, 0
+    return rss, fds
+
+
+class WorkerSampler:
+    """Samples peak RSS and fd counts of each worker while load is applied"""
+
+    def __init__(self, master_pid, interval=0.25):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peaks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            for pid in worker_pids(self.master_pid):
+                rss, fds = process_usage(pid)
+                peak_rss, peak_fds = self.peaks.get(pid, (0, 0))
+                self.peaks[pid] = (max(peak_rss, rss), max(peak_fds, fds))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self):
+        if not self.peaks:
+            return {'workers': 0, 'max_rss_mb': 0, 'max_fds': 0}
+        return {
+            'workers': len(self.peaks),
+            'max_rss_mb': round(max(rss for rss, _ in self.peaks.values()) / 1024 / 1024, 1),
+            'max_fds': max(fds for _, fds in self.peaks.values()),
+        }
+
+
+def start_app(worker_class, args, upstream_url):
+    """Boot the app under gunicorn and wait until it is healthy"""
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        BENCH_UPSTREAM_URL=upstream_url,
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_WORKERS=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        FLASK_ENV='production',
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn_config.py',
+         '--access-logfile', '/dev/null', 'bench.bench_wsgi:app'],
+        cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited during startup (worker class {worker_class})')
+        try:
+            if requests.get(f'{base_url}/api/health', timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('gunicorn did not become healthy within 60s')
+
+
+def stop_app(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def post_url(index, distinct_posts):
+    return f'https://www.instagram.com/p/bench{index % distinct_posts:05d}/'
+
+
+def make_request(session, base_url, scenario, index, args):
+    """Run one request; returns bytes received. Raises on failure."""
+    if scenario == 'validate':
+        response = session.post(f'{base_url}/api/validate', json={'url': post_url(index, args.distinct_posts)}, timeout=30)
+        response.raise_for_status()
+        return len(response.content)
+    if scenario == 'fetch':
+        response = session.post(f'{base_url}/api/fetch', json={'url': post_url(index, args.distinct_posts)}, timeout=120)
+        response.raise_for_status()
+        return len(response.content)
+
+    # download - resolve the post first (served from the extraction cache after warm-up)
+    info = session.post(f'{base_url}/api/fetch', json={'url': post_url(index, args.distinct_posts)}, timeout=120)
+    info.raise_for_status()
+    payload = info.json()
+    response = session.get(f'{base_url}/api/download', params={
+        'media_url': payload['media_url'],
+        'media_type': payload['media_type'],
+        'post_id': payload.get('post_id') or '',
+    }, stream=True, timeout=120)
+    response.raise_for_status()
+    received = 0
+    for chunk in response.iter_content(chunk_size=256 * 1024):
+        received += len(chunk)
+    return received
+
+
+def run_scenario(base_url, scenario, args):
+    """Apply load for one scenario and return its statistics"""
+    local = threading.local()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    received = [0]
+
+    def task(index):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            size = make_request(session, base_url, scenario, index, args)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            received[0] += size
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(task, range(args.requests)))
+    duration = time.perf_counter() - started
+
+    return {
+        'requests': args.requests,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'rps': round(len(latencies) / duration, 1) if duration else 0,
+        'mb_per_s': round(received[0] / duration / 1024 / 1024, 2) if duration else 0,
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Return a list of regressions beyond max_regression relative to baseline"""
+    regressions = []
+    for worker_class, scenarios in results.items():
+        for scenario, stats in scenarios.items():
+            base = baseline.get(worker_class, {}).get(scenario)
+            if not base:
+                continue
+            if base['p95_ms'] and stats['p95_ms'] > base['p95_ms'] * (1 + max_regression):
+                regressions.append(f"{worker_class}/{scenario}: p95 {base['p95_ms']}ms -> {stats['p95_ms']}ms")
+            if base['rps'] and stats['rps'] < base['rps'] * (1 - max_regression):
+                regressions.append(f"{worker_class}/{scenario}: throughput {base['rps']} -> {stats['rps']} req/s")
+    return regressions
+
+
+def print_table(results):
+    header = f"{'worker':<8} {'scenario':<9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'MB/s':>7} {'errors':>6} {'rss MB':>7} {'fds':>5}"
+    print(header)
+    print('-' * len(header))
+    for worker_class, scenarios in results.items():
+        for scenario, s in scenarios.items():
+            print(f"{worker_class:<8} {scenario:<9} {s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8} "
+                  f"{s['rps']:>8} {s['mb_per_s']:>7} {s['errors']:>6} {s['max_rss_mb']:>7} {s['max_fds']:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the backend against a fake upstream')
+    parser.add_argument('--worker-classes', default='gthread', help='comma-separated gunicorn worker classes')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--distinct-posts', type=int, default=20, help='number of distinct post URLs to cycle through')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake CDN time-to-first-byte in seconds')
+    parser.add_argument('--extract-latency', type=float, default=0.5, help='fake extraction delay in seconds')
+    parser.add_argument('--bandwidth', type=int, default=0, help='fake CDN bytes/second per response (0 = unlimited)')
+    parser.add_argument('--media-size', type=int, default=2 * 1024 * 1024)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results from a previous run to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.15)
+    args = parser.parse_args()
+
+    config = UpstreamConfig(args.latency, args.extract_latency, args.bandwidth, args.media_size)
+    upstream = start_server(config=config)
+    upstream_url = f'http://127.0.0.1:{upstream.server_address[1]}'
+
+    results = {}
+    for worker_class in [w.strip() for w in args.worker_classes.split(',') if w.strip()]:
+        process, base_url = start_app(worker_class, args, upstream_url)
+        results[worker_class] = {}
+        try:
+            for scenario in [s.strip() for s in args.scenarios.split(',') if s.strip()]:
+                with WorkerSampler(process.pid) as sampler:
+                    stats = run_scenario(base_url, scenario, args)
+                stats.update(sampler.summary())
+                results[worker_class][scenario] = stats
+        finally:
+            stop_app(process)
+
+    upstream.shutdown()
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print('\nRegressions:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print('\nNo regressions against baseline.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+Extraction cache - TTL + LRU cache for yt-dlp extraction results
+Backends are selected by URI, in the same style as the rate limiter storage:
+    memory://                      in-process dict (per worker)
+    sqlite:////path/to/cache.db    on-disk, shared by all workers on a host
+    redis://host:6379/0            Redis-compatible server, shared across hosts
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from sqlite_db import SQLiteConnections, sqlite_path
+
+logger = logging.getLogger(__name__)
+
+
+class BaseCache:
+    """Common TTL handling and hit/miss accounting for all backends"""
+
+    name = 'base'
+
+    def __init__(self, ttl, max_entries, max_bytes):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+
+    def _count(self, stat, amount=1):
+        with self._stats_lock:
+            self._stats[stat] += amount
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        raw = self._get(key)
+        if raw is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        """Store a JSON-serializable value under key"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        raw = json.dumps(value, separators=(',', ':'))
+        if len(raw) > self.max_bytes:
+            return
+        self._set(key, raw, ttl)
+        self._count('sets')
+
+    def delete(self, key):
+        self._delete(key)
+
+    def stats(self):
+        """Return hit/miss counters for this worker plus backend usage"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['backend'] = self.name
+        stats['ttl'] = self.ttl
+        stats['max_entries'] = self.max_entries
+        stats['max_bytes'] = self.max_bytes
+        stats['pid'] = os.getpid()
+        stats.update(self._usage())
+        return stats
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, raw, ttl):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+    def _usage(self):
+        return {}
+
+
+class MemoryCache(BaseCache):
+    """In-process LRU cache bounded by entry count and total payload bytes"""
+
+    name = 'memory'
+
+    def __init__(self, ttl, max_entries, max_bytes):
+        super().__init__(ttl, max_entries, max_bytes)
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (expires_at, raw)
+        self._bytes = 0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, raw = entry
+            if expires_at <= time.time():
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return raw
+
+    def _set(self, key, raw, ttl):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (time.time() + ttl, raw)
+            self._bytes += len(raw)
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._pop(oldest)
+                self._count('evictions')
+
+    def _delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def _pop(self, key):
+        _, raw = self._data.pop(key)
+        self._bytes -= len(raw)
+
+    def _usage(self):
+        with self._lock:
+            return {'entries': len(self._data), 'bytes': self._bytes}
+
+
+class SQLiteCache(BaseCache):
+    """On-disk cache shared by every worker on the host via a WAL-mode sqlite file"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, ttl, max_entries, max_bytes, table='cache'):
+        super().__init__(ttl, max_entries, max_bytes)
+        self.path = path
+        self.table = table
+        self._connections = SQLiteConnections(path)
+        conn = self._conn()
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+            'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)')
+
+    def _conn(self):
+        return self._connections.get()
+
+    def _get(self, key):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+            return None
+        conn.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def _set(self, key, raw, ttl):
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, size, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, raw, len(raw), now + ttl, now)
+            )
+            conn.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (now,))
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _evict(self, conn):
+        count, total = conn.execute(f'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}').fetchone()
+        while count > self.max_entries or total > self.max_bytes:
+            row = conn.execute(
+                f'SELECT key, size FROM {self.table} ORDER BY accessed_at LIMIT 1'
+            ).fetchone()
+            if row is None:
+                break
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (row[0],))
+            count -= 1
+            total -= row[1]
+            self._count('evictions')
+
+    def _delete(self, key):
+        self._conn().execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def _usage(self):
+        count, total = self._conn().execute(
+            f'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}'
+        ).fetchone()
+        return {'entries': count, 'bytes': total}
+
+
+class RedisCache(BaseCache):
+    """
+    Redis-compatible cache. Expiry uses SETEX; LRU eviction and the memory
+    bound are delegated to the server (maxmemory + allkeys-lru).
+    """
+
+    name = 'redis'
+
+    def __init__(self, uri, ttl, max_entries, max_bytes, prefix='extract:'):
+        super().__init__(ttl, max_entries, max_bytes)
+        try:
+            import redis
+        except ImportError:
+            raise Exception("The redis package is required for a redis:// cache backend")
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(uri)
+
+    def _get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return raw.decode('utf-8') if raw is not None else None
+
+    def _set(self, key, raw, ttl):
+        self._client.setex(self.prefix + key, max(1, int(ttl)), raw)
+
+    def _delete(self, key):
+        self._client.delete(self.prefix + key)
+
+
+def create_cache(uri, ttl, max_entries, max_bytes, namespace=None):
+    """
+    Create a cache backend from a storage URI. Caches with different
+    namespaces can share one sqlite file or Redis server without their keys
+    or size bounds interfering.
+    """
+    parsed = urlparse(uri)
+    if parsed.scheme == 'memory':
+        return MemoryCache(ttl, max_entries, max_bytes)
+    if parsed.scheme == 'sqlite':
+        path = sqlite_path(uri)
+        table = f'{namespace}_cache' if namespace else 'cache'
+        return SQLiteCache(path, ttl, max_entries, max_bytes, table=table)
+    if parsed.scheme in ('redis', 'rediss', 'unix'):
+        prefix = f'{namespace}:' if namespace else 'extract:'
+        return RedisCache(uri, ttl, max_entries, max_bytes, prefix=prefix)
+    raise ValueError(f"Unsupported cache backend: {uri}")
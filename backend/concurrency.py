@@ -0,0 +1,111 @@
+"""
+Concurrency controls for the I/O-bound backend
+Per-route concurrency limits and a bounded executor for blocking yt-dlp calls,
+so slow upstreams cannot exhaust every worker thread.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when a limiter or executor has no free capacity"""
+
+
+class ConcurrencyLimiter:
+    """Counting semaphore with a bounded wait and usage counters"""
+
+    def __init__(self, name, limit, wait_timeout=0):
+        self.name = name
+        self.limit = limit
+        self.wait_timeout = wait_timeout
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._rejected = 0
+
+    def acquire(self):
+        """Take a slot, waiting up to wait_timeout seconds. Returns False if none freed up."""
+        if not self._semaphore.acquire(timeout=self.wait_timeout):
+            with self._lock:
+                self._rejected += 1
+            return False
+        with self._lock:
+            self._active += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'active': self._active,
+                'rejected': self._rejected
+            }
+
+
+class BoundedExecutor:
+    """
+    Thread pool for blocking calls with a cap on queued work. Callers wait for
+    the result up to a timeout; the pool itself never grows past max_workers.
+    """
+
+    def __init__(self, max_workers, max_pending, thread_name_prefix='executor', initializer=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=thread_name_prefix,
+            initializer=initializer
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._timeouts = 0
+        self._rejected = 0
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """Run fn in the pool and wait for its result, raising on overload or timeout"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise ConcurrencyLimitExceeded("Server is busy. Please try again shortly.")
+        with self._lock:
+            self._pending += 1
+
+        def task():
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                self._slots.release()
+
+        try:
+            future = self._executor.submit(task)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+            raise
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # The task keeps its slot until it actually finishes
+            with self._lock:
+                self._timeouts += 1
+            raise Exception("Timed out while extracting media. Please try again.")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'in_flight': self._pending,
+                'timeouts': self._timeouts,
+                'rejected': self._rejected
+            }
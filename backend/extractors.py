@@ -0,0 +1,336 @@
+"""
+Extractor engine - one yt-dlp pipeline for every supported platform
+Platforms register the yt-dlp extractor keys that handle them; URLs are
+matched to platforms by the URL classifier. Each extraction thread keeps a
+pre-initialised YoutubeDL instance, so the extractor lookup and option
+parsing are paid once per thread, not per request.
+
+yt-dlp is imported on first use (or by preload()), and each YoutubeDL only
+loads the extractors of the registered platforms instead of all of them.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from formats import audio_candidates, format_candidates
+from throttle import UpstreamThrottled, is_throttle_error
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('mp4', 'webm', 'mkv')
+
+YDL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'extract_flat': False,
+    'no_check_certificate': True,
+    'ignoreerrors': False,
+}
+
+# Extractors tried after the platforms' own, for links they do not match
+# (share links and fb.watch redirects)
+FALLBACK_IE_KEYS = ('Generic',)
+
+
+class PostUnavailable(Exception):
+    """
+    Extraction failed for a reason that will not go away on retry.
+    reason is 'private' or 'not_found'.
+    """
+
+    def __init__(self, message, reason):
+        self.reason = reason
+        super().__init__(message)
+
+
+class MediaURLExpired(Exception):
+    """A signed CDN URL has expired (or the CDN no longer accepts it)"""
+
+    def __init__(self, media_url):
+        self.media_url = media_url
+        super().__init__("Media link has expired. Please fetch the post again.")
+
+
+class Platform:
+    """A supported source platform and the yt-dlp extractors that handle it"""
+
+    def __init__(self, name, label, ie_keys=()):
+        self.name = name
+        self.label = label
+        self.ie_keys = tuple(ie_keys)
+
+
+def http_status(error):
+    """
+    HTTP status of the response behind a yt-dlp error, or None. DownloadError
+    and ExtractorError keep the original exception in exc_info / cause.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        status = getattr(error, 'status', None) or getattr(error, 'code', None)
+        if isinstance(status, int):
+            return status
+        exc_info = getattr(error, 'exc_info', None)
+        error = (getattr(error, 'cause', None) or (exc_info[1] if exc_info else None) or
+                 error.__cause__)
+    return None
+
+
+def is_video_info(info):
+    """Whether a yt-dlp info dict (or format) describes a video"""
+    return (info.get('ext') in VIDEO_EXTENSIONS or
+            'video' in str(info.get('format', '')).lower())
+
+
+def media_url_expiry(media_url):
+    """
+    Unix time a signed Instagram/Facebook CDN URL expires, from its oe=
+    parameter (hex seconds), or None if the URL carries no expiry
+    """
+    for value in parse_qs(urlsplit(media_url or '').query).get('oe', []):
+        try:
+            return int(value, 16)
+        except ValueError:
+            continue
+    return None
+
+
+def is_media_url_expired(media_url, margin=0):
+    """Whether media_url expires within margin seconds"""
+    expires_at = media_url_expiry(media_url)
+    return expires_at is not None and expires_at <= time.time() + margin
+
+
+def earliest_expiry(urls):
+    """Earliest expiry among urls, or None if none of them expires"""
+    expiries = [expiry for expiry in map(media_url_expiry, urls) if expiry is not None]
+    return min(expiries) if expiries else None
+
+
+def item_urls(items):
+    """Every media URL in a list of extracted items, including format candidates"""
+    urls = []
+    for item in items:
+        urls.append(item['media_url'])
+        urls.extend(fmt['url'] for fmt in item.get('formats', []) + item.get('audio_formats', []))
+    return urls
+
+
+def select_media(info):
+    """
+    Pick the best media URL from a yt-dlp info dict.
+    Returns (media_url, media_type), or (None, None) if nothing usable was found.
+    """
+    # Direct video URL
+    if info.get('url') and is_video_info(info):
+        return info['url'], 'video'
+
+    formats = info.get('formats') or []
+    if formats:
+        # Best quality video format
+        video_formats = [f for f in formats if f.get('vcodec') != 'none']
+        if video_formats:
+            best_video = max(video_formats, key=lambda x: x.get('height') or x.get('width') or 0)
+            if best_video.get('url'):
+                return best_video['url'], 'video'
+        else:
+            # No video, try image
+            image_formats = [f for f in formats if f.get('vcodec') == 'none']
+            if image_formats and image_formats[0].get('url'):
+                return image_formats[0]['url'], 'image'
+
+    # Fallback: thumbnail or direct URL
+    if info.get('thumbnail'):
+        return info['thumbnail'], 'image'
+    if info.get('url'):
+        return info['url'], 'video' if is_video_info(info) else 'image'
+    return None, None
+
+
+class ExtractorEngine:
+    """Platform registry plus thread-local, reusable YoutubeDL instances"""
+
+    def __init__(self, ydl_opts=None, entry_workers=4, throttle=None):
+        self.ydl_opts = dict(ydl_opts or YDL_OPTS)
+        self.entry_workers = entry_workers
+        self.throttle = throttle  # HostThrottle keyed by platform name, or None
+        self.platforms = {}
+        self._local = threading.local()
+
+    def register(self, platform):
+        self.platforms[platform.name] = platform
+        return platform
+
+    def get(self, name):
+        """Return the registered platform called name, or None"""
+        return self.platforms.get(name)
+
+    def ie_keys(self):
+        """yt-dlp extractor keys to load, in matching order"""
+        keys = [ie_key for platform in self.platforms.values() for ie_key in platform.ie_keys]
+        return keys + [ie_key for ie_key in FALLBACK_IE_KEYS if ie_key not in keys]
+
+    def preload(self):
+        """
+        Import yt-dlp and the registered extractor classes. Called in the
+        gunicorn master with preload_app, so workers share them copy-on-write.
+        """
+        from yt_dlp.extractor import get_info_extractor
+        for ie_key in self.ie_keys():
+            get_info_extractor(ie_key)
+
+    def get_ydl(self):
+        """Return this thread's YoutubeDL instance, creating and warming it on first use"""
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None or getattr(self._local, 'pid', None) != os.getpid():
+            import yt_dlp
+            # auto_init=False skips loading every extractor yt-dlp ships;
+            # only the registered ones are instantiated, in matching order
+            ydl = yt_dlp.YoutubeDL(self.ydl_opts, auto_init=False)
+            for ie_key in self.ie_keys():
+                ydl.get_info_extractor(ie_key)
+            self._local.ydl = ydl
+            self._local.pid = os.getpid()
+        return ydl
+
+    def warm(self):
+        """Pre-initialise the YoutubeDL instance for the calling thread"""
+        self.get_ydl()
+
+    def extract_info(self, platform, url):
+        """
+        Run yt-dlp extraction at the platform's throttled rate. Rate-limit and
+        login-wall errors back the platform off.
+        """
+        import yt_dlp
+        if self.throttle is None:
+            return self._extract_info(platform, url)
+        self.throttle.acquire(platform.name)
+        try:
+            info = self._extract_info(platform, url)
+        except yt_dlp.utils.DownloadError as e:
+            if is_throttle_error(str(e), http_status(e)):
+                logger.warning(f"{platform.label} is rate limiting extraction: {str(e)}")
+                self.throttle.penalize(platform.name)
+            raise
+        self.throttle.reward(platform.name)
+        return info
+
+    def _extract_info(self, platform, url):
+        """Run yt-dlp extraction, skipping the generic extractor search when possible"""
+        ydl = self.get_ydl()
+        for ie_key in platform.ie_keys:
+            if ydl.get_info_extractor(ie_key).suitable(url):
+                return ydl.extract_info(url, download=False, ie_key=ie_key)
+        return ydl.extract_info(url, download=False)
+
+    def resolve_entries(self, platform, info):
+        """
+        Return the fully extracted entries of a playlist-type result (e.g. an
+        Instagram carousel). Entries that are still URL references are
+        extracted in parallel; entries that fail to resolve are skipped.
+        """
+        entries = [entry for entry in (info.get('entries') or []) if entry]
+        pending = [i for i, entry in enumerate(entries)
+                   if entry.get('_type') in ('url', 'url_transparent') and entry.get('url')]
+        if not pending:
+            return entries
+
+        def resolve(index):
+            try:
+                return self.extract_info(platform, entries[index]['url'])
+            except Exception as e:
+                logger.warning(f"Failed to resolve {platform.label} post item: {str(e)}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=min(len(pending), self.entry_workers),
+                                thread_name_prefix='entry') as executor:
+            resolved = dict(zip(pending, executor.map(resolve, pending)))
+        return [resolved.get(i, entry) for i, entry in enumerate(entries)
+                if resolved.get(i, entry) is not None]
+
+    def select_items(self, platform, info):
+        """
+        Best media URL and type for every item of a post. Video items also
+        list their candidate video and audio-only formats so a format policy
+        can be applied later.
+        """
+        if info.get('_type') in ('playlist', 'multi_video') or info.get('entries'):
+            sources = self.resolve_entries(platform, info)
+        else:
+            sources = [info]
+        items = []
+        for source in sources:
+            media_url, media_type = select_media(source)
+            if media_url:
+                item = {'media_url': media_url, 'media_type': media_type,
+                        'expires_at': media_url_expiry(media_url)}
+                if media_type == 'video':
+                    item['formats'] = format_candidates(source)
+                    item['audio_formats'] = audio_candidates(source)
+                items.append(item)
+        if not items:
+            # Fall back to the post-level thumbnail/URL
+            media_url, media_type = select_media(info)
+            if media_url:
+                items.append({'media_url': media_url, 'media_type': media_type,
+                              'expires_at': media_url_expiry(media_url)})
+        return items
+
+    def fetch(self, platform, url):
+        """
+        Fetch media info for a post on the given platform. url should be the
+        classifier's canonical URL (tracking parameters already removed).
+        """
+        import yt_dlp
+        try:
+            try:
+                info = self.extract_info(platform, url)
+
+                if not info:
+                    raise Exception("No media information found")
+
+                items = self.select_items(platform, info)
+                if not items:
+                    raise Exception(f"Could not extract media URL from {platform.label} post")
+
+                # The first item is kept at the top level for single-media clients.
+                # expires_at is when the first of the post's signed URLs expires.
+                return {
+                    'media_url': items[0]['media_url'],
+                    'media_type': items[0]['media_type'],
+                    'source': platform.name,
+                    'items': items,
+                    'expires_at': earliest_expiry(item_urls(items))
+                }
+
+            except UpstreamThrottled:
+                raise
+            except yt_dlp.utils.DownloadError as e:
+                error_msg = str(e)
+                if is_throttle_error(error_msg, http_status(e)):
+                    # A login wall or rate limit says nothing about the post itself
+                    raise Exception(f"Failed to extract media: {error_msg}")
+                elif 'Private' in error_msg or 'private' in error_msg:
+                    raise PostUnavailable("This post is private or requires login", 'private')
+                elif 'Not Found' in error_msg or 'not found' in error_msg:
+                    raise PostUnavailable("Post not found. It may have been deleted.", 'not_found')
+                else:
+                    raise Exception(f"Failed to extract media: {error_msg}")
+            except Exception as e:
+                logger.error(f"yt-dlp extraction error: {str(e)}")
+                raise Exception(f"Failed to extract media: {str(e)}")
+
+        except UpstreamThrottled:
+            raise
+        except PostUnavailable as e:
+            logger.error(f"Error fetching {platform.label} media: {str(e)}")
+            raise PostUnavailable(f"Failed to extract media from {platform.label} post: {str(e)}", e.reason)
+        except Exception as e:
+            logger.error(f"Error fetching {platform.label} media: {str(e)}")
+            raise Exception(f"Failed to extract media from {platform.label} post: {str(e)}")
@@ -0,0 +1,241 @@
+"""
+Format selection policy
+Chooses which format of a video to download from the yt-dlp metadata
+(resolution, codec, audio, and size from filesize/tbr) before any media is
+transferred, so oversized files are rejected up front instead of halfway
+through a download. Video-only formats can be paired with a separate audio
+format, which the download then muxes in.
+"""
+
+# vcodec prefixes for each codec a client can ask for
+CODECS = {
+    'h264': ('avc1', 'avc3', 'h264'),
+    'vp9': ('vp9', 'vp09'),
+    'av1': ('av01', 'av1'),
+}
+
+
+class MediaTooLarge(Exception):
+    """No format of a post fits the size limit"""
+
+    def __init__(self, size, limit):
+        self.size = size
+        self.limit = limit
+        super().__init__(
+            f"Media is too large ({size / 1024 / 1024:.1f} MB); "
+            f"the limit is {limit / 1024 / 1024:.1f} MB"
+        )
+
+
+class SizeLimits:
+    """
+    Maximum media size in bytes per platform and media type, with a default
+    for everything no rule matches. 0 means no limit.
+    """
+
+    def __init__(self, default, rules=None):
+        self.default = default
+        self.rules = rules or {}    # (platform or '*', media type or '*') -> bytes
+
+    @classmethod
+    def parse(cls, default, spec):
+        """
+        Build limits from a spec like "instagram:video=262144000,*:image=20971520".
+        Raises ValueError on malformed rules.
+        """
+        rules = {}
+        for rule in (spec or '').split(','):
+            rule = rule.strip()
+            if not rule:
+                continue
+            try:
+                target, value = rule.split('=', 1)
+                platform, media_type = target.strip().lower().split(':', 1)
+                limit = int(value)
+            except ValueError:
+                raise ValueError(f'Invalid size limit rule "{rule}"; expected platform:media_type=bytes')
+            if limit < 0:
+                raise ValueError(f'Invalid size limit rule "{rule}"; the limit must not be negative')
+            rules[(platform.strip() or '*', media_type.strip() or '*')] = limit
+        return cls(default, rules)
+
+    def limit_for(self, platform=None, media_type=None):
+        """Most specific limit for a platform and media type"""
+        for key in ((platform, media_type), (platform, '*'), ('*', media_type), ('*', '*')):
+            if key in self.rules:
+                return self.rules[key]
+        return self.default
+
+    def largest(self):
+        """Highest limit of any rule (0 if any of them is unlimited)"""
+        limits = [self.default, *self.rules.values()]
+        return 0 if 0 in limits else max(limits)
+
+    def check(self, size, platform=None, media_type=None):
+        """Raise MediaTooLarge if a known size exceeds the limit"""
+        limit = self.limit_for(platform, media_type)
+        if size is not None and limit and size > limit:
+            raise MediaTooLarge(size, limit)
+
+
+class FormatPolicy:
+    """Constraints and preferences for picking a video format"""
+
+    def __init__(self, max_height=0, max_bytes=0, prefer_codec=None, require_audio=True):
+        self.max_height = max_height        # 0 = any resolution
+        self.max_bytes = max_bytes          # 0 = any size
+        self.prefer_codec = prefer_codec    # key of CODECS, or None
+        self.require_audio = require_audio
+
+    @classmethod
+    def from_options(cls, options, default):
+        """
+        Build a policy from request options ({'max_height', 'max_bytes',
+        'codec', 'audio'}), falling back to default for missing keys. The
+        default's max_bytes is a hard cap. Raises ValueError on bad options.
+        """
+        if not options:
+            return default
+        if not isinstance(options, dict):
+            raise ValueError('format must be an object')
+
+        limits = {}
+        for key, fallback in (('max_height', default.max_height), ('max_bytes', default.max_bytes)):
+            value = options.get(key, fallback)
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ValueError(f'format.{key} must be a non-negative integer')
+            limits[key] = value
+        if default.max_bytes:
+            limits['max_bytes'] = min(limits['max_bytes'] or default.max_bytes, default.max_bytes)
+
+        codec = options.get('codec', default.prefer_codec)
+        if codec is not None and codec not in CODECS:
+            raise ValueError(f"format.codec must be one of: {', '.join(CODECS)}")
+
+        require_audio = options.get('audio', default.require_audio)
+        if not isinstance(require_audio, bool):
+            raise ValueError('format.audio must be a boolean')
+
+        return cls(limits['max_height'], limits['max_bytes'], codec, require_audio)
+
+    def capped(self, max_bytes):
+        """This policy with its size limit lowered to max_bytes (0 = unchanged)"""
+        if not max_bytes or (self.max_bytes and self.max_bytes <= max_bytes):
+            return self
+        return FormatPolicy(self.max_height, max_bytes, self.prefer_codec, self.require_audio)
+
+    def codec_rank(self, vcodec):
+        if not self.prefer_codec or not vcodec:
+            return 0
+        return 1 if vcodec.lower().startswith(CODECS[self.prefer_codec]) else 0
+
+
+def estimate_size(fmt, duration):
+    """Size in bytes from filesize, filesize_approx, or tbr (kbit/s) x duration"""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return int(size)
+    if fmt.get('tbr') and duration:
+        return int(fmt['tbr'] * 1000 / 8 * duration)
+    return None
+
+
+def is_single_file(fmt):
+    # Manifests cannot be piped through as a single file
+    return bool(fmt.get('url')) and \
+        not fmt.get('protocol', 'https').startswith(('m3u8', 'http_dash_segments'))
+
+
+def format_candidates(info):
+    """
+    Compact descriptions of the downloadable video formats in a yt-dlp info
+    dict. Sizes that cannot be derived from the metadata are None.
+    """
+    candidates = []
+    for fmt in info.get('formats') or []:
+        if fmt.get('vcodec') == 'none' or not is_single_file(fmt):
+            continue
+        candidates.append({
+            'url': fmt['url'],
+            'ext': fmt.get('ext'),
+            'height': fmt.get('height') or 0,
+            'width': fmt.get('width') or 0,
+            'vcodec': fmt.get('vcodec'),
+            'acodec': fmt.get('acodec'),
+            'filesize': estimate_size(fmt, info.get('duration')),
+        })
+    return candidates
+
+
+def audio_candidates(info):
+    """Compact descriptions of the audio-only formats in a yt-dlp info dict"""
+    candidates = []
+    for fmt in info.get('formats') or []:
+        if fmt.get('vcodec') != 'none' or fmt.get('acodec') in (None, 'none') or not is_single_file(fmt):
+            continue
+        candidates.append({
+            'url': fmt['url'],
+            'ext': fmt.get('ext'),
+            'acodec': fmt.get('acodec'),
+            'abr': fmt.get('abr') or fmt.get('tbr') or 0,
+            'filesize': estimate_size(fmt, info.get('duration')),
+        })
+    return candidates
+
+
+def select_audio(candidates):
+    """Best audio-only format to mux into MP4: AAC first, then highest bitrate"""
+    if not candidates:
+        return None
+    return max(candidates, key=lambda c: (
+        (c.get('acodec') or '').startswith('mp4a') or c.get('ext') == 'm4a',
+        c['abr'],
+    ))
+
+
+def select_format(candidates, policy, sizes=None, audio=None):
+    """
+    Pick the best candidate under policy. sizes maps URLs to sizes probed
+    for candidates without one. audio is the audio-only format that will be
+    muxed into a video-only candidate (its size counts towards the limit),
+    or None if muxing is unavailable. Raises MediaTooLarge if every
+    candidate of known size exceeds policy.max_bytes.
+    """
+    sizes = sizes or {}
+
+    def size_of(candidate):
+        return candidate['filesize'] if candidate['filesize'] is not None else sizes.get(candidate['url'])
+
+    def has_audio(candidate):
+        return candidate.get('acodec') != 'none'
+
+    def total_size(candidate):
+        size = size_of(candidate)
+        if size is not None and audio and not has_audio(candidate):
+            size += size_of(audio) or 0
+        return size
+
+    pool = candidates
+    if policy.require_audio:
+        # Prefer formats that have (or can be muxed with) audio; a silent
+        # video still beats no download
+        with_audio = [c for c in pool if has_audio(c) or audio]
+        pool = with_audio or pool
+
+    if policy.max_bytes:
+        fitting = [c for c in pool if total_size(c) is None or total_size(c) <= policy.max_bytes]
+        if not fitting:
+            raise MediaTooLarge(min(total_size(c) for c in pool), policy.max_bytes)
+        pool = fitting
+
+    if policy.max_height:
+        within = [c for c in pool if (c['height'] or c['width']) <= policy.max_height]
+        # Nothing small enough - settle for the lowest resolution available
+        pool = within or [min(pool, key=lambda c: c['height'] or c['width'])]
+
+    return max(pool, key=lambda c: (
+        c['height'] or c['width'],
+        policy.codec_rank(c.get('vcodec')),
+        has_audio(c),  # No muxing needed
+        size_of(c) or 0,
+    ))
@@ -3,6 +3,24 @@ Gunicorn configuration for production
 """
 import multiprocessing
 import os
+import shutil
+import tempfile
+
+# Prometheus multi-process metrics - workers write samples here and
+# /api/metrics aggregates them. Must be set before the app is imported.
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'media-downloader-metrics')
+)
+# Start every deployment with empty metric files. This has to happen here:
+# preload_app imports the app, which sets gauges, before on_starting runs.
+# The config is reloaded on SIGHUP, so only clear once per master process.
+if os.environ.get('METRICS_DIR_CLEARED_BY') != str(os.getpid()):
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.environ['METRICS_DIR_CLEARED_BY'] = str(os.getpid())
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+from prometheus_client import multiprocess  # noqa: E402 - needs the env var above
 
 # Server socket
 # Railway provides PORT environment variable
@@ -13,14 +31,26 @@ backlog = 2048
 # Worker processes - optimized for Railway (limited resources)
 # Use fewer workers to avoid memory issues
 cpu_count = multiprocessing.cpu_count()
-workers = min(4, max(2, cpu_count))  # 2-4 workers max
-worker_class = 'sync'
-worker_connections = 1000
-timeout = 30  # Reduced timeout
+workers = int(os.getenv('GUNICORN_WORKERS', min(4, max(2, cpu_count))))  # 2-4 workers by default
+
+# The API is I/O bound (yt-dlp extraction, CDN downloads), so workers serve
+# requests on threads by default and a slow download only ties up one thread.
+# 'gevent' is also supported (pip install gevent); 'sync' restores the old model.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 16))  # Used by gthread
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))  # Used by gevent
+# gthread/gevent workers heartbeat from their main loop, so this only
+# kills a worker that is genuinely stuck, not one serving a long download
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
 keepalive = 2  # Reduced keepalive
 max_requests = 1000  # Restart workers after N requests to prevent memory leaks
 max_requests_jitter = 50
 
+# Import the app (and yt-dlp) once in the master; forked and recycled
+# workers start with it already loaded and share its memory copy-on-write
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
 # Logging
 accesslog = '-'
 errorlog = '-'
@@ -42,3 +72,7 @@ tmp_upload_dir = None
 # keyfile = '/path/to/keyfile'
 # certfile = '/path/to/certfile'
 
+
+def child_exit(server, worker):
+    """Drop live gauges of workers that exited or were recycled"""
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,93 @@
+"""
+Pooled HTTP client for upstream CDN requests
+One keep-alive requests.Session per worker process, with a bounded connection
+pool per host, retries with backoff on connect/read errors and connection
+reuse counters.
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class PooledHTTPClient:
+    """Lazily builds a pooled session per process (safe across gunicorn forks)"""
+
+    def __init__(self, headers, pool_connections=10, pool_maxsize=32,
+                 retries=2, backoff_factor=0.3, connect_timeout=5, read_timeout=60):
+        self.headers = headers
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = (connect_timeout, read_timeout)
+        self._lock = threading.Lock()
+        self._session = None
+        self._adapter = None
+        self._pid = None
+
+    @property
+    def session(self):
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session, self._adapter = self._build_session()
+                    self._pid = os.getpid()
+        return self._session
+
+    def _build_session(self):
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=self.retries,
+            status=0,
+            backoff_factor=self.backoff_factor,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry,
+            pool_block=False
+        )
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session, adapter
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('allow_redirects', True)
+        return self.session.head(url, **kwargs)
+
+    def stats(self):
+        """Connection reuse counters for this worker, aggregated over all host pools"""
+        stats = {
+            'pool_maxsize': self.pool_maxsize,
+            'hosts': 0,
+            'requests': 0,
+            'connections_opened': 0,
+            'connections_reused': 0,
+        }
+        adapter = self._adapter
+        if adapter is None or self._pid != os.getpid():
+            return stats
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats['hosts'] += 1
+            stats['requests'] += pool.num_requests
+            stats['connections_opened'] += pool.num_connections
+        stats['connections_reused'] = max(0, stats['requests'] - stats['connections_opened'])
+        return stats
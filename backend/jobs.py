@@ -0,0 +1,510 @@
+"""
+Background download jobs
+Large downloads can be queued instead of run inside the request handler:
+a pool of worker threads in every gunicorn worker claims queued jobs, runs
+them with a concurrency limit per upstream host, writes the result to an
+artifact file kept for a TTL, and optionally POSTs the final status to a
+callback URL. Job state lives in a store selected by URI, like the
+extraction cache:
+    sqlite:////path/to/jobs.db     shared by all workers on a host (the default)
+    memory://                      in-process (jobs only run in the worker that queued them)
+    redis://host:6379/0            Redis-compatible server (artifact dir must be shared too)
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import requests
+
+from sqlite_db import SQLiteConnections, sqlite_path
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED = (DONE, FAILED)
+
+CALLBACK_ATTEMPTS = 3
+
+# Artifact files are named after their job ID
+JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def new_job(request_data, host, callback_url=None):
+    """A new queued job record"""
+    return {
+        'id': uuid.uuid4().hex,
+        'status': QUEUED,
+        'host': host,
+        'request': request_data,
+        'callback_url': callback_url,
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+        'expires_at': None,
+        'result': None,
+        'error': None,
+    }
+
+
+class MemoryJobStore:
+    """In-process job store"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # id -> job, in submission order
+
+    def add(self, job):
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def finish(self, job_id, **fields):
+        """Update a running job; returns False if it is no longer running"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != RUNNING:
+                return False
+            job.update(fields)
+            return True
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def claim(self, busy_hosts=()):
+        """Mark the oldest queued job on a host not in busy_hosts as running and return it"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job['status'] == QUEUED and job['host'] not in busy_hosts:
+                    job.update(status=RUNNING, started_at=time.time())
+                    return dict(job)
+        return None
+
+    def find(self, status, before):
+        """Jobs in status whose relevant timestamp is older than before"""
+        field = 'started_at' if status == RUNNING else 'expires_at'
+        with self._lock:
+            return [dict(job) for job in self._jobs.values()
+                    if job['status'] == status and job[field] is not None and job[field] <= before]
+
+    def counts(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            return counts
+
+
+class SQLiteJobStore:
+    """Job store shared by every worker on the host via a WAL-mode sqlite file"""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._connections = SQLiteConnections(path)
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, status TEXT NOT NULL, host TEXT NOT NULL, '
+            'created_at REAL NOT NULL, started_at REAL, expires_at REAL, data TEXT NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+
+    def _conn(self):
+        return self._connections.get()
+
+    def _save(self, conn, job):
+        conn.execute(
+            'INSERT OR REPLACE INTO jobs (id, status, host, created_at, started_at, expires_at, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (job['id'], job['status'], job['host'], job['created_at'], job['started_at'],
+             job['expires_at'], json.dumps(job, separators=(',', ':')))
+        )
+
+    def add(self, job):
+        self._save(self._conn(), job)
+
+    def get(self, job_id):
+        row = self._conn().execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, job_id, **fields):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row:
+                job = json.loads(row[0])
+                job.update(fields)
+                self._save(conn, job)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def finish(self, job_id, **fields):
+        """Update a running job; returns False if it is no longer running"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT data FROM jobs WHERE id = ? AND status = ?',
+                               (job_id, RUNNING)).fetchone()
+            if row:
+                job = json.loads(row[0])
+                job.update(fields)
+                self._save(conn, job)
+            conn.execute('COMMIT')
+            return row is not None
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def delete(self, job_id):
+        self._conn().execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def claim(self, busy_hosts=()):
+        """Mark the oldest queued job on a host not in busy_hosts as running and return it"""
+        conn = self._conn()
+        busy_hosts = list(busy_hosts)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT data FROM jobs WHERE status = ? AND host NOT IN '
+                f'({", ".join("?" * len(busy_hosts))}) ORDER BY created_at LIMIT 1',
+                [QUEUED] + busy_hosts
+            ).fetchone()
+            job = None
+            if row:
+                job = json.loads(row[0])
+                job.update(status=RUNNING, started_at=time.time())
+                self._save(conn, job)
+            conn.execute('COMMIT')
+            return job
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def find(self, status, before):
+        """Jobs in status whose relevant timestamp is older than before"""
+        field = 'started_at' if status == RUNNING else 'expires_at'
+        rows = self._conn().execute(
+            f'SELECT data FROM jobs WHERE status = ? AND {field} <= ?', (status, before)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def counts(self):
+        rows = self._conn().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return dict(rows)
+
+
+class RedisJobStore:
+    """
+    Redis-compatible job store. Job records are JSON strings; queued job IDs
+    sit in a list that workers claim from with LREM, so each job runs once.
+    """
+
+    name = 'redis'
+
+    def __init__(self, uri, prefix='jobs:', scan_limit=100):
+        try:
+            import redis
+        except ImportError:
+            raise Exception("The redis package is required for a redis:// job store")
+        self.prefix = prefix
+        self.scan_limit = scan_limit
+        self._client = redis.Redis.from_url(uri)
+
+    def _key(self, job_id):
+        return f'{self.prefix}job:{job_id}'
+
+    def add(self, job):
+        pipe = self._client.pipeline()
+        pipe.set(self._key(job['id']), json.dumps(job, separators=(',', ':')))
+        pipe.sadd(f'{self.prefix}all', job['id'])
+        pipe.rpush(f'{self.prefix}queue', job['id'])
+        pipe.execute()
+
+    def get(self, job_id):
+        raw = self._client.get(self._key(job_id))
+        return json.loads(raw) if raw else None
+
+    def update(self, job_id, **fields):
+        job = self.get(job_id)
+        if job:
+            job.update(fields)
+            self._client.set(self._key(job_id), json.dumps(job, separators=(',', ':')))
+
+    def finish(self, job_id, **fields):
+        """Update a running job; returns False if it is no longer running"""
+        key = self._key(job_id)
+
+        def apply(pipe):
+            # Retried by redis-py if the job changes between GET and EXEC
+            raw = pipe.get(key)
+            job = json.loads(raw) if raw else None
+            if job is None or job['status'] != RUNNING:
+                return False
+            job.update(fields)
+            pipe.multi()
+            pipe.set(key, json.dumps(job, separators=(',', ':')))
+            return True
+        return self._client.transaction(apply, key, value_from_callable=True)
+
+    def delete(self, job_id):
+        pipe = self._client.pipeline()
+        pipe.delete(self._key(job_id))
+        pipe.srem(f'{self.prefix}all', job_id)
+        pipe.lrem(f'{self.prefix}queue', 0, job_id)
+        pipe.execute()
+
+    def claim(self, busy_hosts=()):
+        """Take the oldest queued job on a host not in busy_hosts off the queue"""
+        queue_key = f'{self.prefix}queue'
+        for raw_id in self._client.lrange(queue_key, 0, self.scan_limit - 1):
+            job = self.get(raw_id.decode('utf-8'))
+            if job is None:
+                self._client.lrem(queue_key, 1, raw_id)
+                continue
+            if job['host'] in busy_hosts:
+                continue
+            # Whoever removes the ID from the queue owns the job
+            if self._client.lrem(queue_key, 1, raw_id):
+                job.update(status=RUNNING, started_at=time.time())
+                self.update(job['id'], status=RUNNING, started_at=job['started_at'])
+                return job
+        return None
+
+    def _all(self):
+        ids = [raw.decode('utf-8') for raw in self._client.smembers(f'{self.prefix}all')]
+        jobs = []
+        for job_id in ids:
+            job = self.get(job_id)
+            if job is None:
+                self._client.srem(f'{self.prefix}all', job_id)
+            else:
+                jobs.append(job)
+        return jobs
+
+    def find(self, status, before):
+        """Jobs in status whose relevant timestamp is older than before"""
+        field = 'started_at' if status == RUNNING else 'expires_at'
+        return [job for job in self._all()
+                if job['status'] == status and job[field] is not None and job[field] <= before]
+
+    def counts(self):
+        counts = {}
+        for job in self._all():
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return counts
+
+
+def create_job_store(uri):
+    """Create a job store from a storage URI"""
+    parsed = urlparse(uri)
+    if parsed.scheme == 'memory':
+        return MemoryJobStore()
+    if parsed.scheme == 'sqlite':
+        return SQLiteJobStore(sqlite_path(uri))
+    if parsed.scheme in ('redis', 'rediss', 'unix'):
+        return RedisJobStore(uri)
+    raise ValueError(f"Unsupported job store: {uri}")
+
+
+class JobQueue:
+    """
+    Runs queued jobs on a pool of daemon threads in the current process.
+
+    handler(job, artifact_path) does the work, writes the artifact, and
+    returns a JSON-serializable result. Threads are started lazily (and
+    again after a fork), so the queue can be created at import time.
+    """
+
+    def __init__(self, store, handler, artifact_dir, workers=2, per_host_limit=2,
+                 artifact_ttl=3600, job_timeout=900, poll_interval=1.0, callback_timeout=10):
+        self.store = store
+        self.handler = handler
+        self.artifact_dir = artifact_dir
+        self.workers = workers
+        self.per_host_limit = per_host_limit
+        self.artifact_ttl = artifact_ttl
+        self.job_timeout = job_timeout
+        self.poll_interval = poll_interval
+        self.callback_timeout = callback_timeout
+        os.makedirs(artifact_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running_hosts = {}  # host -> jobs running in this process
+        self._pid = None
+        self._last_sweep = 0.0
+
+    def ensure_started(self):
+        """Start the worker threads in this process if they are not running yet"""
+        if self._pid == os.getpid() or self.workers <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._running_hosts = {}
+            for index in range(self.workers):
+                threading.Thread(target=self._run, name=f'job-{index}', daemon=True).start()
+
+    def submit(self, request_data, host, callback_url=None):
+        """Queue a job and return its record"""
+        job = new_job(request_data, host, callback_url)
+        self.store.add(job)
+        self.ensure_started()
+        self._wake.set()
+        return job
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def artifact_path(self, job_id):
+        return os.path.join(self.artifact_dir, job_id)
+
+    def _busy_hosts(self):
+        with self._lock:
+            return {host for host, count in self._running_hosts.items() if count >= self.per_host_limit}
+
+    def _track(self, host, delta):
+        with self._lock:
+            self._running_hosts[host] = self._running_hosts.get(host, 0) + delta
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+                job = self.store.claim(self._busy_hosts())
+            except Exception as e:
+                logger.error(f"Job queue error: {str(e)}")
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._process(job)
+
+    def _process(self, job):
+        self._track(job['host'], 1)
+        path = self.artifact_path(job['id'])
+        try:
+            result = self.handler(job, path)
+            fields = {'status': DONE, 'result': result}
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {str(e)}")
+            self._remove(path)
+            fields = {'status': FAILED, 'error': str(e)}
+        finally:
+            self._track(job['host'], -1)
+        now = time.time()
+        fields.update(finished_at=now, expires_at=now + self.artifact_ttl)
+        if not self.store.finish(job['id'], **fields):
+            # The sweep already failed it for running past job_timeout (or it expired)
+            logger.warning(f"Job {job['id']} finished after it was given up on; discarding the result")
+            if fields['status'] == DONE:
+                self._remove(path)
+            return
+        if job.get('callback_url'):
+            self._notify(dict(job, **fields))
+
+    def _notify(self, job):
+        """POST the finished job's status to its callback URL"""
+        payload = public_job(job)
+        for attempt in range(CALLBACK_ATTEMPTS):
+            try:
+                response = requests.post(job['callback_url'], json=payload, timeout=self.callback_timeout)
+                if response.status_code < 500:
+                    return
+            except requests.RequestException as e:
+                logger.warning(f"Job {job['id']} callback failed: {str(e)}")
+            time.sleep(2 ** attempt)
+        logger.error(f"Giving up on callback for job {job['id']}")
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def sweep(self, force=False):
+        """
+        Delete expired jobs and their artifacts, artifacts whose job record
+        is gone, and fail jobs stuck running past job_timeout
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_sweep < 60:
+                return
+            self._last_sweep = now
+        for status in FINISHED:
+            for job in self.store.find(status, now):
+                self._remove(self.artifact_path(job['id']))
+                self.store.delete(job['id'])
+        for job in self.store.find(RUNNING, now - self.job_timeout):
+            # The worker running it died or hung. Its handler may still finish,
+            # but finish() then finds the job failed and drops the result.
+            fields = {'status': FAILED, 'error': 'Job timed out',
+                      'finished_at': now, 'expires_at': now + self.artifact_ttl}
+            if self.store.finish(job['id'], **fields) and job.get('callback_url'):
+                self._notify(dict(job, **fields))
+        self._sweep_orphans()
+
+    def _sweep_orphans(self):
+        # A per-process store cannot see other workers' jobs, so it cannot tell orphans apart
+        if self.store.name == 'memory':
+            return
+        for name in os.listdir(self.artifact_dir):
+            if JOB_ID.match(name) and self.store.get(name) is None:
+                self._remove(os.path.join(self.artifact_dir, name))
+
+    def stats(self):
+        with self._lock:
+            running_here = sum(self._running_hosts.values())
+        return {
+            'backend': self.store.name,
+            'workers': self.workers,
+            'per_host_limit': self.per_host_limit,
+            'running_in_worker': running_here,
+            'jobs': self.store.counts(),
+            'pid': os.getpid(),
+        }
+
+
+def public_job(job):
+    """The client-facing view of a job record"""
+    view = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'expires_at': job['expires_at'],
+    }
+    if job['status'] == DONE:
+        view['result'] = job['result']
+    if job['status'] == FAILED:
+        view['error'] = job['error']
+    return view
@@ -0,0 +1,275 @@
+"""
+Content-addressed on-disk media cache
+Media bodies are stored once under their SHA-256 (objects/ab/abcd...), and a
+small index file maps each cache key (post ID + chosen format) to an object.
+All writes go through a temp file and os.replace, so concurrent workers never
+see partial files. Eviction is LRU by object mtime, which hits refresh, and
+removes the index entries of evicted objects. Each worker keeps a running
+total of the stored bytes and only rescans the objects tree to evict or to
+pick up what other workers have stored. Index entries keep the upstream ETag
+and Last-Modified, so a hit carries the same validators as the streamed miss.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Query parameters of signed CDN URLs that change on every extraction
+# (signature, expiry, edge routing); the rest (e.g. stp=) select a rendition
+SIGNED_PARAMS = ('oh', 'oe')
+SIGNED_PARAM_PREFIX = '_nc_'
+
+EVICT_TO = 0.9  # Evict down to this fraction of max_bytes, so the next publish does not evict again
+
+
+class MediaCacheWriter:
+    """Incrementally writes one media body into the cache while it streams"""
+
+    def __init__(self, cache, key, content_type, validators=None):
+        self.cache = cache
+        self.key = key
+        self.content_type = content_type
+        self.validators = validators or {}
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = tempfile.NamedTemporaryFile(dir=cache.tmp_dir, delete=False)
+        self._closed = False
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        """Publish the written body; returns the index entry"""
+        if self._closed:
+            return None
+        self._closed = True
+        self._file.close()
+        return self.cache._publish(self.key, self._file.name, self._hash.hexdigest(),
+                                   self.size, self.content_type, self.validators)
+
+    def abort(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._file.close()
+        try:
+            os.unlink(self._file.name)
+        except OSError:
+            pass
+
+
+class MediaCache:
+    """Size-bounded, content-addressed media store shared by all workers on a host"""
+
+    def __init__(self, root, max_bytes, max_item_bytes, rescan_interval=300):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.rescan_interval = rescan_interval  # Seconds before the running total is resynced from disk
+        self.objects_dir = os.path.join(root, 'objects')
+        self.index_dir = os.path.join(root, 'index')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        for directory in (self.objects_dir, self.index_dir, self.tmp_dir):
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._total = None
+        self._objects = 0
+        self._scanned_at = 0.0
+
+    @staticmethod
+    def make_key(post_id, media_url):
+        """
+        Cache key for a post's chosen format: the CDN path plus the query
+        parameters that select a rendition. The signature and expiry
+        parameters change on every extraction, so they are left out.
+        """
+        parts = urlsplit(media_url)
+        params = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                        if name not in SIGNED_PARAMS and not name.startswith(SIGNED_PARAM_PREFIX))
+        source = f"{parts.netloc}{parts.path}?{urlencode(params)}" if params else f"{parts.netloc}{parts.path}"
+        return hashlib.sha256(f"{post_id or ''}|{source}".encode('utf-8')).hexdigest()
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _index_path(self, key):
+        return os.path.join(self.index_dir, key + '.json')
+
+    def _write_atomic(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        """Return the index entry (with 'path') for key, or None on a miss"""
+        try:
+            with open(self._index_path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._count('misses')
+            return None
+        path = self._object_path(entry['sha256'])
+        try:
+            # Refresh recency for LRU eviction
+            os.utime(path)
+        except OSError:
+            # Object was evicted - drop the dangling index entry
+            self._unlink(self._index_path(key))
+            self._count('misses')
+            return None
+        self._count('hits')
+        entry['path'] = path
+        return entry
+
+    def writer(self, key, content_type, validators=None):
+        """
+        Writer for one body; validators are the upstream 'etag' and
+        'last_modified' header values, stored with the index entry
+        """
+        return MediaCacheWriter(self, key, content_type, validators)
+
+    def store_file(self, key, file_path, content_type, validators=None):
+        """Copy an already downloaded file into the cache; returns the index entry"""
+        writer = self.writer(key, content_type, validators)
+        try:
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    writer.write(chunk)
+            return writer.commit()
+        except Exception:
+            writer.abort()
+            raise
+
+    def _publish(self, key, tmp_path, digest, size, content_type, validators):
+        if size > self.max_item_bytes:
+            self._unlink(tmp_path)
+            return None
+        path = self._object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        added = 0
+        if os.path.exists(path):
+            # Identical content is already stored
+            self._unlink(tmp_path)
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+            added = size
+        entry = {'sha256': digest, 'size': size, 'content_type': content_type, 'stored_at': time.time(),
+                 'etag': validators.get('etag'), 'last_modified': validators.get('last_modified')}
+        self._write_atomic(self._index_path(key), json.dumps(entry))
+        self._count('stores')
+        if self._usage(added, 1 if added else 0) > self.max_bytes:
+            self.evict()
+        entry['path'] = path
+        return entry
+
+    def _scan_objects(self):
+        objects = []
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                objects.append((st.st_mtime, st.st_size, path))
+        return objects
+
+    def _set_total(self, total, objects):
+        with self._lock:
+            self._total = total
+            self._objects = objects
+            self._scanned_at = time.monotonic()
+
+    def _usage(self, added=0, added_objects=0):
+        """
+        Bytes of stored objects: this worker's running total plus added, or
+        a fresh scan once the total is older than rescan_interval
+        """
+        with self._lock:
+            if self._total is not None and time.monotonic() - self._scanned_at < self.rescan_interval:
+                self._total += added
+                self._objects += added_objects
+                return self._total
+        objects = self._scan_objects()
+        total = sum(size for _, size, _ in objects)
+        self._set_total(total, len(objects))
+        return total
+
+    def evict(self):
+        """
+        Remove least recently used objects until the cache is back under
+        EVICT_TO of max_bytes, then drop the index entries left without an
+        object
+        """
+        objects = self._scan_objects()
+        total = sum(size for _, size, _ in objects)
+        count = len(objects)
+        if total <= self.max_bytes:
+            self._set_total(total, count)
+            return
+        for _, size, path in sorted(objects):
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            self._unlink(path)
+            total -= size
+            count -= 1
+            self._count('evictions')
+        self._set_total(total, count)
+        self._prune_index()
+
+    def _prune_index(self):
+        """Remove index entries whose object has been evicted (by any worker)"""
+        for filename in os.listdir(self.index_dir):
+            path = os.path.join(self.index_dir, filename)
+            try:
+                with open(path) as f:
+                    digest = json.load(f)['sha256']
+            except (OSError, ValueError, KeyError):
+                continue
+            if not os.path.exists(self._object_path(digest)):
+                self._unlink(path)
+
+    def _unlink(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def clear_tmp(self, max_age=3600):
+        """Remove temp files abandoned by crashed workers"""
+        cutoff = time.time() - max_age
+        for filename in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, filename)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.unlink(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        # The tracked totals, rescanned at most every rescan_interval
+        stats['bytes'] = self._usage()
+        with self._lock:
+            stats['objects'] = self._objects
+        stats['max_bytes'] = self.max_bytes
+        return stats
@@ -0,0 +1,96 @@
+"""
+Prometheus metrics for the backend
+Works under multi-worker gunicorn: when PROMETHEUS_MULTIPROC_DIR is set (the
+gunicorn config does this), every worker writes its samples to that directory
+and /api/metrics aggregates them.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+    REGISTRY, generate_latest, multiprocess
+)
+
+# Extraction and upstream fetches take seconds, not milliseconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+THROUGHPUT_BUCKETS = (64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6)  # bytes/second
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'API request latency',
+    ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    'stage_duration_seconds', 'Latency of internal processing stages',
+    ['stage', 'platform'], buckets=LATENCY_BUCKETS
+)
+UPSTREAM_THROUGHPUT = Histogram(
+    'upstream_download_throughput_bytes_per_second', 'Upstream CDN download throughput',
+    buckets=THROUGHPUT_BUCKETS
+)
+UPSTREAM_BYTES = Counter(
+    'upstream_bytes_total', 'Bytes read from upstream CDNs'
+)
+BYTES_SERVED = Counter(
+    'bytes_served_total', 'Response body bytes sent to clients', ['endpoint']
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups by cache and result', ['cache', 'result']
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    'rate_limit_rejections_total', 'Requests rejected by the rate limiter', ['endpoint']
+)
+CONCURRENCY_REJECTIONS = Counter(
+    'concurrency_rejections_total', 'Requests rejected because a concurrency limit was full', ['endpoint']
+)
+UPSTREAM_THROTTLED = Counter(
+    'upstream_throttled_total', 'Requests shed because an upstream host was throttled', ['host']
+)
+MEDIA_URL_REFRESHES = Counter(
+    'media_url_refreshes_total', 'Expired media URLs re-resolved by re-extracting their post', ['platform']
+)
+TEMP_FILE_BYTES = Gauge(
+    'temp_file_bytes', 'Bytes held in temporary download files', multiprocess_mode='livesum'
+)
+SPOOL_BYTES = Gauge(
+    'spool_bytes', 'Bytes used or reserved in the shared spool directory', multiprocess_mode='livemostrecent'
+)
+SPOOL_QUOTA_BYTES = Gauge(
+    'spool_quota_bytes', 'Byte quota of the shared spool directory', multiprocess_mode='livemax'
+)
+SPOOL_REJECTIONS = Counter(
+    'spool_rejections_total', 'Downloads rejected because the spool quota was full'
+)
+SPOOL_RECLAIMED_BYTES = Counter(
+    'spool_reclaimed_bytes_total', 'Bytes of orphaned spool files deleted by the sweeper'
+)
+
+
+def is_multiprocess():
+    return bool(os.getenv('PROMETHEUS_MULTIPROC_DIR') or os.getenv('prometheus_multiproc_dir'))
+
+
+@contextmanager
+def observe_stage(stage, platform=''):
+    """Time a block of code as a processing stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage=stage, platform=platform).observe(time.perf_counter() - start)
+
+
+def count_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def render_metrics():
+    """Return (body, content_type) for the metrics endpoint"""
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,113 @@
+"""
+Server-side remuxing of separate video and audio streams
+DASH posts often store video and audio as separate formats. Both are piped
+into ffmpeg while they download and stream-copied (never re-encoded) into a
+fragmented MP4, which is sent to the client as ffmpeg produces it. Memory use
+is bounded by the pipe buffers plus one chunk per stream.
+
+The inputs are read from pipes, so they must be streamable: fragmented MP4
+or WebM, as served for DASH, or MP4 with the moov atom first.
+"""
+
+import collections
+import logging
+import os
+import shutil
+import subprocess
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Fragments start at keyframes and the moov atom is written up front, so the
+# output can be played (and sent) before muxing finishes
+FRAGMENTED_MP4_FLAGS = 'frag_keyframe+empty_moov+default_base_moof'
+
+
+def find_ffmpeg(path=None):
+    """Path of the ffmpeg binary to use, or None if it is not installed"""
+    return path or shutil.which('ffmpeg')
+
+
+def _close(chunks):
+    close = getattr(chunks, 'close', None)
+    if close:
+        close()
+
+
+def iter_muxed_stream(video_chunks, audio_chunks, ffmpeg_path, chunk_size=256 * 1024):
+    """
+    Yield a fragmented MP4 muxed from the video and audio chunk iterables
+    with ffmpeg stream copy. Both inputs are consumed concurrently on feeder
+    threads. Closing the generator kills ffmpeg and closes both inputs.
+    """
+    video_read, video_write = os.pipe()
+    audio_read, audio_write = os.pipe()
+    try:
+        process = subprocess.Popen(
+            [ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostdin',
+             '-i', f'pipe:{video_read}', '-i', f'pipe:{audio_read}',
+             '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy',
+             '-movflags', FRAGMENTED_MP4_FLAGS, '-f', 'mp4', 'pipe:1'],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            pass_fds=(video_read, audio_read)
+        )
+    except OSError:
+        for fd in (video_write, audio_write):
+            os.close(fd)
+        _close(video_chunks)
+        _close(audio_chunks)
+        raise Exception("Failed to start ffmpeg for muxing")
+    finally:
+        os.close(video_read)
+        os.close(audio_read)
+
+    errors = []
+    stderr_tail = collections.deque(maxlen=20)
+
+    def feed(chunks, fd):
+        try:
+            with os.fdopen(fd, 'wb') as pipe:
+                for chunk in chunks:
+                    pipe.write(chunk)
+        except BrokenPipeError:
+            # ffmpeg exited (failed, or the client went away)
+            pass
+        except Exception as e:
+            errors.append(e)
+            process.kill()
+        finally:
+            _close(chunks)
+
+    def drain_stderr():
+        for line in process.stderr:
+            stderr_tail.append(line.decode('utf-8', 'replace').rstrip())
+
+    threads = [
+        threading.Thread(target=feed, args=(video_chunks, video_write), name='mux-video', daemon=True),
+        threading.Thread(target=feed, args=(audio_chunks, audio_write), name='mux-audio', daemon=True),
+        threading.Thread(target=drain_stderr, name='mux-stderr', daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            chunk = os.read(process.stdout.fileno(), chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        process.wait()
+        for thread in threads:
+            thread.join(timeout=5)
+        if errors:
+            raise errors[0]
+        if process.returncode != 0:
+            detail = stderr_tail[-1] if stderr_tail else f'exit code {process.returncode}'
+            raise Exception(f"Failed to mux video and audio: {detail}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
@@ -0,0 +1,199 @@
+"""
+Preview thumbnails
+Small WebP/JPEG previews of post media, so the frontend does not pull
+multi-megabyte originals from the CDN just to show a card. Images are
+resized on a process pool (decoding and resampling are CPU-bound and would
+hold the GIL on request threads); videos get a poster frame grabbed by ffmpeg
+from the start of the stream. Rendered previews are kept in a per-worker LRU
+bounded by bytes.
+"""
+
+import collections
+import hashlib
+import io
+import multiprocessing
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import PIL
+from PIL import Image, ImageOps
+
+PREVIEW_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+# Decompression bomb guard for upstream images (pixels)
+Image.MAX_IMAGE_PIXELS = 64 * 1024 * 1024
+
+
+def render_thumbnail(data, width, fmt, quality):
+    """
+    Resize an encoded image to at most width x width (keeping the aspect
+    ratio) and encode it as fmt. Runs in a pool process.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG can decode straight to a smaller scale, far cheaper than a full decode
+        image.draft('RGB', (width, width))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        image.thumbnail((width, width), Image.LANCZOS)
+        if fmt == 'jpeg' and image.mode == 'RGBA':
+            image = image.convert('RGB')
+        out = io.BytesIO()
+        image.save(out, PREVIEW_FORMATS[fmt][0], quality=quality, method=4 if fmt == 'webp' else 0)
+        return out.getvalue()
+
+
+def extract_poster_frame(chunks, ffmpeg_path, max_bytes, timeout):
+    """
+    First video frame as a JPEG, decoded by ffmpeg from the chunk iterable.
+    At most max_bytes are fed to ffmpeg, which is enough when the moov atom
+    comes first (fragmented or faststart MP4, WebM).
+    """
+    process = subprocess.Popen(
+        [ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0',
+         '-map', '0:v:0', '-frames:v', '1', '-q:v', '2', '-f', 'image2', '-c:v', 'mjpeg', 'pipe:1'],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
+
+    def feed():
+        fed = 0
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+                fed += len(chunk)
+                if fed >= max_bytes:
+                    break
+        except (BrokenPipeError, ValueError):
+            # ffmpeg has its frame (or gave up) and closed the pipe
+            pass
+        except Exception:
+            process.kill()
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, name='poster-feed', daemon=True)
+    feeder.start()
+    timer = threading.Timer(timeout, process.kill)
+    timer.start()
+    try:
+        frame = process.stdout.read()
+        process.wait()
+    finally:
+        timer.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+    feeder.join(timeout=5)
+    if process.returncode != 0 or not frame:
+        raise Exception("Could not extract a preview frame from the video")
+    return frame
+
+
+class PreviewRenderer:
+    """Process pool for thumbnail rendering, started on first use in each worker"""
+
+    def __init__(self, workers, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: gunicorn workers are multi-threaded
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def _reset_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def render(self, data, width, fmt, quality):
+        pool = self._get_pool()
+        try:
+            return pool.submit(render_thumbnail, data, width, fmt, quality).result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise Exception("Timed out rendering preview")
+        except BrokenProcessPool:
+            # A pool process died (e.g. killed by the OOM killer) - start fresh next time
+            self._reset_pool(pool)
+            raise Exception("Failed to render preview")
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise Exception(f"Failed to render preview: {str(e)}")
+
+
+def preview_etag(source_key, width, fmt, quality):
+    """
+    Strong ETag for a preview. Rendering is deterministic for a given source
+    and Pillow version, so the tag is known before anything is fetched.
+    """
+    raw = f'{source_key}|{width}|{fmt}|{quality}|{PIL.__version__}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+class PreviewCache:
+    """In-memory LRU of rendered previews, bounded by entry count and total bytes"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return body
+
+    def set(self, key, body):
+        if len(body) > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = body
+            self._bytes += len(body)
+            self._stats['sets'] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['max_bytes'] = self.max_bytes
+        return stats
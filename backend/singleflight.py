@@ -0,0 +1,120 @@
+"""
+Single-flight request coalescing
+The first caller for a key runs the work; concurrent callers for the same key
+wait for and share its result (or its exception). Optionally coordinates
+across gunicorn workers on the same host with per-key lock files.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows - cross-process coalescing is unavailable
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """An in-flight call that other threads can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution"""
+
+    def __init__(self, lock_dir=None, lock_timeout=60):
+        self.lock_dir = lock_dir if lock_dir and fcntl is not None else None
+        self.lock_timeout = lock_timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'leaders': 0, 'coalesced': 0}
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        elif lock_dir:
+            logger.warning("fcntl is unavailable; cross-worker request coalescing disabled")
+
+    def do(self, key, fn):
+        """
+        Run fn() once for all concurrent callers of key and return its result.
+        If fn raises, every waiting caller receives the same exception.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats['coalesced'] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['leaders'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    @contextmanager
+    def process_lock(self, key):
+        """
+        Hold an exclusive per-key lock file shared by all workers on the host.
+        A no-op when no lock directory is configured. If the lock cannot be
+        acquired within lock_timeout the body runs anyway rather than failing.
+        """
+        if not self.lock_dir:
+            yield
+            return
+
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        path = os.path.join(self.lock_dir, f'{digest}.lock')
+        with open(path, 'a') as lock_file:
+            deadline = time.monotonic() + self.lock_timeout
+            locked = False
+            while True:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    locked = True
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        logger.warning(f"Timed out waiting for coalescing lock: {key}")
+                        break
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                if locked:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        stats['cross_process'] = bool(self.lock_dir)
+        return stats
@@ -0,0 +1,205 @@
+"""
+Managed spool directory for downloads buffered on disk
+Spooled files live in one directory shared by every worker on the host, under
+a global byte quota. Space is reserved before a file is written; when the
+quota is full, callers wait briefly for space and are then rejected. File
+names carry the owning process's PID and the reserved size, so any worker can
+compute usage from a directory scan, and files left behind by killed workers
+are reclaimed by the sweeper.
+"""
+
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows - admission is only serialised within a worker
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = '.lock'
+
+
+class SpoolFull(Exception):
+    """Raised when the spool quota has no room for another download"""
+
+    def __init__(self, retry_after=5):
+        self.retry_after = retry_after
+        super().__init__("Server is busy. Please try again shortly.")
+
+
+def _parse_name(name):
+    """(pid, reserved bytes) from a spool file name, or None for foreign files"""
+    parts = name.split('-', 2)
+    if len(parts) != 3:
+        return None
+    try:
+        return int(parts[0]), int(parts[2].split('.', 1)[0])
+    except ValueError:
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SpoolFile:
+    """A spool file being written; counts towards the quota until removed"""
+
+    def __init__(self, spool, path, reserved):
+        self.spool = spool
+        self.path = path
+        self.reserved = reserved
+        self.size = 0
+        self._checked = 0
+        self._file = open(path, 'wb')
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self.size += len(chunk)
+        # Past the reservation the file grows into free quota; check it every MB
+        if self.size > self.reserved and self.size - self._checked >= 1024 * 1024:
+            self._checked = self.size
+            if self.spool.usage() > self.spool.max_bytes:
+                raise SpoolFull()
+
+    def close(self):
+        """Finish writing and return the file's path"""
+        self._file.close()
+        return self.path
+
+    def abort(self):
+        self._file.close()
+        self.spool.remove(self.path)
+
+
+class Spool:
+    """Size-bounded spool directory shared by all workers on a host"""
+
+    def __init__(self, root, max_bytes, reservation=8 * 1024 * 1024, wait_timeout=5,
+                 max_age=3600, sweep_interval=60, on_sweep=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.reservation = reservation        # Space reserved when the size is unknown
+        self.wait_timeout = wait_timeout      # Seconds to queue for space before rejecting
+        self.max_age = max_age                # Files older than this are orphans even if their PID lives
+        self.sweep_interval = sweep_interval
+        self.on_sweep = on_sweep              # Called with (files, bytes) reclaimed by each sweep
+        self._lock = threading.Lock()
+        self._pid = None
+        os.makedirs(root, exist_ok=True)
+
+    @contextmanager
+    def _admission_lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.root, LOCK_NAME), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _scan(self):
+        """(path, pid, reserved, size, mtime) of every spool file"""
+        entries = []
+        for name in os.listdir(self.root):
+            parsed = _parse_name(name)
+            if parsed is None:
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, parsed[0], parsed[1], st.st_size, st.st_mtime))
+        return entries
+
+    def usage(self):
+        """Bytes used or reserved by spool files across all workers"""
+        return sum(max(reserved, size) for _, _, reserved, size, _ in self._scan())
+
+    def create(self, expected_size=None, suffix=''):
+        """
+        Reserve space and open a new spool file. Waits up to wait_timeout
+        seconds for space to free up, then raises SpoolFull.
+        """
+        reserved = expected_size if expected_size is not None else self.reservation
+        if reserved > self.max_bytes:
+            raise SpoolFull()
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            with self._admission_lock():
+                if self.usage() + reserved <= self.max_bytes:
+                    name = f'{os.getpid()}-{secrets.token_hex(8)}-{reserved}{suffix}'
+                    return SpoolFile(self, os.path.join(self.root, name), reserved)
+            if time.monotonic() >= deadline:
+                raise SpoolFull()
+            time.sleep(0.1)
+
+    def remove(self, path):
+        """Delete a spool file; returns its size (0 if it was already gone)"""
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+            return size
+        except OSError:
+            return 0
+
+    def sweep(self):
+        """
+        Delete files whose owning process has exited, and files older than
+        max_age. Returns (files, bytes) reclaimed.
+        """
+        cutoff = time.time() - self.max_age
+        files = reclaimed = 0
+        for path, pid, _, size, mtime in self._scan():
+            if mtime < cutoff or (pid != os.getpid() and not _pid_alive(pid)):
+                if self.remove(path):
+                    files += 1
+                    reclaimed += size
+        if files:
+            logger.info(f"Reclaimed {files} orphaned spool files ({reclaimed} bytes)")
+        if self.on_sweep:
+            self.on_sweep(files, reclaimed)
+        return files, reclaimed
+
+    def _run(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Spool sweep failed: {str(e)}")
+
+    def ensure_started(self):
+        """Start the sweeper thread in this process if it is not running yet"""
+        if self._pid == os.getpid() or self.sweep_interval <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='spool-sweeper', daemon=True).start()
+
+    def stats(self):
+        entries = self._scan()
+        return {
+            'files': len(entries),
+            'bytes': sum(size for _, _, _, size, _ in entries),
+            'used': sum(max(reserved, size) for _, _, reserved, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
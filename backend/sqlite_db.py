@@ -0,0 +1,36 @@
+"""
+sqlite connections for the on-disk stores (extraction cache, job queue)
+Every worker on a host opens the same WAL-mode file, so readers are not
+blocked by a writer in another process.
+"""
+
+import os
+import sqlite3
+import threading
+
+
+def sqlite_path(uri):
+    """File path of a sqlite:///relative.db or sqlite:////absolute/path.db URI"""
+    return uri[len('sqlite:///'):]
+
+
+class SQLiteConnections:
+    """One connection per thread and process to a sqlite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self):
+        # sqlite connections must not be shared between threads or forked workers
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
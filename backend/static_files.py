@@ -0,0 +1,151 @@
+"""
+Static frontend serving
+An index of the React build, made once at startup, so serving the frontend
+never has to ask the filesystem what exists. Files may have precompressed
+.br/.gz siblings, which are sent to clients that accept them; run this module
+on the build directory (the Docker image does) to create them. Fingerprinted
+build assets are cached by browsers as immutable, everything else is
+revalidated by ETag.
+
+    python static_files.py static
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+
+try:
+    import brotli
+except ImportError:  # Only .gz variants are created without the brotli package
+    brotli = None
+
+# Content hashes in create-react-app output: main.3f2a1b9c.js, 787.28cb0dba.chunk.js
+HASHED_NAME = re.compile(r'\.[0-9a-f]{8,}\.')
+
+# Precompressed variants in order of preference: (Content-Encoding, suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/javascript', 'application/json', 'application/manifest+json',
+    'application/xml', 'image/svg+xml',
+)
+MIN_COMPRESS_SIZE = 1024  # Smaller files gain less than the extra round of headers costs
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_compressible(path):
+    content_type = mimetypes.guess_type(path)[0] or ''
+    return content_type.startswith(COMPRESSIBLE_TYPES) and os.path.getsize(path) >= MIN_COMPRESS_SIZE
+
+
+def is_variant(name):
+    return name.endswith(tuple(suffix for _, suffix in ENCODINGS))
+
+
+class StaticManifest:
+    """Files of the frontend build keyed by URL path, with their ETags and compressed variants"""
+
+    def __init__(self, root):
+        self.root = root
+        self.files = {}
+        if os.path.isdir(root):
+            self.build()
+
+    def build(self):
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if is_variant(name) and os.path.exists(path.rsplit('.', 1)[0]):
+                    continue
+                variants = {}
+                for encoding, suffix in ENCODINGS:
+                    if os.path.isfile(path + suffix):
+                        variants[encoding] = path + suffix
+                url_path = os.path.relpath(path, self.root).replace(os.sep, '/')
+                files[url_path] = {
+                    'path': path,
+                    'content_type': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                    'size': os.path.getsize(path),
+                    'etag': file_digest(path)[:32],
+                    'immutable': bool(HASHED_NAME.search(name)),
+                    'variants': variants,
+                }
+        self.files = files
+
+    def get(self, url_path):
+        return self.files.get(url_path)
+
+    @property
+    def index(self):
+        return self.files.get('index.html')
+
+    @staticmethod
+    def choose_encoding(entry, accept_encodings):
+        """(Content-Encoding or None, path) of the variant to send, given the Accept-Encoding header"""
+        for encoding, _ in ENCODINGS:
+            if encoding in entry['variants'] and accept_encodings.quality(encoding) > 0:
+                return encoding, entry['variants'][encoding]
+        return None, entry['path']
+
+    def stats(self):
+        return {
+            'files': len(self.files),
+            'bytes': sum(entry['size'] for entry in self.files.values()),
+            'precompressed': sum(1 for entry in self.files.values() if entry['variants']),
+        }
+
+
+def write_variant(path, data):
+    """Write a compressed variant atomically, so a running server never sees half of it"""
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def precompress(root):
+    """
+    Create .gz (and, with brotli installed, .br) variants of compressible
+    files under root that lack an up-to-date one. Variants that would not be
+    smaller than the original are skipped. Returns the number written.
+    """
+    written = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            if is_variant(name) or not is_compressible(path):
+                continue
+            data = None
+            for encoding, suffix in ENCODINGS:
+                if encoding == 'br' and brotli is None:
+                    continue
+                target = path + suffix
+                if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                if encoding == 'br':
+                    compressed = brotli.compress(data, quality=11)
+                else:
+                    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(compressed) < len(data):
+                    write_variant(target, compressed)
+                    written += 1
+    return written
+
+
+if __name__ == '__main__':
+    root = sys.argv[1] if len(sys.argv) > 1 else 'static'
+    print(f"Wrote {precompress(root)} precompressed files under {root}")
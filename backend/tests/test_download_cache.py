@@ -0,0 +1,86 @@
+"""
+Media cache hits are served with the same validators as the streamed miss
+that filled the cache, so a download can be resumed with If-Range either way.
+"""
+
+import io
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import app as app_module
+from media_cache import MediaCache
+
+MEDIA_URL = 'https://scontent.cdninstagram.com/v/t51.2885-15/123_n.jpg'
+BODY = bytes(range(256)) * 1024
+UPSTREAM_ETAG = '"5d41402abc4b2a76b9719d911017c592"'
+UPSTREAM_LAST_MODIFIED = 'Wed, 01 Jan 2025 00:00:00 GMT'
+
+
+def fake_get(url, stream=False, headers=None):
+    response = requests.Response()
+    response.url = url
+    response.status_code = 200
+    response.headers = CaseInsensitiveDict({
+        'Content-Type': 'image/jpeg',
+        'Content-Length': str(len(BODY)),
+        'ETag': UPSTREAM_ETAG,
+        'Last-Modified': UPSTREAM_LAST_MODIFIED,
+    })
+    response.raw = io.BytesIO(BODY)
+    return response
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=len(BODY) * 4, max_item_bytes=len(BODY))
+    monkeypatch.setattr(app_module, 'media_cache', cache)
+    monkeypatch.setattr(app_module.http_client, 'get', fake_get)
+    monkeypatch.setattr(app_module.limiter, 'enabled', False)
+    return app_module.app.test_client()
+
+
+def download(client, streaming, monkeypatch, headers=None):
+    monkeypatch.setattr(app_module, 'DOWNLOAD_STREAMING', streaming)
+    response = client.get('/api/download', query_string={'media_url': MEDIA_URL}, headers=headers)
+    body = response.get_data()
+    response.close()
+    return response, body
+
+
+@pytest.mark.parametrize('streaming', [True, False])
+def test_cache_hit_has_the_etag_of_the_miss(client, streaming, monkeypatch):
+    miss, body = download(client, streaming, monkeypatch)
+    assert miss.status_code == 200 and body == BODY
+    hit, body = download(client, streaming, monkeypatch)
+    assert hit.status_code == 200 and body == BODY
+    assert miss.headers['ETag'] == hit.headers['ETag'] == UPSTREAM_ETAG
+    assert miss.headers['Last-Modified'] == hit.headers['Last-Modified'] == UPSTREAM_LAST_MODIFIED
+
+
+def test_resume_of_a_streamed_download_from_the_cache(client, monkeypatch):
+    miss, _ = download(client, True, monkeypatch)
+    # The client stopped after 1000 bytes and resumes against the cache
+    resumed, body = download(client, True, monkeypatch, headers={
+        'Range': 'bytes=1000-',
+        'If-Range': miss.headers['ETag'],
+    })
+    assert resumed.status_code == 206
+    assert resumed.headers['Content-Range'] == f'bytes 1000-{len(BODY) - 1}/{len(BODY)}'
+    assert body == BODY[1000:]
+
+    stale, body = download(client, True, monkeypatch, headers={'Range': 'bytes=1000-', 'If-Range': '"other"'})
+    assert stale.status_code == 200 and body == BODY
+
+
+def test_entries_without_upstream_validators_use_the_content_hash(client, monkeypatch):
+    download(client, True, monkeypatch)
+    cache = app_module.media_cache
+    key = MediaCache.make_key(None, MEDIA_URL)
+    entry = cache.get(key)
+    entry['etag'] = None
+    with app_module.app.test_request_context():
+        response = app_module.send_cached_media(entry, 'download.jpg')
+        assert response.headers['ETag'] == f'"{entry["sha256"]}"'
+        response.close()
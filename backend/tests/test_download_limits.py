@@ -0,0 +1,111 @@
+"""
+The download rate limit and its exemption for resumed (Range) downloads:
+only single-media continuations that are actually served as 206 are moved
+onto DOWNLOAD_RANGE_RATE_LIMIT.
+"""
+
+import io
+import itertools
+
+import pytest
+import requests
+from limits import parse
+from requests.structures import CaseInsensitiveDict
+
+import app as app_module
+
+MEDIA_URL = 'https://scontent.cdninstagram.com/v/t51.2885-15/123_n.jpg'
+BODY = bytes(range(256)) * 64
+ETAG = '"v1"'
+DOWNLOAD_LIMIT = parse(app_module.DOWNLOAD_RATE_LIMIT).amount
+
+_clients = itertools.count(1)
+
+
+def fake_get(url, stream=False, headers=None):
+    """A CDN that honours Range, and If-Range against ETAG"""
+    headers = headers or {}
+    response = requests.Response()
+    response.url = url
+    response.headers = CaseInsensitiveDict({'Content-Type': 'image/jpeg', 'ETag': ETAG})
+    body = BODY
+    response.status_code = 200
+    if 'Range' in headers and headers.get('If-Range', ETAG) == ETAG:
+        start = int(headers['Range'].split('=', 1)[1].split('-', 1)[0])
+        body = BODY[start:]
+        response.status_code = 206
+        response.headers['Content-Range'] = f'bytes {start}-{len(BODY) - 1}/{len(BODY)}'
+    response.headers['Content-Length'] = str(len(body))
+    response.raw = io.BytesIO(body)
+    return response
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module.http_client, 'get', fake_get)
+    monkeypatch.setattr(app_module, 'media_cache', None)
+    monkeypatch.setattr(app_module.limiter, 'enabled', True)
+    # A fresh client address per test, so counters do not leak between tests
+    client = app_module.app.test_client()
+    client.environ_base['REMOTE_ADDR'] = f'10.0.0.{next(_clients)}'
+    return client
+
+
+def download(client, headers=None, **params):
+    response = client.get('/api/download', query_string={'media_url': MEDIA_URL, **params}, headers=headers)
+    response.get_data()
+    response.close()
+    return response.status_code
+
+
+def test_full_downloads_are_limited(client):
+    assert [download(client) for _ in range(DOWNLOAD_LIMIT)] == [200] * DOWNLOAD_LIMIT
+    assert download(client) == 429
+
+
+def test_continuations_do_not_use_the_download_limit(client):
+    for _ in range(DOWNLOAD_LIMIT):
+        download(client)
+    assert download(client, headers={'Range': 'bytes=1-'}) == 206
+    assert download(client, headers={'Range': 'bytes=100-', 'If-Range': ETAG}) == 206
+
+
+@pytest.mark.parametrize('headers', [
+    {'Range': 'bytes=0-'},
+    {'Range': 'bytes=1-1,2-'},
+])
+def test_ranges_that_are_not_continuations_count(client, headers):
+    statuses = [download(client, headers=headers) for _ in range(DOWNLOAD_LIMIT + 1)]
+    assert statuses[-1] == 429
+
+
+def test_continuation_sending_the_whole_file_counts(client):
+    # A stale If-Range validator gets the full body, which is a new download
+    headers = {'Range': 'bytes=1-', 'If-Range': '"stale"'}
+    statuses = [download(client, headers=headers) for _ in range(DOWNLOAD_LIMIT + 1)]
+    assert statuses == [200] * DOWNLOAD_LIMIT + [429]
+    assert download(client) == 429
+
+
+@pytest.mark.parametrize('body', [
+    {'items': [{'media_url': 'https://example.com/a.jpg'}]},
+    {'post_url': 'https://example.com/p/abc/', 'all': True},
+    {'media_url': MEDIA_URL, 'items': [{'media_url': MEDIA_URL}]},
+    {'media_url': MEDIA_URL, 'audio_url': MEDIA_URL},
+    {'media_url': MEDIA_URL + '?oe=00000001', 'post_url': 'https://www.instagram.com/p/abc/'},
+])
+def test_zip_mux_and_extraction_requests_always_count(client, monkeypatch, body):
+    monkeypatch.setattr(app_module, 'MUX_AUDIO', True)
+    # Stop before any real work: only the rate limit matters here
+    monkeypatch.setattr(app_module, 'zip_media_response', lambda *a: ('', 204))
+    monkeypatch.setattr(app_module, 'open_media_chunks', lambda *a: iter([]))
+    monkeypatch.setattr(app_module, 'resolve_post_item', lambda *a, **k: None)
+    monkeypatch.setattr(app_module, 'extract_media_info', lambda *a: {'items': []})
+    statuses = []
+    for _ in range(DOWNLOAD_LIMIT + 1):
+        response = client.post('/api/download', json=body, headers={'Range': 'bytes=1-'})
+        response.get_data()
+        response.close()
+        statuses.append(response.status_code)
+    assert 429 not in statuses[:-1]
+    assert statuses[-1] == 429
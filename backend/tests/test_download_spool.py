@@ -0,0 +1,77 @@
+"""
+Downloads buffered on the spool keep their share of the quota until the
+response body has been sent.
+"""
+
+import io
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import app as app_module
+from spool import Spool
+
+MEDIA_URL = 'https://scontent.cdninstagram.com/v/t51.2885-15/123_n.jpg'
+BODY = b'x' * (256 * 1024)
+
+
+def fake_get(url, stream=False, headers=None):
+    response = requests.Response()
+    response.url = url
+    response.status_code = 200
+    response.headers = CaseInsensitiveDict({'Content-Type': 'image/jpeg', 'Content-Length': str(len(BODY))})
+    response.raw = io.BytesIO(BODY)
+    return response
+
+
+@pytest.fixture
+def spool(monkeypatch, tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=len(BODY) * 4, wait_timeout=0, sweep_interval=0)
+    monkeypatch.setattr(app_module, 'spool', spool)
+    monkeypatch.setattr(app_module, 'DOWNLOAD_STREAMING', False)
+    monkeypatch.setattr(app_module, 'media_cache', None)
+    monkeypatch.setattr(app_module.http_client, 'get', fake_get)
+    monkeypatch.setattr(app_module.limiter, 'enabled', False)
+    return spool
+
+
+def test_spool_file_is_released_after_the_body_is_sent(spool):
+    client = app_module.app.test_client()
+    response = client.get('/api/download', query_string={'media_url': MEDIA_URL}, buffered=False)
+    assert response.status_code == 200
+    body = iter(response.response)
+    first = next(body)
+    # Still being sent: the file and its quota are held
+    assert spool.usage() == len(BODY)
+    assert first + b''.join(body) == BODY
+    response.close()
+    assert spool.usage() == 0
+    assert spool.stats()['files'] == 0
+
+
+def test_spool_file_is_released_when_the_client_goes_away(spool):
+    client = app_module.app.test_client()
+    response = client.get('/api/download', query_string={'media_url': MEDIA_URL}, buffered=False)
+    next(iter(response.response))
+    response.close()
+    assert spool.usage() == 0
+
+
+def test_ranges_are_served_from_the_spool_file(spool):
+    client = app_module.app.test_client()
+    response = client.get('/api/download', query_string={'media_url': MEDIA_URL},
+                          headers={'Range': 'bytes=1000-1999'}, buffered=False)
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 1000-1999/{len(BODY)}'
+    assert response.get_data() == BODY[1000:2000]
+    response.close()
+    assert spool.usage() == 0
+
+
+def test_unsatisfiable_range_releases_the_spool_file(spool):
+    client = app_module.app.test_client()
+    response = client.get('/api/download', query_string={'media_url': MEDIA_URL},
+                          headers={'Range': f'bytes={len(BODY) + 10}-'})
+    assert response.status_code == 416
+    assert spool.usage() == 0
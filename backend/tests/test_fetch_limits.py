@@ -0,0 +1,75 @@
+"""
+Extraction rate limits: /api/fetch and /api/fetch/stream share one quota,
+and a batch is charged per distinct post it extracts.
+"""
+
+import itertools
+
+import pytest
+from limits import parse
+
+import app as app_module
+
+BATCH_LIMIT = parse(app_module.BATCH_RATE_LIMIT).amount
+FETCH_LIMIT = 20
+
+_clients = itertools.count(1)
+
+
+def post_urls(count, start=0):
+    return [f'https://www.instagram.com/p/post{i}/' for i in range(start, start + count)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    extracted = []
+
+    def extract_media_info(classified):
+        extracted.append(classified.canonical_id)
+        return {'media_url': 'https://scontent.cdninstagram.com/a.jpg', 'media_type': 'image',
+                'source': classified.platform, 'items': []}
+
+    monkeypatch.setattr(app_module, 'extract_media_info', extract_media_info)
+    monkeypatch.setattr(app_module.limiter, 'enabled', True)
+    client = app_module.app.test_client()
+    client.environ_base['REMOTE_ADDR'] = f'10.1.0.{next(_clients)}'
+    client.extracted = extracted
+    return client
+
+
+def fetch(client, route, url):
+    response = client.post(route, json={'url': url})
+    response.get_data()
+    response.close()
+    return response.status_code
+
+
+def test_fetch_routes_share_one_quota(client):
+    statuses = [fetch(client, route, url) for route, url in zip(
+        itertools.cycle(['/api/fetch', '/api/fetch/stream']), post_urls(FETCH_LIMIT))]
+    assert statuses == [200] * FETCH_LIMIT
+    assert fetch(client, '/api/fetch', post_urls(1, start=FETCH_LIMIT)[0]) == 429
+    assert fetch(client, '/api/fetch/stream', post_urls(1, start=FETCH_LIMIT)[0]) == 429
+
+
+def batch(client, urls):
+    response = client.post('/api/fetch/batch', json={'urls': urls})
+    response.get_data()
+    response.close()
+    return response.status_code
+
+
+def test_batch_is_charged_per_distinct_post(client):
+    half = BATCH_LIMIT // 2
+    assert batch(client, post_urls(half)) == 200
+    # Duplicates and unsupported URLs are not extracted, so they cost nothing
+    urls = post_urls(BATCH_LIMIT - half, start=half) + post_urls(3, start=half) + ['https://example.com/p/x/']
+    assert batch(client, urls) == 200
+    assert len(client.extracted) == BATCH_LIMIT
+    assert batch(client, post_urls(1, start=BATCH_LIMIT)) == 429
+
+
+def test_batch_larger_than_the_remaining_quota_is_refused(client):
+    assert batch(client, post_urls(BATCH_LIMIT - 1)) == 200
+    assert batch(client, post_urls(2, start=BATCH_LIMIT)) == 429
+    assert len(client.extracted) == BATCH_LIMIT - 1
@@ -0,0 +1,190 @@
+"""
+The shared format-selection routine: which media a yt-dlp info dict yields
+(select_media and the engine's per-item selection for carousels), and which
+video format a policy picks (select_format).
+"""
+
+import pytest
+
+from extractors import ExtractorEngine, Platform, select_media
+from formats import FormatPolicy, MediaTooLarge, audio_candidates, format_candidates, select_format
+
+INSTAGRAM = Platform('instagram', 'Instagram', ie_keys=['Instagram'])
+
+MB = 1024 * 1024
+
+
+def video_format(url, height, filesize=None, acodec='mp4a.40.2', vcodec='avc1.640028'):
+    return {'url': url, 'ext': 'mp4', 'height': height, 'width': height * 9 // 16,
+            'vcodec': vcodec, 'acodec': acodec, 'filesize': filesize}
+
+
+def engine_returning(info, entries=None):
+    """An engine whose extraction returns info, and entries[url] for carousel item URLs"""
+    engine = ExtractorEngine()
+    engine.register(INSTAGRAM)
+    engine.extract_info = lambda platform, url: (entries or {}).get(url, info)
+    return engine
+
+
+@pytest.mark.parametrize('info, expected', [
+    # Direct video URL
+    ({'url': 'https://cdn/v.mp4', 'ext': 'mp4'}, ('https://cdn/v.mp4', 'video')),
+    # Best video format by height
+    ({'formats': [
+        {'url': 'https://cdn/360.mp4', 'vcodec': 'avc1', 'height': 360},
+        {'url': 'https://cdn/1080.mp4', 'vcodec': 'avc1', 'height': 1080},
+        {'url': 'https://cdn/720.mp4', 'vcodec': 'avc1', 'height': 720},
+    ]}, ('https://cdn/1080.mp4', 'video')),
+    # yt-dlp reports unknown dimensions as None (common for DASH/progressive formats)
+    ({'formats': [
+        {'url': 'https://cdn/dash-a.mp4', 'vcodec': 'avc1', 'height': None, 'width': None},
+        {'url': 'https://cdn/720.mp4', 'vcodec': 'avc1', 'height': 720, 'width': None},
+        {'url': 'https://cdn/dash-b.mp4', 'vcodec': 'avc1', 'height': None, 'width': None},
+    ]}, ('https://cdn/720.mp4', 'video')),
+    ({'formats': [
+        {'url': 'https://cdn/dash-a.mp4', 'vcodec': 'avc1', 'height': None, 'width': None},
+        {'url': 'https://cdn/wide.mp4', 'vcodec': 'avc1', 'height': None, 'width': 640},
+    ]}, ('https://cdn/wide.mp4', 'video')),
+    ({'formats': [{'url': 'https://cdn/dash.mp4', 'vcodec': 'avc1', 'height': None, 'width': None}]},
+     ('https://cdn/dash.mp4', 'video')),
+    # Image-only formats
+    ({'formats': [{'url': 'https://cdn/i.jpg', 'vcodec': 'none'}]}, ('https://cdn/i.jpg', 'image')),
+    # Thumbnail fallback for image posts
+    ({'thumbnail': 'https://cdn/t.jpg', 'formats': []}, ('https://cdn/t.jpg', 'image')),
+    # Direct non-video URL
+    ({'url': 'https://cdn/i.jpg', 'ext': 'jpg'}, ('https://cdn/i.jpg', 'image')),
+    # Nothing usable
+    ({}, (None, None)),
+    ({'formats': [{'vcodec': 'avc1', 'height': 720}]}, (None, None)),
+])
+def test_select_media(info, expected):
+    assert select_media(info) == expected
+
+
+def test_select_items_single_video_lists_candidates():
+    info = {'duration': 10, 'formats': [
+        {'url': 'https://cdn/720.mp4', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'mp4a', 'height': 720},
+        {'url': 'https://cdn/a.m4a', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a', 'abr': 128},
+    ]}
+    items = engine_returning(info).select_items(INSTAGRAM, info)
+    assert len(items) == 1
+    assert items[0]['media_type'] == 'video'
+    assert [f['url'] for f in items[0]['formats']] == ['https://cdn/720.mp4']
+    assert [f['url'] for f in items[0]['audio_formats']] == ['https://cdn/a.m4a']
+
+
+def test_select_items_carousel_mixes_images_and_videos():
+    info = {'_type': 'playlist', 'entries': [
+        {'url': 'https://cdn/1.jpg', 'ext': 'jpg'},
+        {'url': 'https://cdn/2.mp4', 'ext': 'mp4'},
+        None,
+        {'_type': 'url', 'url': 'https://www.instagram.com/p/item3/'},
+        {'_type': 'url', 'url': 'https://www.instagram.com/p/broken/'},
+    ]}
+    entries = {
+        'https://www.instagram.com/p/item3/': {'thumbnail': 'https://cdn/3.jpg'},
+        'https://www.instagram.com/p/broken/': {},
+    }
+    items = engine_returning(info, entries).select_items(INSTAGRAM, info)
+    assert [(item['media_url'], item['media_type']) for item in items] == [
+        ('https://cdn/1.jpg', 'image'),
+        ('https://cdn/2.mp4', 'video'),
+        ('https://cdn/3.jpg', 'image'),
+    ]
+
+
+def test_select_items_skips_carousel_entries_that_fail_to_resolve():
+    info = {'entries': [
+        {'_type': 'url', 'url': 'https://www.instagram.com/p/gone/'},
+        {'url': 'https://cdn/2.jpg', 'ext': 'jpg'},
+    ]}
+    engine = engine_returning(info)
+
+    def extract_info(platform, url):
+        raise Exception('HTTP Error 404: Not Found')
+    engine.extract_info = extract_info
+    items = engine.select_items(INSTAGRAM, info)
+    assert [item['media_url'] for item in items] == ['https://cdn/2.jpg']
+
+
+def test_select_items_falls_back_to_post_thumbnail():
+    info = {'entries': [{'_type': 'url', 'url': 'https://www.instagram.com/p/x/'}],
+            'thumbnail': 'https://cdn/cover.jpg'}
+    items = engine_returning(info, {'https://www.instagram.com/p/x/': {}}).select_items(INSTAGRAM, info)
+    assert [(item['media_url'], item['media_type']) for item in items] == [('https://cdn/cover.jpg', 'image')]
+
+
+def test_fetch_without_any_media_is_an_error():
+    info = {'title': 'no formats here'}
+    with pytest.raises(Exception, match='Could not extract media URL from Instagram post'):
+        engine_returning(info).fetch(INSTAGRAM, 'https://www.instagram.com/p/abc/')
+
+
+def test_candidates_skip_manifests_and_estimate_sizes():
+    info = {'duration': 8, 'formats': [
+        {'url': 'https://cdn/hls.m3u8', 'vcodec': 'avc1', 'protocol': 'm3u8_native', 'height': 1080},
+        {'url': 'https://cdn/720.mp4', 'vcodec': 'avc1', 'acodec': 'none', 'height': 720, 'tbr': 1000},
+        {'url': 'https://cdn/a.m4a', 'vcodec': 'none', 'acodec': 'mp4a', 'filesize': 1234},
+    ]}
+    assert [(c['url'], c['filesize']) for c in format_candidates(info)] == [('https://cdn/720.mp4', 1000000)]
+    assert [(c['url'], c['filesize']) for c in audio_candidates(info)] == [('https://cdn/a.m4a', 1234)]
+
+
+CANDIDATES = [
+    video_format('https://cdn/360.mp4', 360, filesize=2 * MB),
+    video_format('https://cdn/720.mp4', 720, filesize=6 * MB),
+    video_format('https://cdn/1080.mp4', 1080, filesize=15 * MB),
+]
+
+
+@pytest.mark.parametrize('policy, expected', [
+    (FormatPolicy(), 'https://cdn/1080.mp4'),
+    (FormatPolicy(max_height=720), 'https://cdn/720.mp4'),
+    # Nothing low enough - the lowest resolution is used
+    (FormatPolicy(max_height=240), 'https://cdn/360.mp4'),
+    # Size-capped: the best format that fits
+    (FormatPolicy(max_bytes=10 * MB), 'https://cdn/720.mp4'),
+    (FormatPolicy(max_bytes=6 * MB), 'https://cdn/720.mp4'),
+    (FormatPolicy(max_bytes=3 * MB), 'https://cdn/360.mp4'),
+    (FormatPolicy(max_height=720, max_bytes=3 * MB), 'https://cdn/360.mp4'),
+])
+def test_select_format(policy, expected):
+    assert select_format(CANDIDATES, policy)['url'] == expected
+
+
+def test_select_format_nothing_fits_the_size_cap():
+    with pytest.raises(MediaTooLarge) as excinfo:
+        select_format(CANDIDATES, FormatPolicy(max_bytes=1 * MB))
+    assert excinfo.value.size == 2 * MB
+    assert excinfo.value.limit == 1 * MB
+
+
+def test_select_format_uses_probed_sizes_and_keeps_unknown_sizes():
+    candidates = [video_format('https://cdn/720.mp4', 720), video_format('https://cdn/1080.mp4', 1080)]
+    policy = FormatPolicy(max_bytes=10 * MB)
+    # Probed too large - the smaller one wins
+    assert select_format(candidates, policy, sizes={'https://cdn/1080.mp4': 20 * MB})['url'] == 'https://cdn/720.mp4'
+    # Unknown sizes are not ruled out up front
+    assert select_format(candidates, policy)['url'] == 'https://cdn/1080.mp4'
+
+
+def test_select_format_counts_muxed_audio_towards_the_cap():
+    candidates = [
+        video_format('https://cdn/720.mp4', 720, filesize=4 * MB),
+        video_format('https://cdn/1080-silent.mp4', 1080, filesize=9 * MB, acodec='none'),
+    ]
+    audio = {'url': 'https://cdn/a.m4a', 'acodec': 'mp4a', 'abr': 128, 'filesize': 2 * MB}
+    assert select_format(candidates, FormatPolicy(max_bytes=12 * MB), audio=audio)['url'] == 'https://cdn/1080-silent.mp4'
+    assert select_format(candidates, FormatPolicy(max_bytes=10 * MB), audio=audio)['url'] == 'https://cdn/720.mp4'
+
+
+def test_select_format_prefers_audio_and_codec():
+    candidates = [
+        video_format('https://cdn/silent.mp4', 720, acodec='none'),
+        video_format('https://cdn/vp9.webm', 720, vcodec='vp09.00.40.08'),
+        video_format('https://cdn/h264.mp4', 720),
+    ]
+    # Without muxing, formats with audio win
+    assert select_format(candidates, FormatPolicy(prefer_codec='vp9'))['url'] == 'https://cdn/vp9.webm'
+    assert select_format(candidates[:1], FormatPolicy())['url'] == 'https://cdn/silent.mp4'
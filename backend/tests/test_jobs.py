@@ -0,0 +1,167 @@
+"""
+Background job lifecycle: claiming, completion, timeouts, artifact expiry
+and the orphaned artifact sweep, against the memory and sqlite stores.
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, create_job_store, public_job
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return create_job_store('memory://')
+    return create_job_store(f'sqlite:///{tmp_path}/jobs.db')
+
+
+def write_artifact(job, path):
+    with open(path, 'wb') as f:
+        f.write(b'media')
+    return {'size': 5}
+
+
+def make_queue(store, tmp_path, handler=write_artifact, **kwargs):
+    # No worker threads: tests drive claim/_process/sweep themselves
+    return JobQueue(store, handler, str(tmp_path / 'artifacts'), workers=0, **kwargs)
+
+
+def run_next(queue):
+    job = queue.store.claim()
+    queue._process(job)
+    return queue.get(job['id'])
+
+
+def test_job_runs_to_done(store, tmp_path):
+    queue = make_queue(store, tmp_path, artifact_ttl=60)
+    job = queue.submit({'media_url': 'https://cdn/a.jpg'}, 'cdn')
+    assert queue.get(job['id'])['status'] == QUEUED
+
+    finished = run_next(queue)
+    assert finished['status'] == DONE
+    assert finished['result'] == {'size': 5}
+    assert finished['expires_at'] == pytest.approx(finished['finished_at'] + 60)
+    assert os.path.exists(queue.artifact_path(job['id']))
+    assert public_job(finished)['result'] == {'size': 5}
+
+
+def test_failed_job_keeps_no_artifact(store, tmp_path):
+    def fail(job, path):
+        write_artifact(job, path)
+        raise Exception('upstream said no')
+
+    queue = make_queue(store, tmp_path, handler=fail)
+    job = queue.submit({}, 'cdn')
+    finished = run_next(queue)
+    assert finished['status'] == FAILED
+    assert public_job(finished)['error'] == 'upstream said no'
+    assert not os.path.exists(queue.artifact_path(job['id']))
+
+
+def test_claim_respects_busy_hosts(store, tmp_path):
+    queue = make_queue(store, tmp_path)
+    first = queue.submit({}, 'a')
+    second = queue.submit({}, 'b')
+    assert store.claim(busy_hosts={'a'})['id'] == second['id']
+    assert store.claim(busy_hosts={'a'}) is None
+    assert store.claim()['id'] == first['id']
+    assert store.claim() is None
+
+
+def test_expired_jobs_are_swept_with_their_artifacts(store, tmp_path):
+    queue = make_queue(store, tmp_path, artifact_ttl=0)
+    job = queue.submit({}, 'cdn')
+    run_next(queue)
+    queue.sweep(force=True)
+    assert queue.get(job['id']) is None
+    assert not os.path.exists(queue.artifact_path(job['id']))
+
+
+def test_stuck_job_times_out(store, tmp_path):
+    queue = make_queue(store, tmp_path, job_timeout=0)
+    job = queue.submit({}, 'cdn')
+    store.claim()
+    queue.sweep(force=True)
+    timed_out = queue.get(job['id'])
+    assert timed_out['status'] == FAILED
+    assert timed_out['error'] == 'Job timed out'
+
+
+def test_handler_finishing_after_timeout_does_not_overwrite_the_failure(store, tmp_path, monkeypatch):
+    """A hung handler that eventually returns must not turn FAILED into DONE or fire the callback"""
+    notified = []
+    monkeypatch.setattr(JobQueue, '_notify', lambda self, job: notified.append(job['status']))
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(job, path):
+        started.set()
+        release.wait(5)
+        return write_artifact(job, path)
+
+    queue = make_queue(store, tmp_path, handler=slow, job_timeout=0)
+    job = queue.submit({}, 'cdn', callback_url='https://client.example/hook')
+    worker = threading.Thread(target=run_next, args=(queue,))
+    worker.start()
+    assert started.wait(5)
+    queue.sweep(force=True)
+    release.set()
+    worker.join(5)
+
+    finished = queue.get(job['id'])
+    assert finished['status'] == FAILED
+    assert finished['error'] == 'Job timed out'
+    assert finished['result'] is None
+    assert not os.path.exists(queue.artifact_path(job['id']))
+    # Only the timeout is reported
+    assert notified == [FAILED]
+
+
+def test_finish_only_updates_running_jobs(store, tmp_path):
+    queue = make_queue(store, tmp_path)
+    job = queue.submit({}, 'cdn')
+    claimed = store.claim()
+    assert store.finish(claimed['id'], status=DONE, result={}) is True
+    assert store.finish(claimed['id'], status=FAILED, error='Job timed out') is False
+    assert queue.get(job['id'])['status'] == DONE
+
+
+def test_orphaned_artifacts_are_swept(tmp_path):
+    store = create_job_store(f'sqlite:///{tmp_path}/jobs.db')
+    queue = make_queue(store, tmp_path)
+    job = queue.submit({}, 'cdn')
+    run_next(queue)
+    orphan = queue.artifact_path('0' * 32)
+    other = os.path.join(queue.artifact_dir, 'jobs.db-keep')
+    for path in (orphan, other):
+        with open(path, 'wb') as f:
+            f.write(b'x')
+    queue.sweep(force=True)
+    assert not os.path.exists(orphan)
+    assert os.path.exists(other)
+    assert os.path.exists(queue.artifact_path(job['id']))
+
+
+def test_memory_store_does_not_sweep_orphans(tmp_path):
+    # Other workers' jobs are invisible to a per-process store
+    queue = make_queue(create_job_store('memory://'), tmp_path)
+    orphan = queue.artifact_path('0' * 32)
+    with open(orphan, 'wb') as f:
+        f.write(b'x')
+    queue.sweep(force=True)
+    assert os.path.exists(orphan)
+
+
+def test_worker_threads_process_submitted_jobs(tmp_path):
+    queue = JobQueue(create_job_store('memory://'), write_artifact, str(tmp_path), workers=1, poll_interval=0.05)
+    job = queue.submit({}, 'cdn')
+    deadline = time.monotonic() + 5
+    while queue.get(job['id'])['status'] in (QUEUED, RUNNING) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue.get(job['id'])['status'] == DONE
+    assert jobs.JOB_ID.match(job['id'])
@@ -0,0 +1,118 @@
+"""
+Media cache keys, eviction and index pruning
+"""
+
+import os
+
+import pytest
+
+from media_cache import MediaCache
+
+CDN = 'https://scontent-lax3-1.cdninstagram.com/v/t51.2885-15/123_n.jpg'
+
+
+def store(cache, key, data):
+    writer = cache.writer(key, 'image/jpeg')
+    writer.write(data)
+    return writer.commit()
+
+
+def test_key_ignores_signature_and_expiry():
+    first = MediaCache.make_key('abc', CDN + '?stp=dst-jpg_e35&_nc_ht=a&_nc_ohc=x1&oh=00_AA&oe=66A1B2C3')
+    second = MediaCache.make_key('abc', CDN + '?_nc_ohc=y2&oe=66FFFFFF&stp=dst-jpg_e35&oh=00_BB&_nc_ht=b')
+    assert first == second
+
+
+def test_key_keeps_rendition_params():
+    full = MediaCache.make_key('abc', CDN + '?stp=dst-jpg_e35&oh=1&oe=2')
+    small = MediaCache.make_key('abc', CDN + '?stp=dst-jpg_s150x150&oh=1&oe=2')
+    unsigned = MediaCache.make_key('abc', CDN)
+    assert len({full, small, unsigned}) == 3
+    assert MediaCache.make_key('abc', CDN + '?oh=1&oe=2&_nc_cat=1') == unsigned
+
+
+def test_key_depends_on_post():
+    assert MediaCache.make_key('abc', CDN) != MediaCache.make_key('def', CDN)
+
+
+def test_store_and_get(tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=1000, max_item_bytes=500)
+    store(cache, 'a', b'x' * 100)
+    entry = cache.get('a')
+    assert entry['size'] == 100
+    with open(entry['path'], 'rb') as f:
+        assert f.read() == b'x' * 100
+    assert cache.get('missing') is None
+    # Too large for the cache
+    assert store(cache, 'big', b'x' * 501) is None
+    assert cache.get('big') is None
+
+
+def test_eviction_is_lru_and_prunes_the_index(tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=1000, max_item_bytes=1000)
+    for i, key in enumerate('abcd'):
+        entry = store(cache, key, bytes([i]) * 300)
+        os.utime(entry['path'], (1000 + i, 1000 + i))
+    # d was stored over the limit: a (least recently used) is evicted
+    assert cache.get('a') is None
+    assert sorted(os.listdir(cache.index_dir)) == ['b.json', 'c.json', 'd.json']
+    os.utime(cache.get('b')['path'], (2000, 2000))
+
+    store(cache, 'e', b'\xff' * 300)
+    assert cache.get('c') is None
+    assert sorted(os.listdir(cache.index_dir)) == ['b.json', 'd.json', 'e.json']
+    assert cache.stats()['bytes'] <= 1000
+    assert cache.stats()['evictions'] == 2
+
+
+def test_duplicate_content_is_not_counted_twice(tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=1000, max_item_bytes=1000)
+    for key in 'abcdef':
+        store(cache, key, b'same' * 100)
+    assert all(cache.get(key) for key in 'abcdef')
+    assert cache.stats()['objects'] == 1
+    assert cache.stats()['evictions'] == 0
+
+
+def test_running_total_avoids_rescans(tmp_path, monkeypatch):
+    cache = MediaCache(str(tmp_path), max_bytes=10000, max_item_bytes=1000)
+    scans = []
+    scan_objects = cache._scan_objects
+    monkeypatch.setattr(cache, '_scan_objects', lambda: scans.append(1) or scan_objects())
+    for i in range(5):
+        store(cache, str(i), bytes([i]) * 100)
+    assert len(scans) == 1
+    assert cache._usage() == 500
+
+
+def test_rescan_picks_up_other_workers(tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=1000, max_item_bytes=1000, rescan_interval=0)
+    other = MediaCache(str(tmp_path), max_bytes=1000, max_item_bytes=1000)
+    store(cache, 'a', b'a' * 400)
+    store(other, 'b', b'b' * 400)
+    store(cache, 'c', b'c' * 400)
+    assert cache.stats()['bytes'] <= 1000
+
+
+def test_upstream_validators_are_kept_with_the_entry(tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=1000, max_item_bytes=1000)
+    writer = cache.writer('a', 'image/jpeg', {'etag': '"upstream-1"', 'last_modified': 'Wed, 01 Jan 2025 00:00:00 GMT'})
+    writer.write(b'x' * 100)
+    writer.commit()
+    entry = cache.get('a')
+    assert entry['etag'] == '"upstream-1"'
+    assert entry['last_modified'] == 'Wed, 01 Jan 2025 00:00:00 GMT'
+    # Bodies cached without upstream validators fall back to the content hash
+    store(cache, 'b', b'y' * 100)
+    assert cache.get('b')['etag'] is None
+
+
+def test_stats_read_the_tracked_totals(tmp_path, monkeypatch):
+    cache = MediaCache(str(tmp_path), max_bytes=10000, max_item_bytes=1000)
+    store(cache, 'a', b'a' * 100)
+    store(cache, 'b', b'b' * 200)
+    store(cache, 'c', b'a' * 100)
+    monkeypatch.setattr(cache, '_scan_objects', lambda: pytest.fail('stats() rescanned the objects tree'))
+    stats = cache.stats()
+    assert stats['bytes'] == 300
+    assert stats['objects'] == 2
@@ -0,0 +1,134 @@
+"""
+Single-flight coalescing: concurrent callers for one key share one load,
+within a worker (threads) and across workers (lock files).
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight, fcntl
+
+
+def run_concurrently(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def call(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def wait_for_waiters(flight, key, count):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        with flight._lock:
+            call = flight._calls.get(key)
+            if call is not None and call.waiters >= count:
+                return
+        time.sleep(0.005)
+    raise AssertionError('callers did not coalesce')
+
+
+def test_concurrent_callers_share_one_load():
+    flight = SingleFlight()
+    release = threading.Event()
+    loads = []
+
+    def load():
+        loads.append(1)
+        release.wait(5)
+        return {'media_url': 'https://cdn/a.jpg'}
+
+    threads, results, errors = run_concurrently(8, lambda: flight.do('post', load))
+    wait_for_waiters(flight, 'post', 7)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert loads == [1]
+    assert errors == [None] * 8
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {'leaders': 1, 'coalesced': 7, 'in_flight': 0, 'cross_process': False}
+
+
+def test_waiters_get_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def load():
+        release.wait(5)
+        raise ValueError('post not found')
+
+    threads, results, errors = run_concurrently(4, lambda: flight.do('post', load))
+    wait_for_waiters(flight, 'post', 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert flight.stats()['leaders'] == 1
+
+
+def test_keys_and_later_calls_are_not_coalesced():
+    flight = SingleFlight()
+    loads = []
+
+    def load(key):
+        loads.append(key)
+        return key
+
+    assert flight.do('a', lambda: load('a')) == 'a'
+    assert flight.do('b', lambda: load('b')) == 'b'
+    # A finished call is not cached: the next caller loads again
+    assert flight.do('a', lambda: load('a')) == 'a'
+    assert loads == ['a', 'b', 'a']
+
+
+def load_once_per_host(lock_dir, cache_path, loads_path):
+    """What a worker does: take the key's lock, then load only if no other worker has"""
+    flight = SingleFlight(lock_dir=lock_dir)
+    with flight.process_lock('instagram:ABC'):
+        if not os.path.exists(cache_path):
+            with open(loads_path, 'a') as f:
+                f.write('load\n')
+            time.sleep(0.2)  # Slow extraction; the other workers queue on the lock
+            with open(cache_path, 'w') as f:
+                f.write('info')
+
+
+@pytest.mark.skipif(fcntl is None, reason='cross-process coalescing needs fcntl')
+def test_workers_coalesce_on_the_lock_file(tmp_path):
+    context = multiprocessing.get_context('fork')
+    args = (str(tmp_path / 'locks'), str(tmp_path / 'cache'), str(tmp_path / 'loads'))
+    workers = [context.Process(target=load_once_per_host, args=args) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+        assert worker.exitcode == 0
+    with open(tmp_path / 'loads') as f:
+        assert f.read().splitlines() == ['load']
+
+
+@pytest.mark.skipif(fcntl is None, reason='cross-process coalescing needs fcntl')
+def test_lock_timeout_runs_the_body_anyway(tmp_path):
+    holder = SingleFlight(lock_dir=str(tmp_path))
+    waiter = SingleFlight(lock_dir=str(tmp_path), lock_timeout=0.1)
+    ran = []
+    with holder.process_lock('key'):
+        started = time.monotonic()
+        # flock locks belong to the open file, so a second open blocks even in one process
+        with waiter.process_lock('key'):
+            ran.append(time.monotonic() - started)
+    assert len(ran) == 1 and ran[0] >= 0.1
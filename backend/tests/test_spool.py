@@ -0,0 +1,119 @@
+"""
+Spool quota: admission, rejection, release, growth past a reservation, and
+the sweep of files left behind by dead workers.
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from spool import Spool, SpoolFull
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return Spool(str(tmp_path), max_bytes=1000, reservation=100, wait_timeout=0, sweep_interval=0)
+
+
+def write(spool_file, size):
+    spool_file.write(b'x' * size)
+    return spool_file.close()
+
+
+def test_reservations_count_until_removed(spool):
+    first = spool.create(600)
+    assert spool.usage() == 600
+    # The reservation holds even before anything is written
+    with pytest.raises(SpoolFull):
+        spool.create(500)
+    second = spool.create(400)
+    assert spool.usage() == 1000
+    spool.remove(write(first, 600))
+    assert spool.usage() == 400
+    spool.create(500)
+    second.abort()
+    assert spool.usage() == 500
+
+
+def test_unknown_sizes_reserve_the_default(spool):
+    spool.create()
+    assert spool.usage() == 100
+
+
+def test_file_larger_than_the_quota_is_rejected_immediately(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=1000, wait_timeout=10, sweep_interval=0)
+    started = time.monotonic()
+    with pytest.raises(SpoolFull):
+        spool.create(1001)
+    assert time.monotonic() - started < 1
+
+
+def test_waiting_caller_is_admitted_when_space_is_released(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=1000, wait_timeout=5, sweep_interval=0)
+    held = spool.create(800)
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(spool.create(500)))
+    waiter.start()
+    time.sleep(0.3)
+    assert not admitted
+    held.abort()
+    waiter.join(5)
+    assert len(admitted) == 1
+
+
+def test_waiting_caller_is_rejected_after_the_timeout(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=1000, wait_timeout=0.3, sweep_interval=0)
+    spool.create(800)
+    started = time.monotonic()
+    with pytest.raises(SpoolFull) as excinfo:
+        spool.create(500)
+    assert time.monotonic() - started >= 0.3
+    assert excinfo.value.retry_after > 0
+
+
+def test_growing_past_the_reservation_is_checked_against_the_quota(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=3 * 1024 * 1024, reservation=1024, wait_timeout=0, sweep_interval=0)
+    other = spool.create(1024 * 1024)
+    growing = spool.create()
+    chunk = b'x' * (512 * 1024)
+    growing.write(chunk)
+    growing.write(chunk)
+    with pytest.raises(SpoolFull):
+        for _ in range(4):
+            growing.write(chunk)
+    growing.abort()
+    other.abort()
+    assert spool.usage() == 0
+
+
+def test_workers_share_the_quota(tmp_path):
+    # Two Spool instances on one directory stand in for two workers
+    first = Spool(str(tmp_path), max_bytes=1000, wait_timeout=0, sweep_interval=0)
+    second = Spool(str(tmp_path), max_bytes=1000, wait_timeout=0, sweep_interval=0)
+    first.create(700)
+    with pytest.raises(SpoolFull):
+        second.create(400)
+
+
+def test_sweep_reclaims_files_of_dead_workers_and_old_files(spool, tmp_path):
+    reclaimed = []
+    spool.on_sweep = lambda files, size: reclaimed.append((files, size))
+    live = write(spool.create(10), 10)
+    # A PID that cannot be running (above the kernel's pid_max)
+    dead = os.path.join(str(tmp_path), f'{2 ** 22 + 1}-deadbeef-50.mp4')
+    with open(dead, 'wb') as f:
+        f.write(b'y' * 50)
+    old = write(spool.create(20), 20)
+    os.utime(old, (time.time() - 2 * spool.max_age,) * 2)
+    foreign = os.path.join(str(tmp_path), 'not-a-spool-file')
+    open(foreign, 'w').close()
+
+    assert spool.sweep() == (2, 70)
+    assert reclaimed == [(2, 70)]
+    assert os.path.exists(live)
+    assert os.path.exists(foreign)
+    assert not os.path.exists(dead)
+    assert not os.path.exists(old)
+    assert spool.usage() == 10
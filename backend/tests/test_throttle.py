@@ -0,0 +1,62 @@
+"""
+Classification of upstream errors as rate limiting / login walls
+"""
+
+import sys
+
+import pytest
+from yt_dlp.networking import Response
+from yt_dlp.networking.exceptions import HTTPError
+from yt_dlp.utils import DownloadError, ExtractorError
+
+from extractors import http_status
+from throttle import is_throttle_error
+
+
+@pytest.mark.parametrize('message', [
+    'ERROR: [Instagram] abc: Unable to download webpage: HTTP Error 429: Too Many Requests',
+    'ERROR: [facebook] 123: Too Many Requests',
+    'ERROR: [Instagram] abc: Requested content is not available, rate-limit reached or login required',
+    'Please wait a few minutes before you try again.',
+    'ERROR: [Instagram] abc: checkpoint_required: Checkpoint required',
+])
+def test_throttle_messages(message):
+    assert is_throttle_error(message)
+
+
+@pytest.mark.parametrize('message', [
+    'ERROR: [facebook] 4294967: HTTP Error 404: Not Found',
+    'ERROR: [Instagram] C429xyz: This post is private',
+    'ERROR: Unable to download https://scontent.cdninstagram.com/v/t51.429-15/abc.jpg',
+    'Downloaded 1429 bytes of 2048',
+    'ERROR: [Instagram] abc: HTTP Error 4290: Unknown',
+])
+def test_incidental_429_is_not_throttling(message):
+    assert not is_throttle_error(message)
+
+
+def test_http_status_overrides_message():
+    assert is_throttle_error('ERROR: Unable to download webpage', 429)
+    assert not is_throttle_error('ERROR: Unable to download webpage', 404)
+
+
+def download_error(status):
+    """A DownloadError the way yt-dlp raises one for an HTTP error during extraction"""
+    response = Response(None, 'https://www.instagram.com/p/abc/', {}, status=status)
+    try:
+        try:
+            raise HTTPError(response)
+        except HTTPError as e:
+            raise ExtractorError('Unable to download webpage', cause=e)
+    except ExtractorError as e:
+        return DownloadError(f'ERROR: {e}', sys.exc_info())
+
+
+@pytest.mark.parametrize('status', [429, 403])
+def test_http_status_of_wrapped_errors(status):
+    assert http_status(download_error(status)) == status
+
+
+def test_http_status_unknown():
+    assert http_status(DownloadError('ERROR: no network')) is None
+    assert http_status(ValueError('boom')) is None
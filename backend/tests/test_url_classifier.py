@@ -0,0 +1,283 @@
+"""
+Invariants of the single-pass URL classifier: every accepted variant of a
+post URL maps to one canonical ID, foreign hosts are rejected, and URLs the
+old regex chain accepted are still accepted for the same platform.
+Besides the hand-picked examples, the invariants are checked on URLs
+generated from a seeded random source over hosts, paths, queries and
+fragments, so failures are reproducible.
+"""
+
+import random
+import re
+import string
+from urllib.parse import quote, urlencode
+
+import pytest
+
+from url_classifier import classify_url, normalize_host
+
+# The regex chain that validated URLs before the classifier existed
+LEGACY_INSTAGRAM_PATTERNS = [
+    r'https?://(www\.)?instagram\.com/(p|reel|tv)/([A-Za-z0-9_-]+)',
+    r'https?://(www\.)?instagram\.com/([A-Za-z0-9_.]+)/(p|reel|tv)/([A-Za-z0-9_-]+)',
+    r'https?://(www\.)?instagram\.com/(p|reel|tv)/([A-Za-z0-9_-]+)/?',
+    r'https?://(www\.)?instagram\.com/(p|reel|tv)/([A-Za-z0-9_-]+)\?.*',
+]
+LEGACY_FACEBOOK_PATTERNS = [
+    r'https?://(www\.)?facebook\.com/.+/posts/[0-9]+',
+    r'https?://(www\.)?facebook\.com/.+/videos/[0-9]+',
+    r'https?://(www\.)?facebook\.com/watch/\?v=[0-9]+',
+]
+
+
+def legacy_platform(url):
+    if any(re.search(pattern, url) for pattern in LEGACY_INSTAGRAM_PATTERNS):
+        return 'instagram'
+    if any(re.match(pattern, url) for pattern in LEGACY_FACEBOOK_PATTERNS):
+        return 'facebook'
+    return None
+
+
+def variants(path, hosts, shim_hosts=()):
+    """Host/trailing-slash/query variants of a path, plus link-shim wrappers"""
+    urls = []
+    for host in hosts:
+        for scheme in ('https', 'http'):
+            base = f'{scheme}://{host}{path}'
+            urls += [base, base + '#comments']
+            if '?' in path:
+                urls.append(base + '&utm_source=share')
+            else:
+                urls += [base.rstrip('/') + '/', base.rstrip('/'),
+                         base + '?igsh=abc123&utm_source=ig_web_copy_link']
+    for shim in shim_hosts:
+        urls.append(f'https://{shim}/l.php?u={quote(urls[0], safe="")}&h=AT0xyz')
+    return urls
+
+
+INSTAGRAM_HOSTS = ('www.instagram.com', 'instagram.com', 'm.instagram.com', 'instagr.am')
+FACEBOOK_HOSTS = ('www.facebook.com', 'facebook.com', 'm.facebook.com', 'mbasic.facebook.com', 'fb.com')
+SHIM_HOSTS = ('l.facebook.com', 'lm.facebook.com', 'l.instagram.com')
+
+CANONICAL_CASES = [
+    ('instagram:ABC123', variants('/p/ABC123/', INSTAGRAM_HOSTS, SHIM_HOSTS)
+     + variants('/someuser/p/ABC123/', INSTAGRAM_HOSTS)),
+    ('instagram:Cx_4-9z', variants('/reel/Cx_4-9z/', INSTAGRAM_HOSTS, SHIM_HOSTS)
+     + variants('/reels/Cx_4-9z/', INSTAGRAM_HOSTS) + variants('/some.user/reel/Cx_4-9z/', INSTAGRAM_HOSTS)),
+    ('instagram:TV1', variants('/tv/TV1/', INSTAGRAM_HOSTS)),
+    ('facebook:1234567890', variants('/somepage/videos/1234567890/', FACEBOOK_HOSTS, SHIM_HOSTS)
+     + variants('/somepage/videos/a-video-title/1234567890/', FACEBOOK_HOSTS)
+     + variants('/watch/?v=1234567890', FACEBOOK_HOSTS)
+     + variants('/reel/1234567890', FACEBOOK_HOSTS)),
+    ('facebook:987654321', variants('/somepage/posts/987654321', FACEBOOK_HOSTS, SHIM_HOSTS)),
+    ('facebook:pfbid02abcXYZ', variants('/somepage/posts/pfbid02abcXYZ', FACEBOOK_HOSTS)),
+]
+
+
+@pytest.mark.parametrize('canonical_id, urls', CANONICAL_CASES, ids=[case[0] for case in CANONICAL_CASES])
+def test_variants_share_canonical_id(canonical_id, urls):
+    for url in urls:
+        classified = classify_url(url)
+        assert classified is not None, url
+        assert classified.canonical_id == canonical_id, url
+
+
+@pytest.mark.parametrize('canonical_id, urls', CANONICAL_CASES, ids=[case[0] for case in CANONICAL_CASES])
+def test_canonical_url_classifies_to_itself(canonical_id, urls):
+    canonical_url = classify_url(urls[0]).canonical_url
+    assert classify_url(canonical_url).canonical_id == canonical_id
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.youtube.com/watch?v=1234567890',
+    'https://instagram.com.evil.example/p/ABC123/',
+    'https://evilinstagram.com/p/ABC123/',
+    'https://notfacebook.com/somepage/videos/1234567890/',
+    'https://www.facebook.com.evil.example/watch/?v=123',
+    'https://user@evil.example/p/ABC123/',
+    'https://scontent.cdninstagram.com/v/t51/ABC123.jpg',
+    'https://l.facebook.com/l.php?u=https%3A%2F%2Fevil.example%2Fp%2FABC123%2F',
+    'https://l.facebook.com/l.php?u=https%3A%2F%2Fl.facebook.com%2Fl.php',
+    'ftp://www.instagram.com/p/ABC123/',
+    'javascript:alert(1)//www.instagram.com/p/ABC123/',
+    'www.instagram.com/p/ABC123/',
+    '',
+    None,
+])
+def test_foreign_hosts_and_schemes_are_rejected(url):
+    assert classify_url(url) is None
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.instagram.com/',
+    'https://www.instagram.com/someuser/',
+    'https://www.instagram.com/p/',
+    'https://www.instagram.com/p/bad%20code/',
+    'https://www.facebook.com/somepage/',
+    'https://www.facebook.com/watch/?v=abc',
+    'https://www.facebook.com/somepage/videos/not-a-number/',
+])
+def test_supported_hosts_without_a_post_are_rejected(url):
+    assert classify_url(url) is None
+
+
+LEGACY_ACCEPTED = [
+    'https://www.instagram.com/p/ABC123/',
+    'https://instagram.com/p/ABC123',
+    'http://www.instagram.com/reel/Cx_4-9z/?igsh=abc',
+    'https://www.instagram.com/tv/TV1/',
+    'https://www.instagram.com/some.user/p/ABC123/',
+    'https://www.instagram.com/someuser/reel/Cx_4-9z',
+    'https://www.facebook.com/somepage/posts/987654321',
+    'https://facebook.com/somepage/posts/987654321/',
+    'https://www.facebook.com/somepage/videos/1234567890/',
+    'http://www.facebook.com/some.page/videos/1234567890?ref=share',
+    'https://www.facebook.com/watch/?v=1234567890',
+]
+
+
+@pytest.mark.parametrize('url', LEGACY_ACCEPTED)
+def test_matches_legacy_regex_chain(url):
+    assert legacy_platform(url) is not None, 'fixture is not in the legacy accepted set'
+    classified = classify_url(url)
+    assert classified is not None
+    assert classified.platform == legacy_platform(url)
+
+
+# Generated URLs. Each case is (url, expected canonical ID or None); the seed
+# makes a failing URL reproducible.
+GENERATED_EXAMPLES = 500
+SHORTCODE_CHARS = string.ascii_letters + string.digits + '_-'
+USERNAME_CHARS = string.ascii_lowercase + string.digits + '_.'
+RESERVED_SEGMENTS = {'p', 'reel', 'reels', 'tv', 'share', 'watch', 'posts', 'videos'}
+FOREIGN_TLDS = ('example', 'com', 'net', 'io')
+
+
+def random_text(rng, chars, min_size=1, max_size=12):
+    return ''.join(rng.choice(chars) for _ in range(rng.randint(min_size, max_size)))
+
+
+def random_name(rng, chars=USERNAME_CHARS):
+    while True:
+        name = random_text(rng, chars)
+        if name not in RESERVED_SEGMENTS and not name.isdigit() and not name.startswith('pfbid'):
+            return name
+
+
+def random_host(rng, domains):
+    host = rng.choice(('', 'www.', 'm.', 'mobile.', 'web.')) + rng.choice(domains)
+    host = ''.join(char.upper() if rng.random() < 0.3 else char for char in host)
+    if rng.random() < 0.2:
+        host += '.'
+    if rng.random() < 0.2:
+        host += rng.choice((':443', ':80', ':8443'))
+    return host
+
+
+def random_query(rng, reserved=()):
+    params = []
+    for _ in range(rng.randint(0, 3)):
+        name = rng.choice(('igsh', 'utm_source', 'utm_medium', 'ref', 'mibextid', random_name(rng)))
+        if name not in reserved:
+            params.append((name, random_text(rng, string.printable, 0, 16)))
+    return params
+
+
+def random_tail(rng, path, query=(), trailing_slash=True):
+    """path plus an optional trailing slash, query string and fragment"""
+    if trailing_slash and rng.random() < 0.5:
+        path += '/'
+    if query:
+        path += '?' + urlencode(query)
+    if rng.random() < 0.3:
+        path += '#' + random_text(rng, string.ascii_letters + string.digits + '-_=&', 0, 10)
+    return path
+
+
+def instagram_case(rng):
+    code = random_text(rng, SHORTCODE_CHARS)
+    kind = rng.choice(('p', 'reel', 'reels', 'tv'))
+    path = f'/{kind}/{code}'
+    if rng.random() < 0.3:
+        path = f'/{random_name(rng)}{path}'
+    host = random_host(rng, ('instagram.com', 'instagr.am'))
+    url = f"{rng.choice(('https', 'http'))}://{host}{random_tail(rng, path, random_query(rng))}"
+    return url, f'instagram:{code}'
+
+
+def facebook_case(rng):
+    post_id = str(rng.randint(1, 10 ** 17))
+    page = random_name(rng, string.ascii_letters + string.digits + '.')
+    shape = rng.choice(('posts', 'videos', 'slug', 'pfbid', 'watch', 'reel'))
+    query = random_query(rng, reserved=('v',))
+    if shape == 'watch':
+        query.insert(rng.randint(0, len(query)), ('v', post_id))
+        path = rng.choice(('/watch/', '/watch'))
+        trailing_slash = False
+    else:
+        if shape == 'pfbid':
+            post_id = 'pfbid0' + random_text(rng, string.ascii_letters + string.digits)
+        path = {
+            'posts': f'/{page}/posts/{post_id}',
+            'pfbid': f'/{page}/posts/{post_id}',
+            'videos': f'/{page}/videos/{post_id}',
+            'slug': f'/{page}/videos/{random_name(rng)}/{post_id}',
+            'reel': f'/reel/{post_id}',
+        }[shape]
+        trailing_slash = True
+    host = random_host(rng, ('facebook.com', 'fb.com'))
+    url = f"{rng.choice(('https', 'http'))}://{host}{random_tail(rng, path, query, trailing_slash)}"
+    return url, f'facebook:{post_id}'
+
+
+def link_shim_case(rng):
+    url, canonical_id = rng.choice((instagram_case, facebook_case))(rng)
+    shim = rng.choice(('l.facebook.com', 'lm.facebook.com', 'l.instagram.com'))
+    query = [('u', url)] + random_query(rng, reserved=('u',))
+    return f'https://{shim}/l.php?{urlencode(query)}', canonical_id
+
+
+def lookalike_host_case(rng):
+    """A supported post URL moved to a host that only looks like a supported one"""
+    url, _ = rng.choice((instagram_case, facebook_case))(rng)
+    parts = url.split('/', 3)
+    domain = normalize_host(parts[2])
+    label = random_name(rng, string.ascii_lowercase + string.digits + '-').strip('-.') or 'evil'
+    host = rng.choice((
+        f'{label}{domain}',
+        f'{domain}.{label}.{rng.choice(FOREIGN_TLDS)}',
+        f'{domain}-{label}.{rng.choice(FOREIGN_TLDS)}',
+    ))
+    return f'{parts[0]}//{host}/{parts[3]}', None
+
+
+def generated(make_case, seed):
+    rng = random.Random(seed)
+    return [make_case(rng) for _ in range(GENERATED_EXAMPLES)]
+
+
+@pytest.mark.parametrize('make_case', [instagram_case, facebook_case, link_shim_case])
+def test_generated_variants_share_canonical_id(make_case):
+    for url, canonical_id in generated(make_case, seed=make_case.__name__):
+        classified = classify_url(url)
+        assert classified is not None, url
+        assert classified.canonical_id == canonical_id, url
+        # The canonical URL names the same post
+        assert classify_url(classified.canonical_url).canonical_id == canonical_id, url
+
+
+@pytest.mark.parametrize('make_case', [instagram_case, facebook_case])
+def test_generated_query_and_fragment_do_not_change_the_post(make_case):
+    rng = random.Random('query-' + make_case.__name__)
+    for url, canonical_id in generated(make_case, seed=make_case.__name__):
+        base = url.split('#', 1)[0]
+        if 'v=' in base:
+            continue  # Facebook watch URLs carry the ID in the query
+        base = base.split('?', 1)[0]
+        varied = random_tail(rng, base, random_query(rng), trailing_slash=False)
+        assert classify_url(base).canonical_id == classify_url(varied).canonical_id == canonical_id, varied
+
+
+def test_generated_lookalike_hosts_are_rejected():
+    for url, _ in generated(lookalike_host_case, seed='lookalike'):
+        assert classify_url(url) is None, url
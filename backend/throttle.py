@@ -0,0 +1,144 @@
+"""
+Outbound throttling per upstream host
+A token bucket per host paces our own calls to Instagram/Facebook and their
+CDNs. Callers wait briefly for a token and are shed once the wait would be
+too long. When an upstream answers with a 429 or a login wall, the host is
+backed off exponentially (or for its Retry-After), and the backoff decays
+again after successful calls. Buckets are per worker process.
+"""
+
+import re
+import threading
+import time
+
+# Markers of rate limiting / login walls in yt-dlp errors
+THROTTLE_MARKERS = (
+    'too many requests', 'rate-limit', 'rate limit', 'login required',
+    'please wait a few minutes', 'checkpoint required',
+)
+# A bare '429' also turns up in post IDs, CDN paths and byte counts
+HTTP_429 = re.compile(r'\bhttp error 429\b')
+
+
+class UpstreamThrottled(Exception):
+    """Raised when an upstream host has no capacity left for another call"""
+
+    def __init__(self, host, retry_after):
+        self.host = host
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(f"Too many requests to {host} right now. Please try again in {self.retry_after} seconds.")
+
+
+def is_throttle_error(message, status=None):
+    """
+    Whether an upstream error means we are being rate limited or hit a login
+    wall. status is the HTTP status behind the error, when known.
+    """
+    if status == 429:
+        return True
+    message = message.lower()
+    return bool(HTTP_429.search(message)) or any(marker in message for marker in THROTTLE_MARKERS)
+
+
+class _Bucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.backoff = 0.0
+        self.throttled = 0
+        self.shed = 0
+
+
+class HostThrottle:
+    """Token buckets with adaptive backoff, keyed by upstream host"""
+
+    def __init__(self, rate, burst, max_wait=10, backoff_base=30, backoff_max=900):
+        self.rate = rate                  # Tokens per second per host; 0 disables throttling
+        self.burst = burst
+        self.max_wait = max_wait          # Longest a caller queues for a token before being shed
+        self.backoff_base = backoff_base  # First backoff after a 429 / login wall, in seconds
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _bucket(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = _Bucket(self.rate, self.burst)
+        return bucket
+
+    def _reserve(self, host, now):
+        """Take a token (possibly in the future); returns seconds until it may be used"""
+        bucket = self._bucket(host)
+        bucket.tokens = min(bucket.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+        bucket.updated = now
+        wait = max(0.0, bucket.blocked_until - now)
+        if bucket.tokens < 1:
+            wait = max(wait, (1 - bucket.tokens) / bucket.rate)
+        return bucket, wait
+
+    def acquire(self, host, max_wait=None):
+        """
+        Wait for a token for host. Raises UpstreamThrottled without waiting
+        if the token would not be available within max_wait seconds.
+        """
+        if self.rate <= 0:
+            return
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._lock:
+            now = time.monotonic()
+            bucket, wait = self._reserve(host, now)
+            if wait > max_wait:
+                bucket.shed += 1
+                raise UpstreamThrottled(host, wait)
+            # Queue behind earlier callers by spending the token now
+            bucket.tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+
+    def penalize(self, host, retry_after=None):
+        """Back off host after a 429 or login wall: Retry-After if given, else exponential"""
+        with self._lock:
+            bucket = self._bucket(host)
+            bucket.throttled += 1
+            bucket.backoff = min(self.backoff_max, bucket.backoff * 2 if bucket.backoff else self.backoff_base)
+            delay = retry_after if retry_after is not None else bucket.backoff
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + delay)
+
+    def reward(self, host):
+        """Decay the backoff after a successful call"""
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is not None and bucket.backoff:
+                bucket.backoff = bucket.backoff / 2 if bucket.backoff > self.backoff_base else 0.0
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                host: {
+                    'tokens': round(min(bucket.burst, bucket.tokens + (now - bucket.updated) * bucket.rate), 2),
+                    'blocked_for': round(max(0.0, bucket.blocked_until - now), 1),
+                    'backoff': bucket.backoff,
+                    'throttled': bucket.throttled,
+                    'shed': bucket.shed,
+                }
+                for host, bucket in self._buckets.items()
+            }
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds form only), or None"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def cdn_host(url_host):
+    """Group CDN edge hosts (scontent-xyz.cdninstagram.com) under their domain"""
+    labels = (url_host or '').lower().split('.')
+    return '.'.join(labels[-2:]) if len(labels) > 2 else '.'.join(labels)
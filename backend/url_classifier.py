@@ -0,0 +1,163 @@
+"""
+Single-pass URL classifier
+Parses a URL once, dispatches on the host and returns the platform, the kind
+of post and its canonical ID. Validation, routing and every cache key reuse
+the same result instead of re-running a chain of regexes.
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import parse_qs, urlsplit
+
+# platform: 'instagram' | 'facebook'
+# kind: 'post', 'reel', 'tv', 'video', 'watch', 'share', ...
+# canonical_id: stable identity for caches, e.g. 'instagram:ABC123'
+# url: the sanitized input URL
+# canonical_url: normalized URL handed to the extractor
+ClassifiedURL = namedtuple('ClassifiedURL', ['platform', 'kind', 'canonical_id', 'url', 'canonical_url'])
+
+SHORTCODE_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+NUMERIC_ID_RE = re.compile(r'^[0-9]+$')
+POST_ID_RE = re.compile(r'^(?:[0-9]+|pfbid[A-Za-z0-9]+)$')
+
+# Subdomains that serve the same content as the bare domain
+HOST_PREFIXES = ('www.', 'm.', 'mobile.', 'web.', 'mbasic.', 'touch.')
+
+INSTAGRAM_KINDS = {'p': 'post', 'reel': 'reel', 'reels': 'reel', 'tv': 'tv'}
+
+_host_handlers = {}
+
+
+def register_host(host, handler):
+    """Route URLs on host to handler(url, parts, segments) -> ClassifiedURL or None"""
+    _host_handlers[host] = handler
+
+
+def normalize_host(netloc):
+    host = netloc.rsplit('@', 1)[-1].split(':', 1)[0].lower().rstrip('.')
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            return host[len(prefix):]
+    return host
+
+
+def sanitize_url(url):
+    """Sanitize URL input; returns the stripped URL or None if it is not an http(s) URL"""
+    if not url or not isinstance(url, str):
+        return None
+    url = url.strip()
+    if not url.startswith(('http://', 'https://')):
+        return None
+    try:
+        if not urlsplit(url).netloc:
+            return None
+    except ValueError:
+        return None
+    return url
+
+
+def is_media_host(url, domains):
+    """Whether url is an http(s) URL on one of domains or one of their subdomains"""
+    if not sanitize_url(url):
+        return False
+    try:
+        host = (urlsplit(url.strip()).hostname or '').rstrip('.')
+    except ValueError:
+        return False
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+@lru_cache(maxsize=4096)
+def classify_url(url):
+    """Classify a URL; returns a ClassifiedURL or None if it is invalid or unsupported"""
+    url = sanitize_url(url)
+    if not url:
+        return None
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return None
+    handler = _host_handlers.get(normalize_host(parts.netloc))
+    if handler is None:
+        return None
+    segments = [segment for segment in parts.path.split('/') if segment]
+    return handler(url, parts, segments)
+
+
+def _instagram(url, parts, segments):
+    # /p/<code>, /reel/<code>, /tv/<code>, /<user>/p/<code>, /share/<kind>/<code>
+    if len(segments) >= 2 and segments[0] == 'share':
+        code = segments[-1]
+        if SHORTCODE_RE.match(code):
+            return ClassifiedURL('instagram', 'share', f'instagram:share:{code}', url, url.split('?', 1)[0])
+        return None
+    for offset in (0, 1):
+        if len(segments) >= offset + 2 and segments[offset] in INSTAGRAM_KINDS:
+            code = segments[offset + 1]
+            if SHORTCODE_RE.match(code):
+                path = 'reel' if segments[offset] == 'reels' else segments[offset]
+                return ClassifiedURL(
+                    'instagram', INSTAGRAM_KINDS[segments[offset]], f'instagram:{code}',
+                    url, f'https://www.instagram.com/{path}/{code}/'
+                )
+            return None
+    return None
+
+
+def _facebook(url, parts, segments):
+    query = parse_qs(parts.query)
+
+    # /watch/?v=<id> and /watch?v=<id>
+    if segments[:1] == ['watch']:
+        video_id = query.get('v', [''])[0]
+        if NUMERIC_ID_RE.match(video_id):
+            return ClassifiedURL('facebook', 'watch', f'facebook:{video_id}', url,
+                                 f'https://www.facebook.com/watch/?v={video_id}')
+        return None
+
+    # /reel/<id>
+    if len(segments) >= 2 and segments[0] == 'reel' and NUMERIC_ID_RE.match(segments[1]):
+        return ClassifiedURL('facebook', 'reel', f'facebook:{segments[1]}', url,
+                             f'https://www.facebook.com/reel/{segments[1]}')
+
+    # /share/v/<code>, /share/r/<code>, /share/p/<code>
+    if len(segments) >= 3 and segments[0] == 'share' and SHORTCODE_RE.match(segments[2]):
+        return ClassifiedURL('facebook', 'share', f'facebook:share:{segments[2]}', url, url.split('?', 1)[0])
+
+    # /<page>/posts/<id>, /<page>/videos/<id>, /<page>/videos/<slug>/<id>
+    for kind_segment, kind, id_re in (('posts', 'post', POST_ID_RE), ('videos', 'video', NUMERIC_ID_RE)):
+        if kind_segment in segments[1:]:
+            index = segments.index(kind_segment, 1)
+            for candidate in segments[index + 1:index + 3]:
+                if id_re.match(candidate):
+                    return ClassifiedURL('facebook', kind, f'facebook:{candidate}', url, url.split('?', 1)[0])
+            return None
+    return None
+
+
+def _fb_watch(url, parts, segments):
+    if segments and SHORTCODE_RE.match(segments[0]):
+        return ClassifiedURL('facebook', 'watch', f'facebook:watch:{segments[0]}', url,
+                             f'https://fb.watch/{segments[0]}/')
+    return None
+
+
+def _facebook_link_shim(url, parts, segments):
+    # l.facebook.com/l.php?u=<target> wraps outbound links - classify the target
+    target = parse_qs(parts.query).get('u', [''])[0]
+    if not sanitize_url(target):
+        return None
+    if _host_handlers.get(normalize_host(urlsplit(target).netloc)) is _facebook_link_shim:
+        return None
+    return classify_url(target)
+
+
+register_host('instagram.com', _instagram)
+register_host('instagr.am', _instagram)
+register_host('facebook.com', _facebook)
+register_host('fb.com', _facebook)
+register_host('fb.watch', _fb_watch)
+register_host('l.facebook.com', _facebook_link_shim)
+register_host('lm.facebook.com', _facebook_link_shim)
+register_host('l.instagram.com', _facebook_link_shim)
@@ -2,8 +2,11 @@
 WSGI entry point for production deployment
 Use with gunicorn: gunicorn wsgi:app
 """
-from app import app
+from app import app, extractor_engine
+
+# Load yt-dlp now rather than on the first extraction. With preload_app this
+# runs once in the gunicorn master and workers share the pages copy-on-write.
+extractor_engine.preload()
 
 if __name__ == "__main__":
     app.run()
-
@@ -6,6 +6,39 @@ import Header from './components/Header';
 import Footer from './components/Footer';
 import { Instagram, Facebook } from 'lucide-react';
 
+// Progress bar position once each stage of /api/fetch/stream has finished
+const STAGE_PROGRESS = {
+  classified: 20,
+  extracting: 40,
+  formats: 90,
+  ready: 100,
+};
+
+// Read a newline-delimited JSON response, calling onEvent for every line
+const readEvents = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+    const lines = buffered.split('\n');
+    buffered = lines.pop();
+    for (const line of lines) {
+      if (line.trim()) {
+        onEvent(JSON.parse(line));
+      }
+    }
+    if (done) {
+      if (buffered.trim()) {
+        onEvent(JSON.parse(buffered));
+      }
+      return;
+    }
+  }
+};
+
 function App() {
   const [darkMode, setDarkMode] = useState(() => {
     // Check localStorage for saved theme preference
@@ -39,11 +72,10 @@ function App() {
     setLoading(true);
 
     try {
-      // Step 1: Validate URL
-      setProgress(20);
       // Use environment variable if set, otherwise use relative path (for Railway)
       const apiUrl = process.env.REACT_APP_API_URL || '';
-      const validateResponse = await fetch(`${apiUrl}/api/validate`, {
+      // Validation and extraction happen in one request that streams progress events
+      const response = await fetch(`${apiUrl}/api/fetch/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -51,32 +83,35 @@ function App() {
         body: JSON.stringify({ url }),
       });
 
-      const validateData = await validateResponse.json();
-
-      if (!validateData.valid) {
-        throw new Error(validateData.error || 'Invalid URL');
+      if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.error || 'Failed to fetch media');
       }
 
-      // Step 2: Fetch media
-      setProgress(50);
-      const fetchResponse = await fetch(`${apiUrl}/api/fetch`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ url: validateData.url }),
+      let fetchData = null;
+      await readEvents(response, (event) => {
+        if (event.event === 'error') {
+          throw new Error(event.error || 'Failed to fetch media');
+        }
+        if (event.event === 'ready') {
+          fetchData = event;
+        }
+        if (STAGE_PROGRESS[event.event]) {
+          setProgress(STAGE_PROGRESS[event.event]);
+        }
       });
 
-      const fetchData = await fetchResponse.json();
-
-      if (!fetchData.success) {
-        throw new Error(fetchData.error || 'Failed to fetch media');
+      if (!fetchData) {
+        throw new Error('Failed to fetch media');
       }
 
-      setProgress(100);
       setMediaData({
         mediaUrl: fetchData.media_url,
         mediaType: fetchData.media_type,
+        ext: fetchData.ext,
+        audioUrl: fetchData.items && fetchData.items[0] ? fetchData.items[0].audio_url : undefined,
+        items: fetchData.items || [],
+        postId: fetchData.post_id,
         source: fetchData.source,
         originalUrl: url,
       });
@@ -88,20 +123,30 @@ function App() {
     }
   };
 
-  const handleDownload = async () => {
+  const handleDownload = async (downloadAll = false) => {
     if (!mediaData) return;
 
     try {
       const apiUrl = process.env.REACT_APP_API_URL || '';
+      // Multi-item posts can be downloaded together as a single ZIP. The post
+      // URL lets the server re-resolve media links that expired in the meantime.
+      const body = downloadAll
+        ? { post_url: mediaData.originalUrl, all: true }
+        : {
+          media_url: mediaData.mediaUrl,
+          media_type: mediaData.mediaType,
+          audio_url: mediaData.audioUrl,
+          ext: mediaData.ext,
+          post_id: mediaData.postId,
+          post_url: mediaData.originalUrl,
+          index: 0,
+        };
       const response = await fetch(`${apiUrl}/api/download`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({
-          media_url: mediaData.mediaUrl,
-          media_type: mediaData.mediaType,
-        }),
+        body: JSON.stringify(body),
       });
 
       if (!response.ok) {
@@ -111,7 +156,9 @@ function App() {
 
       // Get filename from response or create one
       const contentType = response.headers.get('content-type');
-      const extension = mediaData.mediaType === 'video' ? 'mp4' : 'jpg';
+      const extension = downloadAll
+        ? 'zip'
+        : mediaData.ext || (mediaData.mediaType === 'video' ? 'mp4' : 'jpg');
       const filename = `download_${Date.now()}.${extension}`;
 
       // Create blob and download
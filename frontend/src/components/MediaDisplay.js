@@ -2,6 +2,22 @@ import React, { useState } from 'react';
 import './MediaDisplay.css';
 import { Download, X, Instagram, Facebook, Video, Image as ImageIcon } from 'lucide-react';
 
+const PREVIEW_WIDTH = 640;
+
+// Server-rendered thumbnail (poster frame for videos) instead of the full-size original
+const getPreviewUrl = (mediaData) => {
+  const apiUrl = process.env.REACT_APP_API_URL || '';
+  const params = new URLSearchParams({
+    media_url: mediaData.mediaUrl,
+    media_type: mediaData.mediaType,
+    width: PREVIEW_WIDTH,
+  });
+  if (mediaData.postId) {
+    params.set('post_id', mediaData.postId);
+  }
+  return `${apiUrl}/api/preview?${params}`;
+};
+
 function MediaDisplay({ mediaData, onDownload, onReset }) {
   const [imageError, setImageError] = useState(false);
 
@@ -53,9 +69,10 @@ function MediaDisplay({ mediaData, onDownload, onReset }) {
         {mediaData.mediaType === 'video' ? (
           <video
             src={mediaData.mediaUrl}
+            poster={getPreviewUrl(mediaData)}
             controls
             className="media-video"
-            preload="metadata"
+            preload="none"
           >
             Your browser does not support the video tag.
           </video>
@@ -69,7 +86,7 @@ function MediaDisplay({ mediaData, onDownload, onReset }) {
               </div>
             ) : (
               <img
-                src={mediaData.mediaUrl}
+                src={getPreviewUrl(mediaData)}
                 alt="Downloaded media"
                 className="media-image"
                 onError={handleImageError}
@@ -82,11 +99,20 @@ function MediaDisplay({ mediaData, onDownload, onReset }) {
       <div className="media-actions">
         <button
           className="download-button"
-          onClick={onDownload}
+          onClick={() => onDownload(false)}
         >
           <Download className="download-icon" />
           <span>Download {mediaData.mediaType === 'video' ? 'Video' : 'Image'}</span>
         </button>
+        {mediaData.items && mediaData.items.length > 1 && (
+          <button
+            className="download-button"
+            onClick={() => onDownload(true)}
+          >
+            <Download className="download-icon" />
+            <span>Download All ({mediaData.items.length}) as ZIP</span>
+          </button>
+        )}
       </div>
 
       <div className="media-footer">